@@ -1,46 +1,339 @@
 import asyncio
-import json
-import time
-from typing import Dict, List
-from util.baseGame import BaseGame
-import util.forcedAlignment as fa
-import util.fetchQuestions as fq
-import discord.ext.commands
-from discord.ext.commands import Context
-import aiofiles
 import logging
 from pathlib import Path
-from util.player import Player
-from util.timers import PausableTimer, AudioTracker
+from typing import Dict, Optional
+import aiofiles
+import discord
+from discord.ext.commands import Context
+from util.baseGame import BaseGame
+import util.fetchQuestions as fq
+import util.timeStretch as ts
+from util.sendQueue import queueSend, PRIORITY_GAME
+from util.statsStore import statsStore
 from util.utils import create_embed
 
 class BonusGame(BaseGame):
+    '''
+    Class representing a BonusGame instance for managing bonus reading functionalities.
+        Attributes:
+            guild (Guild): The Discord guild where the game is taking place.
+            textChannel (TextChannel): The text channel for communication.
+            cats (str): Categories for the game questions.
+            diff (str): Difficulty level for the questions.
+            speed (float): Reading speed of the bonuses, applied as a time-stretch of the audio synthesized at 1.0.
+            players (PlayerRegistry): The players participating in the game, ranked by score.
+            timer (PausableTimer): Timer for the answer window after each part.
+            bonus (dict): The prepared bonus currently being read.
+            currentPart (int): Index of the part currently being read or answered.
+            generation (int): Number of the current playback, so the end of an earlier one is ignored.
 
-    def __init__(self, guild: discord.Guild=None, textChannel: discord.TextChannel=None, cats:str='', diff:str=''):
+        Methods:
+            createBonus () -> bool: Take the prefetched bonus (or prepare one) and start prefetching the next.
+            playBonus (ctx: Context) -> None: Read the lead-in and the first part of the current bonus.
+            checkAnswer (authorID: int, answer: str) -> Tuple[str, str]: Judge an answer to the current part.
+            advance (ctx: Context) -> None: Reveal the answer of the current part and read the next one.
+            stopBonus (channel: TextChannel) -> None: Stop reading the current bonus.
+            getCatsAndDiff (ctx: Context) -> Tuple[int, List[str], str]: Get the bonuses heard, categories and difficulty level.
+    '''
 
-        super().__init__(self, guild, textChannel, cats, diff)
+    ANSWER_TIME = 10
+
+    def __init__(self, guild: discord.Guild=None, textChannel: discord.TextChannel=None, cats:str='', diff:str='', speed: float=1.0):
+
+        super().__init__(guild, textChannel, cats, diff)
+        self.speed = speed
         self.gameStart = False
-        self.tossupStart = False
+        self.partStart = False
+        self.awaitingAnswer = False
+        self.judging = False
+        self.timeUp = False
+        self.questionEnd = True
+        self.generation = 0
 
-        self.playback_position = AudioTracker()
-        self.buzzWordIndex = None
-        self.leadIn = ''
-        self.bonusParts: Dict[str, str] = []
+        self.bonus: Optional[Dict] = None
+        self.nextBonus: Optional[asyncio.Task] = None
+        self.currentPart = 0
 
         self.DIRECTORY_PATH = f'temp/{self.guild.id}-{self.textChannel.id}'
-        self.TOSSUP_PATH = '/bonus.txt'
-        self.AUDIO_PATH = '/bonus.mp3'
-        self.ANSWER_PATH = '/bonusAnswer.txt'
+        self.LEADIN_PATH = '/leadin'
+        self.PART_PATH = '/part{part}'
+        self.ANSWER_PATH = '/bonusAnswer{part}.txt'
 
         self.bonusesHeard = 0
+        self.bonusesDrawn = 0
 
         path = Path(self.DIRECTORY_PATH)
 
         path.mkdir(parents=True, exist_ok=True)
 
-    def createBonuses(self):
-        self.leadIn, bonuses, answers = fq.fetchTossup(str(self.categories), self.diff)
-        self.bonusParts = {bonuses[i] : answers[i] for i in range(len((bonuses)))}
-        
-    
-    
\ No newline at end of file
+    async def getCatsAndDiff(self, ctx: Context):
+        '''
+        Get the number of bonuses heard, categories, and difficulty level.
+
+        Parameters:
+            ctx (Context): The context of the command.
+
+        Returns:
+            Tuple[int, List[str], str]: The number of bonuses heard, categories, and difficulty level.
+        '''
+
+        return self.bonusesHeard, self.categories, self.diff
+
+    async def prepareBonus(self, slot: int) -> Optional[Dict]:
+        '''
+        Fetch a bonus and synthesize its lead-in and all three parts concurrently as one batch.
+
+        Parameters:
+            slot (int): The directory slot to write the bonus files to, so a prefetch never overwrites the bonus being read.
+
+        Returns:
+            dict: The paths of the prepared bonus, or None if it could not be prepared.
+        '''
+
+        loop = asyncio.get_running_loop()
+        directory = f'{self.DIRECTORY_PATH}/bonus{slot}'
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+        try:
+            leadIn, parts, answers, displayAnswers, category = await loop.run_in_executor(None, fq.fetchBonus, self.diff, str(self.categories))
+
+            texts = [leadIn] + list(parts)
+            audioPaths = [f'{directory}{self.LEADIN_PATH}.mp3'] + [f'{directory}{self.PART_PATH.format(part=i)}.mp3' for i in range(len(parts))]
+            textPaths = [f'{directory}{self.LEADIN_PATH}.txt'] + [f'{directory}{self.PART_PATH.format(part=i)}.txt' for i in range(len(parts))]
+            await asyncio.gather(*[
+                loop.run_in_executor(None, fq.saveSpeaking, text, 1.0, textPath, audioPath)
+                for text, textPath, audioPath in zip(texts, textPaths, audioPaths)
+            ])
+            if self.speed != 1.0:
+                stretched = await asyncio.gather(*[
+                    loop.run_in_executor(None, ts.stretchBundle, audioPath, None, self.speed) for audioPath in audioPaths
+                ])
+                audioPaths = [audioPath for audioPath, _ in stretched]
+
+            answerPaths = []
+            for i in range(len(parts)):
+                answerPath = f'{directory}{self.ANSWER_PATH.format(part=i)}'
+                async with aiofiles.open(answerPath, 'w', encoding='utf-8') as answerFile:
+                    await answerFile.write(answers[i] + '\n')
+                    await answerFile.write(displayAnswers[i])
+                answerPaths.append(answerPath)
+
+            return {
+                'leadIn': leadIn,
+                'parts': list(parts),
+                'leadInAudio': audioPaths[0],
+                'partAudio': audioPaths[1:],
+                'answerPaths': answerPaths,
+                'displayAnswers': displayAnswers,
+                'category': category,
+            }
+        except Exception as e:
+            logging.error(f'Error while preparing bonus: {e}')
+            return None
+
+    def prefetchBonus(self) -> None:
+        '''
+        Start preparing the next bonus in the background while the current one is being read.
+        '''
+
+        self.bonusesDrawn += 1
+        self.nextBonus = asyncio.create_task(self.prepareBonus(self.bonusesDrawn % 2))
+
+    async def createBonus(self) -> bool:
+        '''
+        Make the next bonus current, preparing it now if no prefetch is available, and prefetch the one after it.
+
+        Returns:
+            bool: True if a bonus is ready to be read.
+        '''
+
+        if self.nextBonus is None:
+            self.prefetchBonus()
+
+        bonus = await self.nextBonus
+        if bonus is None:
+            # A failed prefetch gets one synchronous retry before giving up
+            self.prefetchBonus()
+            bonus = await self.nextBonus
+        self.nextBonus = None
+        if bonus is None:
+            return False
+
+        self.bonus = bonus
+        self.currentPart = 0
+        self.prefetchBonus()
+        return True
+
+    async def playBonus(self, ctx: Context) -> None:
+        '''
+        Start reading the current bonus with its lead-in followed by the first part.
+
+        Parameters:
+            ctx (Context): The context of the command.
+
+        Returns:
+            None
+        '''
+
+        self.gameStart = True
+        self.questionEnd = False
+        self.bonusesHeard += 1
+
+        await self.playAudio(ctx, self.bonus['leadInAudio'], lambda: self.playPart(ctx))
+
+    async def playPart(self, ctx: Context) -> None:
+        '''
+        Read the current part and open the answer window once it is finished.
+
+        Parameters:
+            ctx (Context): The context of the command, or the channel the game is played in.
+
+        Returns:
+            None
+        '''
+
+        if self.questionEnd:
+            return
+
+        self.partStart = True
+
+        async def partEnded():
+            self.partStart = False
+            if self.questionEnd:
+                return
+            self.awaitingAnswer = True
+            self.timeUp = False
+            part = self.currentPart
+            self.timer.stopped = False
+            self.timer.paused = False
+            await self.timer.start_timer(self.ANSWER_TIME, ctx)
+            if part != self.currentPart or self.questionEnd:
+                return
+            if self.judging:
+                # The answer being judged decides, but a prompt can no longer be answered
+                self.timeUp = True
+            elif self.awaitingAnswer:
+                self.awaitingAnswer = False
+                queueSend(ctx, embed=create_embed('Result', 'Time is up.'), priority=PRIORITY_GAME)
+                await self.advance(ctx)
+
+        await self.playAudio(ctx, self.bonus['partAudio'][self.currentPart], partEnded)
+
+    async def playAudio(self, ctx: Context, audioPath: str, onFinished) -> None:
+        '''
+        Play an audio file on the guild voice client and run a coroutine once it is finished.
+
+        Parameters:
+            ctx (Context): The context of the command, or the channel the game is played in.
+            audioPath (str): The path of the audio file to play.
+            onFinished (Callable[[], Coroutine]): Called on the bot loop when playback ends.
+
+        Returns:
+            None
+        '''
+
+        loop = asyncio.get_running_loop()
+        self.generation += 1
+        generation = self.generation
+
+        async def finished():
+            # Playback of an earlier part or bonus can end after the game moved on, e.g. after !nextbonus
+            if generation == self.generation:
+                await onFinished()
+
+        def audioEnded(error):
+            if error:
+                logging.error(f'Error: {error}')
+            asyncio.run_coroutine_threadsafe(finished(), loop)
+
+        try:
+            self.guild.voice_client.play(discord.FFmpegPCMAudio(audioPath), after=audioEnded)
+        except Exception as e:
+            logging.error(f'Error during audio playback: {e}')
+            queueSend(ctx, embed=create_embed('Error', 'Failed to play audio. Please try again.'))
+
+    async def checkAnswer(self, authorID: int, answer: str):
+        '''
+        Check the provided answer against the answer of the current part and update player scores accordingly.
+        All parts are synthesized before the bonus is read, so judging never waits on synthesis.
+
+        Parameters:
+            authorID (int): The ID of the player providing the answer.
+            answer (str): The answer provided by the player.
+
+        Returns:
+            tuple: A message indicating correctness and the status of the answer ('accept', 'reject', or 'prompt'),
+                or (None, None) if another answer to the part is already being judged.
+        '''
+
+        if not self.awaitingAnswer:
+            return None, None
+        # Claim the part before the first await, so an answer sent meanwhile is not judged and scored too
+        self.awaitingAnswer = False
+        self.judging = True
+        try:
+            correct = await fq.checkAnswer(answer, self.bonus['answerPaths'][self.currentPart])
+        finally:
+            self.judging = False
+        msg = ''
+        if correct == 'accept':
+            player = self.players.record(authorID, 'bonus')
+            if player is not None:
+                statsStore.record(self.guild.id, authorID, player.name, self.bonus['category'], 'bonus')
+            msg = 'You are correct!'
+        elif correct == 'prompt' and self.timeUp:
+            msg = 'Your answer is close, but time is up.'
+            correct = 'reject'
+        elif correct == 'prompt':
+            msg = 'Your answer is close. Prompt?'
+            self.awaitingAnswer = True
+        else:
+            msg = 'You are incorrect.'
+        return msg, correct
+
+    async def advance(self, ctx: Context) -> None:
+        '''
+        Reveal the answer to the current part, then read the next part or finish the bonus.
+
+        Parameters:
+            ctx (Context): The context of the command, or the channel the game is played in.
+
+        Returns:
+            None
+        '''
+
+        self.timer.stop()
+        displayAnswer = self.bonus['displayAnswers'][self.currentPart].strip().replace('<b>', '**').replace('</b>', '**').replace('<u>', '__').replace('</u>', '__')
+        queueSend(ctx, embed=create_embed(f'Part {self.currentPart + 1}', f"{self.bonus['parts'][self.currentPart]}\n\nAnswer: {displayAnswer}"))
+
+        self.currentPart += 1
+        if self.currentPart < len(self.bonus['parts']):
+            await self.playPart(ctx)
+        else:
+            self.questionEnd = True
+            queueSend(ctx, embed=create_embed('Bonus Finished', 'To get the next bonus, type !nextbonus'))
+
+    async def stopBonus(self, channel: discord.TextChannel) -> None:
+        '''
+        Stop reading the current bonus.
+
+        Parameters:
+            channel (discord.TextChannel): The text channel where the bonus is being read.
+
+        Returns:
+            None
+        '''
+
+        self.partStart = False
+        self.awaitingAnswer = False
+        self.questionEnd = True
+        self.timer.stop()
+        logging.info('Bonus ended')
+        if self.guild.voice_client:
+            self.guild.voice_client.stop()
+
+        if not self.gameStart:
+            if self.nextBonus is not None:
+                self.nextBonus.cancel()
+                self.nextBonus = None
+            queueSend(channel, content='Game Ended.')
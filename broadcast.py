@@ -0,0 +1,218 @@
+import asyncio
+import io
+import logging
+import secrets
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional
+import discord
+from discord.oggparse import OggStream
+import util.audioProcessing as ap
+import util.forcedAlignment as fa
+import util.timeStretch as ts
+from tossup import TossupGame
+from util.questionBuffer import BloomFilter, nextTossup
+from util.warmPool import BUNDLE_FILES, warmPool
+from util.memoryBudget import memoryAccountant, sizeOf, PRIORITY_CACHE
+
+def encodeOpusFrames(audioPath: str) -> List[bytes]:
+    '''
+    Encodes an audio file to 20ms Opus packets once with a single FFmpeg process, so every room can send the
+    same packets without decoding or encoding anything at play time.
+
+    Args:
+        audioPath (str): The path of the audio file.
+
+    Returns:
+        List[bytes]: The Opus packets in playback order.
+    '''
+
+    process = subprocess.run(
+        ['ffmpeg', '-loglevel', 'error', '-i', audioPath, '-map_metadata', '-1', '-f', 'opus', '-c:a', 'libopus',
+         '-ar', '48000', '-ac', '2', '-b:a', '96k', 'pipe:1'],
+        capture_output=True, check=True
+    )
+    packets = OggStream(io.BytesIO(process.stdout)).iter_packets()
+    return [packet for packet in packets if not packet.startswith((b'OpusHead', b'OpusTags'))]
+
+class SharedOpusSource(discord.AudioSource):
+    '''
+    Audio source reading from Opus packets shared between rooms. Each room has its own position, so pausing one
+    room on a buzz does not affect the others.
+    '''
+
+    def __init__(self, frames: List[bytes]):
+        self.frames = frames
+        self.position = 0
+
+    def read(self) -> bytes:
+        if self.position >= len(self.frames):
+            return b''
+        frame = self.frames[self.position]
+        self.position += 1
+        return frame
+
+    def is_opus(self) -> bool:
+        return True
+
+class BroadcastSession:
+    '''
+    Class representing a broadcast of the same tossups to several rooms.
+
+    Each question is fetched, synthesized, aligned and encoded once for the whole session. Rooms move through
+    the questions at their own pace, so buzzes, pauses and scores stay independent per room.
+
+        Attributes:
+            code (str): The code other rooms use to join the session.
+            categories (List[str]): Categories of the session questions.
+            diff (str): Difficulty level of the session questions.
+            speed (float): Reading speed of the session questions.
+            rooms (Dict[tuple, BroadcastGame]): The rooms of the session by (guild id, channel id).
+
+        Methods:
+            question (index: int) -> dict: Get the prepared question at an index, preparing it once for all rooms.
+            addRoom (guild: Guild, textChannel: TextChannel) -> BroadcastGame: Create a room for a channel.
+            removeRoom (key: tuple): Remove a room that ended, so it no longer holds back pruning.
+            close (): Remove the files of the session.
+    '''
+
+    def __init__(self, cats: str='', diff: str='', speed: float=1.0):
+        self.code = secrets.token_hex(3).upper()
+        self.cats = cats
+        self.diff = diff
+        self.speed = speed
+        self.categories: List[str] = []
+        self.rooms: Dict[tuple, 'BroadcastGame'] = {}
+        self.questions: Dict[int, asyncio.Task] = {}
+        self.heard = BloomFilter()
+        self.DIRECTORY_PATH = f'temp/broadcast/{self.code}'
+        memoryAccountant.register(self, f'broadcast:{self.code}', PRIORITY_CACHE)
+
+    def memoryFootprint(self) -> int:
+        return sizeOf(*(task.result() for task in self.questions.values() if task.done() and not task.cancelled() and task.result()))
+
+    def evictMemory(self) -> None:
+        # Drop prepared questions no room has reached yet, they are prepared again when a room asks for them.
+        # Questions still being prepared are kept, a room may be awaiting them.
+        current = max((room.questionIndex for room in self.rooms.values()), default=0)
+        for index in [i for i, task in self.questions.items() if i >= current and task.done()]:
+            self.questions.pop(index)
+
+    def addRoom(self, guild: discord.Guild, textChannel: discord.TextChannel) -> 'BroadcastGame':
+        room = BroadcastGame(self, guild, textChannel)
+        self.categories = room.categories
+        self.rooms[(guild.id, textChannel.id)] = room
+        return room
+
+    def removeRoom(self, key: tuple) -> None:
+        self.rooms.pop(key, None)
+        self.pruneQuestions()
+
+    async def question(self, index: int) -> Optional[dict]:
+        '''
+        Get the prepared question at an index. The first room to ask starts the preparation and every other room
+        awaits the same result, and the following question is prefetched.
+
+        Parameters:
+            index (int): The index of the question in the session.
+
+        Returns:
+            dict: The directory, playback paths and Opus frames of the question, or None if it could not be prepared.
+        '''
+
+        for i in (index, index + 1):
+            if i not in self.questions:
+                self.questions[i] = asyncio.create_task(self.prepareQuestion(i))
+        self.pruneQuestions()
+        task = self.questions[index]
+        question = await task
+        if question is None and self.questions.get(index) is task:
+            # Let the next room that asks retry instead of every room failing on the same question
+            self.questions.pop(index)
+        return question
+
+    async def prepareQuestion(self, index: int) -> Optional[dict]:
+        loop = asyncio.get_running_loop()
+        directory = f'{self.DIRECTORY_PATH}/{index}'
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        categories = str(self.categories)
+
+        try:
+            bundle = await warmPool.take((self.diff, categories), self.heard)
+            if bundle is not None:
+                await loop.run_in_executor(None, warmPool.moveBundle, bundle, directory)
+                category, difficulty = bundle['category'], bundle['difficulty']
+            else:
+                tossup = await nextTossup(self.diff, categories, self.heard)
+                if tossup is None or not await fa.generateSyncMap(directory_path=directory, audio_file_path=BUNDLE_FILES['audio'],
+                                                                   text_file_path=BUNDLE_FILES['text'],
+                                                                   sync_map_file_path=BUNDLE_FILES['syncMap'],
+                                                                   answer_file_path=BUNDLE_FILES['answer'], reading_speed=1.0,
+                                                                   subjects=categories, question_numbers=self.diff, tossup=tossup):
+                    return None
+                category, difficulty = tossup['category'], tossup['difficulty']
+
+            audioPath, syncMapPath = await loop.run_in_executor(
+                None, ts.stretchBundle, f"{directory}{BUNDLE_FILES['audio']}", f"{directory}{BUNDLE_FILES['syncMap']}", self.speed)
+            frames = await loop.run_in_executor(None, encodeOpusFrames, audioPath)
+            duration = ap.readDuration(f"{directory}{BUNDLE_FILES['audio']}")
+            return {'directory': directory, 'duration': duration / self.speed if duration is not None else None, 'category': category, 'difficulty': difficulty, 'audioPath': audioPath, 'syncMapPath': syncMapPath, 'frames': frames}
+        except Exception as e:
+            logging.error(f'Error while preparing broadcast question {index} in session {self.code}: {e}')
+            return None
+
+    def pruneQuestions(self) -> None:
+        # Keep the question the slowest room is still revealing, drop everything before it
+        if not self.rooms:
+            return
+        oldest = min(room.questionIndex for room in self.rooms.values()) - 1
+        for index in [i for i in self.questions if i < oldest]:
+            self.questions.pop(index).cancel()
+            shutil.rmtree(f'{self.DIRECTORY_PATH}/{index}', ignore_errors=True)
+
+    def close(self) -> None:
+        for task in self.questions.values():
+            task.cancel()
+        self.questions.clear()
+        shutil.rmtree(self.DIRECTORY_PATH, ignore_errors=True)
+
+class BroadcastGame(TossupGame):
+    '''
+    Class representing one room of a broadcast session. It plays and scores like a TossupGame, but takes its
+    questions and audio frames from the session instead of preparing its own.
+    '''
+
+    def __init__(self, session: BroadcastSession, guild: discord.Guild=None, textChannel: discord.TextChannel=None):
+
+        super().__init__(guild, textChannel, session.cats, session.diff, session.speed)
+        self.session = session
+        self.questionIndex = 0
+        self.frames: List[bytes] = []
+
+    async def loadTossup(self) -> bool:
+
+        question = await self.session.question(self.questionIndex)
+        if question is None:
+            return False
+
+        self.questionIndex += 1
+        self.DIRECTORY_PATH = question['directory']
+        self.playbackAudioPath = question['audioPath']
+        self.playbackSyncMapPath = question['syncMapPath']
+        self.frames = question['frames']
+        self.audioDuration = question['duration']
+        self.category = question['category']
+        self.difficulty = question['difficulty']
+        return True
+
+    def memoryFootprint(self) -> int:
+        # The frames belong to the session and are counted there
+        return super().memoryFootprint() - sizeOf(self.frames)
+
+    def createAudioSource(self) -> discord.AudioSource:
+        return SharedOpusSource(self.frames)
+
+    def close(self) -> None:
+        super().close()
+        self.session.removeRoom((self.guild.id, self.textChannel.id))
@@ -0,0 +1,166 @@
+import logging
+from typing import Dict
+import discord
+import discord.ext.commands as commands
+
+from bonus import BonusGame
+from util.catsAndDiffSetup import GameSetupView
+from util.sendQueue import queueSend, PRIORITY_GAME
+from util.text import TEXT
+from util.utils import create_embed
+from util.voiceManager import voiceManager, VoiceConnectionError
+
+class BonusCommands(commands.Cog):
+    def __init__(self, bot: commands.AutoShardedBot) -> None:
+        self.bot = bot
+        self.concurrentBonuses: Dict[tuple, BonusGame] = {}
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message) -> None:
+        if message.author == self.bot.user or message.content.startswith(self.bot.command_prefix):
+            return
+
+        game_key = (message.guild.id, message.channel.id)
+
+        #process answers to bonus parts
+        if game_key in self.concurrentBonuses and self.concurrentBonuses[game_key].awaitingAnswer:
+            game = self.concurrentBonuses[game_key]
+            if not await game.checkForPlayer(message.author.id):
+                return
+            await BonusCommands.getAnswer(message, message.content, game)
+
+    @commands.command(help=TEXT["help"][9])
+    async def bonus(self, ctx: commands.Context) -> None:
+        logging.info(f"{ctx.author} invoked bonus")
+
+        if not ctx.author.voice or not ctx.author.voice.channel:
+            logging.warning(f"{ctx.author} tried to start a game without joining a voice channel.")
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["no_voice_channel"]))
+            return
+
+        game_key = (ctx.guild.id, ctx.channel.id)
+        tossupCog = self.bot.get_cog('TossupCommands')
+        if (game_key in self.concurrentBonuses and self.concurrentBonuses[game_key].gameStart) or \
+                (tossupCog and game_key in tossupCog.concurrentTossups and tossupCog.concurrentTossups[game_key].gameStart):
+            queueSend(ctx, embed=create_embed('Error', TEXT['error']['already_started'] + ' Please end the current game first before trying again.'))
+            return
+
+        view = GameSetupView(ctx)
+
+        await ctx.send(embed=create_embed('Game Setup', TEXT["game"]["instructions"]), view=view)
+        await view.wait()
+
+        if await BonusCommands.initializeGame(ctx, self.concurrentBonuses, view.categories, view.difficulties, view.speed):
+            game = self.concurrentBonuses[game_key]
+            queueSend(ctx, embed=create_embed('Reading Bonus', TEXT["game"]["reading_bonus"]))
+            await game.playBonus(ctx)
+
+    @commands.command(help=TEXT["help"][10])
+    async def joinbonus(self, ctx: commands.Context) -> None:
+        game_key = (ctx.guild.id, ctx.channel.id)
+        if game_key not in self.concurrentBonuses:
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["game_not_started"]))
+        elif await self.concurrentBonuses[game_key].checkForPlayer(ctx.author.id):
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["failed_to_add"]))
+        elif await self.concurrentBonuses[game_key].addPlayer(ctx.author):
+            queueSend(ctx, embed=create_embed('Player Added', TEXT["game"]["player_added"].format(user=ctx.author.display_name)))
+        else:
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["failed_to_add"]))
+
+    @commands.command(help=TEXT["help"][11])
+    async def nextbonus(self, ctx: commands.Context) -> None:
+        logging.info(f"{ctx.author} invoked nextbonus command in {ctx.channel.name}")
+
+        game_key = (ctx.guild.id, ctx.channel.id)
+
+        if game_key not in self.concurrentBonuses:
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["game_not_started"]))
+            return
+
+        game = self.concurrentBonuses[game_key]
+
+        if not game.gameStart or not await game.checkForPlayer(ctx.author.id):
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
+            return
+
+        if not game.questionEnd:
+            await game.stopBonus(ctx.channel)
+
+        if not await game.createBonus():
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["something_wrong"]))
+        else:
+            queueSend(ctx, embed=create_embed('Reading Bonus', TEXT["game"]["reading_bonus"]))
+            await game.playBonus(ctx)
+
+    @commands.command(help=TEXT["help"][12])
+    async def endbonus(self, ctx: commands.Context) -> None:
+        game_key = (ctx.guild.id, ctx.channel.id)
+
+        if game_key not in self.concurrentBonuses:
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["game_not_started"]))
+            return
+
+        game = self.concurrentBonuses[game_key]
+
+        if not await game.checkForPlayer(ctx.author.id):
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["not_joined"].format(user=ctx.author.display_name)))
+            return
+
+        playerScores = await game.getScores(ctx)
+        queueSend(ctx, embed=create_embed('Scores', TEXT["game"]["final_scores"].format(scores=playerScores)))
+        game.gameStart = False
+        await game.stopBonus(ctx.channel)
+        self.concurrentBonuses.pop(game_key, None)
+        voiceManager.release(ctx.guild, game_key)
+        logging.info(f"Bonus game successfully ended in {ctx.channel.name} for guild {ctx.guild.name}.")
+
+    #Helper Functions
+    async def initializeGame(ctx: commands.Context, concurrentGames: dict[tuple, BonusGame], cats: str, diff: str, speed: float=1.0) -> bool:
+        try:
+            game_key = (ctx.guild.id, ctx.channel.id)
+
+            voice_channel = ctx.author.voice.channel
+            try:
+                await voiceManager.acquire(voice_channel, game_key)
+            except VoiceConnectionError as e:
+                logging.error(f'Error connecting to voice channel: {e}')
+                queueSend(ctx, embed=create_embed('Error', TEXT["error"][e.textKey]))
+                return False
+
+            game = BonusGame(cats=cats, diff=diff, guild=ctx.guild, textChannel=ctx.channel, speed=speed)
+            concurrentGames[game_key] = game
+            started = False
+            try:
+                await game.addPlayer(ctx.author)
+                logging.info(f"Bonus game created in {ctx.guild.name} at channel {ctx.channel.name}")
+
+                if not await game.createBonus():
+                    queueSend(ctx, embed=create_embed('Error', TEXT["error"]["something_wrong"]))
+                    logging.error(f"Failed to create bonus in {ctx.channel.name}")
+                    return False
+                started = True
+            finally:
+                if not started:
+                    # Give back the connection of a game that never started
+                    if concurrentGames.get(game_key) is game:
+                        concurrentGames.pop(game_key)
+                    voiceManager.release(ctx.guild, game_key)
+            return True
+        except Exception as e:
+            logging.error(f"Error while starting the bonus game: {e}")
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["failed_to_start"]))
+            return False
+
+    async def getAnswer(message: discord.Message, userAnswer: str, game: BonusGame) -> None:
+        try:
+            correctOrNot, correct = await game.checkAnswer(message.author.id, userAnswer)
+            if correct is None:
+                return
+            queueSend(message.channel, embed=create_embed('Result', f'You answered: {userAnswer}\n{correctOrNot}'), priority=PRIORITY_GAME)
+            if correct != 'prompt':
+                await game.advance(message.channel)
+        except Exception as e:
+            logging.error(f'Error sending message: {e}')
+
+async def setup(bot: commands.Bot) -> None:
+    await bot.add_cog(BonusCommands(bot))
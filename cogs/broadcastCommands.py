@@ -0,0 +1,124 @@
+import logging
+from typing import Dict
+import discord.ext.commands as commands
+
+from broadcast import BroadcastSession
+from util.catsAndDiffSetup import GameSetupView
+from util.sendQueue import queueSend
+from util.text import TEXT
+from util.utils import create_embed
+from util.voiceManager import voiceManager, VoiceConnectionError
+
+class BroadcastCommands(commands.Cog):
+    def __init__(self, bot: commands.AutoShardedBot) -> None:
+        self.bot = bot
+        self.sessions: Dict[str, BroadcastSession] = {}
+
+    @commands.command(help=TEXT["help"][13])
+    async def broadcast(self, ctx: commands.Context) -> None:
+        logging.info(f"{ctx.author} invoked broadcast")
+
+        if not ctx.author.voice or not ctx.author.voice.channel:
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["no_voice_channel"]))
+            return
+
+        view = GameSetupView(ctx)
+
+        await ctx.send(embed=create_embed('Broadcast Setup', TEXT["game"]["instructions"]), view=view)
+        await view.wait()
+
+        session = BroadcastSession(view.categories, view.difficulties, view.speed)
+        self.sessions[session.code] = session
+        if await BroadcastCommands.joinRoom(self.bot, ctx, session):
+            queueSend(ctx, embed=create_embed('Broadcast Started', TEXT["game"]["broadcast_started"].format(code=session.code)))
+        else:
+            self.sessions.pop(session.code, None)
+            session.close()
+
+    @commands.command(help=TEXT["help"][14])
+    async def joinbroadcast(self, ctx: commands.Context, code: str='') -> None:
+        logging.info(f"{ctx.author} invoked joinbroadcast {code}")
+
+        session = self.sessions.get(code.upper())
+        if session is None:
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["no_broadcast"].format(code=code)))
+            return
+
+        if not ctx.author.voice or not ctx.author.voice.channel:
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["no_voice_channel"]))
+            return
+
+        if await BroadcastCommands.joinRoom(self.bot, ctx, session):
+            queueSend(ctx, embed=create_embed('Broadcast Joined', TEXT["game"]["broadcast_joined"].format(code=session.code, rooms=len(session.rooms))))
+
+    @commands.command(help=TEXT["help"][15])
+    async def endbroadcast(self, ctx: commands.Context, code: str='') -> None:
+        session = self.sessions.get(code.upper())
+        if session is None:
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["no_broadcast"].format(code=code)))
+            return
+
+        if (ctx.guild.id, ctx.channel.id) not in session.rooms:
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
+            return
+
+        tossupCog = self.bot.get_cog('TossupCommands')
+        async def endRoom(game_key: tuple, room) -> None:
+            room.gameStart = False
+            await room.stopTossup(room.textChannel)
+            room.close()
+            if tossupCog and tossupCog.concurrentTossups.get(game_key) is room:
+                tossupCog.concurrentTossups.pop(game_key)
+            voiceManager.release(room.guild, game_key)
+
+        for game_key, room in list(session.rooms.items()):
+            await room.actor.submit('command', endRoom, game_key, room)
+        self.sessions.pop(session.code)
+        session.close()
+        logging.info(f"Broadcast {session.code} ended by {ctx.author}")
+
+    #Helper Functions
+    async def joinRoom(bot: commands.Bot, ctx: commands.Context, session: BroadcastSession) -> bool:
+        '''
+        Create a room of a broadcast session in the channel of the command. The room is registered as the tossup
+        game of the channel, so buzzing, answering, !start and !next work exactly like a normal game.
+        '''
+
+        try:
+            game_key = (ctx.guild.id, ctx.channel.id)
+            tossupCog = bot.get_cog('TossupCommands')
+            if game_key in tossupCog.concurrentTossups and tossupCog.concurrentTossups[game_key].gameStart:
+                queueSend(ctx, embed=create_embed('Error', TEXT['error']['already_started'] + ' Please end the current game first before trying again.'))
+                return False
+
+            try:
+                await voiceManager.acquire(ctx.author.voice.channel, game_key)
+            except VoiceConnectionError as e:
+                logging.error(f'Error connecting to voice channel: {e}')
+                queueSend(ctx, embed=create_embed('Error', TEXT["error"][e.textKey]))
+                return False
+
+            room = session.addRoom(ctx.guild, ctx.channel)
+            tossupCog.concurrentTossups[game_key] = room
+            joined = False
+            try:
+                await room.addPlayer(ctx.author)
+                if not await room.createTossup():
+                    queueSend(ctx, embed=create_embed('Error', TEXT["error"]["something_wrong"]))
+                    return False
+                joined = True
+            finally:
+                if not joined:
+                    # Give back the connection of a room that never joined
+                    if tossupCog.concurrentTossups.get(game_key) is room:
+                        tossupCog.concurrentTossups.pop(game_key)
+                    session.rooms.pop(game_key, None)
+                    voiceManager.release(ctx.guild, game_key)
+            return True
+        except Exception as e:
+            logging.error(f"Error while joining broadcast {session.code}: {e}")
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["failed_to_start"]))
+            return False
+
+async def setup(bot: commands.Bot) -> None:
+    await bot.add_cog(BroadcastCommands(bot))
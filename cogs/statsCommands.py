@@ -0,0 +1,49 @@
+import logging
+import discord.ext.commands as commands
+
+from util.statsStore import statsStore
+from util.text import TEXT
+from util.utils import create_embed
+
+class StatsCommands(commands.Cog):
+    def __init__(self, bot: commands.AutoShardedBot) -> None:
+        self.bot = bot
+
+    @commands.command(help=TEXT["help"][16])
+    async def leaderboard(self, ctx: commands.Context) -> None:
+        logging.info(f"{ctx.author} invoked leaderboard command in {ctx.channel.name}")
+
+        rows = await statsStore.leaderboard(ctx.guild.id)
+        if not rows:
+            await ctx.send(embed=create_embed('Leaderboard', TEXT["game"]["no_stats"]))
+            return
+
+        board = '\n'.join(f'{rank}. {name} | {points}' for rank, name, points in rows)
+        await ctx.send(embed=create_embed('Leaderboard', board))
+
+    @commands.command(help=TEXT["help"][17])
+    async def mystats(self, ctx: commands.Context) -> None:
+        logging.info(f"{ctx.author} invoked mystats command in {ctx.channel.name}")
+
+        results = await statsStore.playerStats(ctx.guild.id, ctx.author.id)
+        analytics = await statsStore.buzzSummaries(ctx.author.id)
+        summary = analytics.summary(ctx.author.id)
+        if not results and not summary:
+            await ctx.send(embed=create_embed('My Stats', TEXT["game"]["no_stats"]))
+            return
+
+        lines = [f'{category or "Unknown"} | Tens: {tens} | Powers: {powers} | Negs: {negs} | Bonus Parts: {bonusParts}'
+                 for category, tens, powers, negs, bonusParts in results]
+        if summary:
+            lines.append('\n**Buzz position** (0% is the first word, 100% the end of the question)')
+            for category, sketch in summary.items():
+                lines.append(f'{category} | Buzzes: {sketch.count} | Mean: {sketch.mean:.0%} | '
+                             f'Median: {sketch.quantile(0.5):.0%} | Earliest 10%: {sketch.quantile(0.1):.0%}')
+            lines.append('\n**Buzz position by difficulty**')
+            for difficulty, sketch in analytics.byDifficulty(ctx.author.id).items():
+                lines.append(f'Difficulty {difficulty} | Buzzes: {sketch.count} | Mean: {sketch.mean:.0%} | '
+                             f'Median: {sketch.quantile(0.5):.0%}')
+        await ctx.send(embed=create_embed(f'Stats for {ctx.author.display_name}', '\n'.join(lines)))
+
+async def setup(bot: commands.Bot) -> None:
+    await bot.add_cog(StatsCommands(bot))
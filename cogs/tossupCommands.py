@@ -1,19 +1,38 @@
+import asyncio
 import logging
 from typing import Dict
 import discord
 import discord.ext.commands as commands
 
 from tossup import TossupGame
+import util.fetchQuestions as fq
+import util.tracing as tracing
+import util.voiceBuzz as voiceBuzz
 from util.catsAndDiffSetup import GameSetupView
+from util.sendQueue import queueSend, PRIORITY_GAME
+from util.snapshots import snapshotStore
 from util.text import TEXT
+from util.upstream import UpstreamError
 from util.utils import create_embed
+from util.voiceManager import voiceManager, VoiceConnectionError
 
 class TossupCommands(commands.Cog):
     def __init__(self, bot: commands.AutoShardedBot) -> None:
         self.bot = bot
         self.concurrentTossups: Dict[tuple, TossupGame] = {}
         self.setup: Dict[tuple, bool] = {}
-        
+
+    async def cog_load(self) -> None:
+        snapshotStore.load()
+        snapshotStore.start(lambda: self.concurrentTossups)
+
+    async def cog_before_invoke(self, ctx: commands.Context) -> None:
+        game_key = (ctx.guild.id, ctx.channel.id)
+        if ctx.command.name == 'play':
+            # A new game replaces the one from before the restart
+            snapshotStore.take(game_key)
+        elif game_key not in self.concurrentTossups:
+            await TossupCommands.resumeGame(ctx, self.concurrentTossups)
     
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message) -> None:
@@ -29,23 +48,8 @@ class TossupCommands(commands.Cog):
             pass
         elif game_key in self.concurrentTossups and not self.concurrentTossups[game_key].questionEnd:
             game = self.concurrentTossups[game_key]
-            if message.content == 'buzz':
-                if not await TossupCommands.isPlayerInGame(message, game):
-                    return
-                elif game.buzzedIn:
-                    await message.channel.send(embed=create_embed('Error', TEXT["error"]["cannot_buzz"]))
-                else:
-                    await game.pauseTossup(message)
-                    await message.channel.send(embed=create_embed('Buzzed In', TEXT["game"]["buzzed_in"].format(user=message.author.display_name)))
-            
-            elif game.buzzedIn:
-                if not await TossupCommands.isPlayerInGame(message, game):
-                    return
-                
-                if game.buzzedInBy != message.author.id:
-                    await message.channel.send(embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
-                else:
-                    await TossupCommands.getAnswer(message, message.content, game)
+            # The actor of the game checks each message against the state of the game when its turn comes
+            game.actor.post('buzz' if message.content == 'buzz' else 'answer', message, game.generation)
 
     #Game loop commands
     @commands.command(help=TEXT["help"][0])
@@ -54,17 +58,17 @@ class TossupCommands(commands.Cog):
     
         if not ctx.author.voice or not ctx.author.voice.channel:
             logging.warning(f"{ctx.author} tried to start a game without joining a voice channel.")
-            await ctx.send(embed=create_embed('Error', TEXT["error"]["no_voice_channel"]))
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["no_voice_channel"]))
             return
         
-        view = GameSetupView(ctx)
+        view = GameSetupView(ctx, autoAdvance=True, packets=True)
 
         await ctx.send(embed=create_embed('Game Setup', TEXT["game"]["instructions"]),view=view)
         await view.wait()
 
         #await ctx.send(embed=create_embed('Game Setup', view.categories +"\n" + view.difficulties))
 
-        await TossupCommands.initializeGame(ctx, self.concurrentTossups, view.categories, view.difficulties)
+        await TossupCommands.initializeGame(ctx, self.concurrentTossups, view.categories, view.difficulties, view.speed, view.autoAdvanceGap, view.packet)
 
     @commands.command(help=TEXT["help"][2])
     async def start(self, ctx: commands.Context) -> None:
@@ -80,13 +84,16 @@ class TossupCommands(commands.Cog):
         if not await TossupCommands.isPlayerInGame(ctx.message, game):
             return
         
-        if ctx.guild != game.guild or ctx.channel != game.textChannel:
-            await ctx.send(embed=create_embed('Error', TEXT["error"]["wrong_channel"].format(channel=self.concurrentTossups[(ctx.guild.id, ctx.channel.id)].textChannel.name)))
-        elif game.gameStart:
-            await ctx.send(embed=create_embed('Error', TEXT["error"]["already_started"]))
-        else:
-            await ctx.send(embed=create_embed('Reading Tossup', TEXT["game"]["reading_tossup"]))
-            await game.playTossup(ctx)
+        async def start():
+            if ctx.guild != game.guild or ctx.channel != game.textChannel:
+                queueSend(ctx, embed=create_embed('Error', TEXT["error"]["wrong_channel"].format(channel=self.concurrentTossups[(ctx.guild.id, ctx.channel.id)].textChannel.name)))
+            elif game.gameStart:
+                queueSend(ctx, embed=create_embed('Error', TEXT["error"]["already_started"]))
+            else:
+                queueSend(ctx, embed=create_embed('Reading Tossup', TEXT["game"]["reading_tossup"]))
+                await game.playTossup(ctx)
+
+        await game.actor.submit('command', start)
 
     @commands.command(help=TEXT["help"][5])
     async def next(self, ctx: commands.Context) -> None:
@@ -100,25 +107,43 @@ class TossupCommands(commands.Cog):
         game = self.concurrentTossups[game_key]
 
         if not game.gameStart:
-            await ctx.send(embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
             return
 
         if not await TossupCommands.isPlayerInGame(ctx.message, game):
             return
         
-        if game.buzzedIn:
-            await ctx.send(embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
-            return
-        
-        if game.tossupStart:
-            await game.stopTossup(ctx.channel)
-
-        if not await game.createTossup():
-            await ctx.send(embed=create_embed('Error', TEXT["error"]["something_wrong"]))
-        else:
+        async def advance():
+            if not game.gameStart:
+                # The game ended while the next tossup was being prepared
+                return
+            if game.buzzedIn:
+                queueSend(ctx, embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
+                return
+
+            game.cancelAutoAdvance()
+            if game.tossupStart:
+                await game.stopTossup(ctx.channel)
+
+            if game.packetDone:
+                queueSend(ctx, embed=create_embed('Packet Finished', TEXT["game"]["packet_finished"]))
+                return
+
+            if not await game.createTossup():
+                if game.packetPreparing:
+                    queueSend(ctx, embed=create_embed('Packet', TEXT["game"]["packet_preparing"]))
+                else:
+                    queueSend(ctx, embed=create_embed('Error', TEXT["error"]["something_wrong"]))
+                return
             await game.playTossup(ctx)
 
-        await ctx.send(embed=create_embed('Reading Tossup', TEXT["game"]["reading_tossup"]))
+            queueSend(ctx, embed=create_embed('Reading Tossup', TEXT["game"]["reading_tossup"]))
+
+        if game.packetPreparing:
+            # Wait here rather than in the actor, so buzzes, timers and !end are handled meanwhile
+            queueSend(ctx, embed=create_embed('Packet', TEXT["game"]["packet_preparing"]))
+            await game.packet.waitReady(game.packetIndex)
+        await game.actor.submit('command', advance)
 
     @commands.command(help=TEXT["help"][8])
     async def end(self, ctx: commands.Context) -> None:
@@ -132,7 +157,7 @@ class TossupCommands(commands.Cog):
         game = self.concurrentTossups[game_key]
 
         if not game.gameStart:
-            await ctx.send(embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
             logging.warning(f"{ctx.author} attempted to end a game that hasn't been started in {ctx.channel.name}.")
             return
 
@@ -141,15 +166,23 @@ class TossupCommands(commands.Cog):
             return
         
         # if game.buzzedIn:
-        #     await ctx.send(embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
+        #     queueSend(ctx, embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
         #     logging.warning(f"{ctx.author} attempted to end a game while a tossup was being answered in {ctx.channel.name}.")
         #     return
         
-        await TossupCommands.getscores(self, ctx)
-        await TossupCommands.getinfo(self, ctx)
-        game.gameStart = False
-        await game.stopTossup(ctx.channel)
-        await ctx.voice_client.disconnect()
+        async def end():
+            if not game.gameStart:
+                return
+            await TossupCommands.getscores(self, ctx)
+            await TossupCommands.getinfo(self, ctx)
+            game.gameStart = False
+            game.cancelAutoAdvance()
+            await game.stopTossup(ctx.channel)
+            game.close()
+            self.concurrentTossups.pop(game_key, None)
+            voiceManager.release(ctx.guild, game_key)
+
+        await game.actor.submit('command', end)
         logging.info(f"Game successfully ended in {ctx.channel.name} for guild {ctx.guild.name}.")
 
 
@@ -157,12 +190,12 @@ class TossupCommands(commands.Cog):
     @commands.command(help=TEXT["help"][1])
     async def add(self, ctx: commands.Context) -> None:
         if (ctx.guild.id, ctx.channel.id) not in self.concurrentTossups:
-            await ctx.send(embed=create_embed('Error', TEXT["error"]["game_not_started"]))
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["game_not_started"]))
         else:
             if await self.concurrentTossups[(ctx.guild.id, ctx.channel.id)].addPlayer(ctx.author):
-                await ctx.send(embed=create_embed('Player Added', TEXT["game"]["player_added"].format(user=ctx.author.display_name)))
+                queueSend(ctx, embed=create_embed('Player Added', TEXT["game"]["player_added"].format(user=ctx.author.display_name)))
             else:
-                await ctx.send(embed=create_embed('Error', TEXT["error"]["failed_to_add"]))
+                queueSend(ctx, embed=create_embed('Error', TEXT["error"]["failed_to_add"]))
 
     @commands.command(help=TEXT["help"][7])
     async def getinfo(self, ctx: commands.Context) -> None:
@@ -176,7 +209,7 @@ class TossupCommands(commands.Cog):
         game = self.concurrentTossups[game_key]
 
         if not game.gameStart:
-            await ctx.send(embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
             logging.warning(f"{ctx.author} attempted to end a game that hasn't been started in {ctx.channel.name}.")
             return
 
@@ -185,10 +218,10 @@ class TossupCommands(commands.Cog):
             return
 
         tossupsHeard, categories, difficulties = await game.getCatsAndDiff(ctx)
-        await ctx.send(embed=create_embed('Game Info', TEXT["game"]["game_info"].format(tossups=tossupsHeard, categories=categories, difficulties=difficulties)))
+        queueSend(ctx, embed=create_embed('Game Info', TEXT["game"]["game_info"].format(tossups=tossupsHeard, categories=categories, difficulties=difficulties, speed=game.speed)))
 
     @commands.command(help=TEXT["help"][6])
-    async def getscores(self, ctx: commands.Context) -> None:
+    async def getscores(self, ctx: commands.Context, page: int=1) -> None:
         logging.info(f"{ctx.author} invoked getscores command in {ctx.channel.name}")
 
         game_key = (ctx.guild.id, ctx.channel.id)
@@ -199,21 +232,21 @@ class TossupCommands(commands.Cog):
         game = self.concurrentTossups[game_key]
 
         if not game.gameStart:
-            await ctx.send(embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
             return
 
         if not await TossupCommands.isPlayerInGame(ctx.message, game):
             return
         
         if game.buzzedIn:
-            await ctx.send(embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["cannot_use_command"]))
             return
         
-        playerScores = await game.getScores(ctx)
-        await ctx.send(embed=create_embed('Scores', TEXT["game"]["scores"].format(scores=playerScores)))
+        playerScores = await game.getScores(ctx, page)
+        queueSend(ctx, embed=create_embed('Scores', TEXT["game"]["scores"].format(scores=playerScores)))
 
     #Helper Functions
-    async def initializeGame(ctx: commands.Context, concurrentGames: dict[tuple, TossupGame], cats: str, diff: str) -> bool:
+    async def initializeGame(ctx: commands.Context, concurrentGames: dict[tuple, TossupGame], cats: str, diff: str, speed: float=1.0, autoAdvanceGap: float=None, packet: tuple=None) -> bool:
         try:
             game_key = (ctx.guild.id, ctx.channel.id)
             #print(game_key, game_key in concurrentGames)
@@ -222,63 +255,135 @@ class TossupCommands(commands.Cog):
             #     print(concurrentGames[game_key].initalized)
 
             if game_key in concurrentGames and concurrentGames[game_key].gameStart:
-                await ctx.send(embed=create_embed('Error', TEXT['error']['already_started'] + ' Please end the current game first before trying again.'))
+                queueSend(ctx, embed=create_embed('Error', TEXT['error']['already_started'] + ' Please end the current game first before trying again.'))
                 return False
             
             voice_channel = ctx.author.voice.channel
             logging.info(f'Successfully found voice channel of user')
             try:
-                voice_client = await voice_channel.connect(timeout=10)
-                logging.info(f'Successfully connected to {ctx.author.voice.channel.name} in {ctx.guild.name}')
-            except Exception as e:
+                await voiceManager.acquire(voice_channel, game_key)
+            except VoiceConnectionError as e:
                 logging.error(f'Error connecting to voice channel: {e}')
-
-            concurrentGames[game_key] = TossupGame(cats=cats, diff=diff, guild=ctx.guild, textChannel=ctx.channel)
-            await concurrentGames[game_key].addPlayer(ctx.author)
-            logging.info(f"Game created in {ctx.guild.name} at channel {ctx.channel.name}")
-            
-            if not await concurrentGames[game_key].createTossup():
-                await ctx.send(embed=create_embed('Error', TEXT["error"]["something_wrong"]))
-                concurrentGames.pop(game_key, None)
-                logging.error(f"Failed to create tossup in {ctx.channel.name}")
+                queueSend(ctx, embed=create_embed('Error', TEXT["error"][e.textKey]))
                 return False
-            else:
-                await ctx.send(embed=create_embed('Game Initialized', TEXT["game"]["initialized"]))
-                logging.info(f"Game started successfully in {ctx.guild.name}, channel {ctx.channel.name}")
-                return True
+
+            game = TossupGame(cats=cats, diff=diff, guild=ctx.guild, textChannel=ctx.channel, speed=speed, autoAdvanceGap=autoAdvanceGap)
+            concurrentGames[game_key] = game
+            started = False
+            try:
+                await game.addPlayer(ctx.author)
+                if packet is not None:
+                    setName, number = packet
+                    try:
+                        tossups = await asyncio.get_running_loop().run_in_executor(None, tracing.bind(fq.fetchPacket), setName, number)
+                    except (UpstreamError, ValueError) as e:
+                        logging.warning(f"Could not fetch packet {number} of {setName}: {e}")
+                        queueSend(ctx, embed=create_embed('Error', TEXT["error"]["packet_not_found"].format(setName=setName, number=number)))
+                        return False
+                    game.startPacket(setName, number, tossups)
+                    asyncio.create_task(TossupCommands.reportPacketProgress(ctx, game))
+                logging.info(f"Game created in {ctx.guild.name} at channel {ctx.channel.name}")
+
+                if not await game.createTossup():
+                    queueSend(ctx, embed=create_embed('Error', TEXT["error"]["something_wrong"]))
+                    logging.error(f"Failed to create tossup in {ctx.channel.name}")
+                    return False
+                started = True
+            finally:
+                if not started:
+                    # Give back the connection and the prepared packet of a game that never started
+                    if concurrentGames.get(game_key) is game:
+                        concurrentGames.pop(game_key)
+                    game.close()
+                    voiceManager.release(ctx.guild, game_key)
+
+            queueSend(ctx, embed=create_embed('Game Initialized', TEXT["game"]["initialized"]))
+            if voiceBuzz.enabled:
+                queueSend(ctx, embed=create_embed('Voice Buzzing', TEXT["game"]["voice_buzzing"]))
+            logging.info(f"Game started successfully in {ctx.guild.name}, channel {ctx.channel.name}")
+            return True
         except Exception as e:
             logging.error(f"Error while starting the game: {e}")
-            await ctx.send(embed=create_embed('Error', TEXT["error"]["failed_to_start"]))
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"]["failed_to_start"]))
+            return False
+
+    async def reportPacketProgress(ctx: commands.Context, game: TossupGame, interval: float=10.0) -> None:
+        '''
+        Keep a message showing how many tossups of the packet are ready, edited until the whole packet is prepared or the game ends.
+        '''
+
+        packet = game.packet
+        message = None
+        while True:
+            done, total, eta = packet.progress()
+            if done >= total:
+                text = TEXT["game"]["packet_ready"].format(setName=packet.name, number=packet.number)
+            else:
+                text = TEXT["game"]["packet_progress"].format(setName=packet.name, number=packet.number, done=done, total=total,
+                                                              eta=f', about {eta:.0f}s left' if eta is not None else '')
+            try:
+                if message is None:
+                    message = await queueSend(ctx, embed=create_embed('Packet', text), alone=True)
+                else:
+                    await message.edit(embed=create_embed('Packet', text))
+            except discord.HTTPException as e:
+                logging.warning(f"Failed to report packet progress in {ctx.channel.name}: {e}")
+            if done >= total:
+                return
+            await asyncio.sleep(interval)
+            if packet.cancelled:
+                return
+
+    async def resumeGame(ctx: commands.Context, concurrentGames: dict[tuple, TossupGame]) -> bool:
+        '''
+        Resume the game a channel had before the bot restarted, reattaching voice and reusing its prepared files.
+        '''
+
+        game_key = (ctx.guild.id, ctx.channel.id)
+        snapshot = snapshotStore.take(game_key)
+        if snapshot is None:
+            return False
+
+        voice_channel = ctx.guild.get_channel(snapshot['voiceChannel']) if snapshot['voiceChannel'] else None
+        if voice_channel is None and ctx.author.voice:
+            voice_channel = ctx.author.voice.channel
+        if voice_channel is None:
+            logging.warning(f"Could not resume the game in {ctx.channel.name}: no voice channel")
             return False
 
+        try:
+            await voiceManager.acquire(voice_channel, game_key)
+            game = await TossupGame.restore(ctx.guild, ctx.channel, snapshot)
+        except VoiceConnectionError as e:
+            logging.error(f'Error connecting to voice channel: {e}')
+            queueSend(ctx, embed=create_embed('Error', TEXT["error"][e.textKey]))
+            return False
+        except Exception as e:
+            logging.error(f"Error while resuming the game in {ctx.channel.name}: {e}")
+            voiceManager.release(ctx.guild, game_key)
+            return False
+        if game is None:
+            voiceManager.release(ctx.guild, game_key)
+            return False
+
+        concurrentGames[game_key] = game
+        queueSend(ctx, embed=create_embed('Game Resumed', TEXT["game"]["resumed"]))
+        logging.info(f"Game resumed from snapshot in {ctx.guild.name}, channel {ctx.channel.name}")
+        return True
+
     async def isGameActive(message: discord.Message, concurrentGames) -> bool:
         game_key = (message.guild.id, message.channel.id)
         if game_key not in concurrentGames:
-            await message.channel.send(embed=create_embed('Error', TEXT["error"]["game_not_started"]))
+            queueSend(message.channel, embed=create_embed('Error', TEXT["error"]["game_not_started"]), priority=PRIORITY_GAME)
             logging.warning(f"{message.author} tried to start a game that hasn't been created.")
             return False
         return True
 
     async def isPlayerInGame(message: discord.Message, game) -> bool:
         if not await game.checkForPlayer(message.author.id):
-            await message.channel.send(embed=create_embed('Error', TEXT["error"]["not_joined"].format(user=message.author.display_name)))
+            queueSend(message.channel, embed=create_embed('Error', TEXT["error"]["not_joined"].format(user=message.author.display_name)), priority=PRIORITY_GAME)
             return False
         return True
-    
-    async def getAnswer(message: discord.Message, userAnswer: str, game: TossupGame) -> None:
-        try:
-
-            correctOrNot, correct = await game.checkAnswer(message.author.id, userAnswer)
-            await message.channel.send(embed=create_embed('Answer Submitted', f'You answered: {userAnswer}'))
-            await message.channel.send(embed=create_embed('Result', correctOrNot))
-            if correct == 'accept':
-                await game.stopTossup(message.channel)
-            elif correct == 'prompt':
-                pass
-            elif correct == 'reject':
-                await game.resumeTossup()
-        except Exception as e:
-            logging.error(f'Error sending message: {e}')
 
 async def setup(bot: commands.Bot) -> None:
     await bot.add_cog(TossupCommands(bot))
\ No newline at end of file
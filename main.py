@@ -1,4 +1,5 @@
 import asyncio
+import io
 import time
 from typing import Dict, Final
 import os
@@ -14,6 +15,12 @@ from tossup import TossupGame
 from util.text import TEXT
 from util.utils import create_embed
 from util.HelpCommands import HelpCommand
+from util.statsStore import statsStore
+from util.ttsService import ttsService
+from util.snapshots import snapshotStore
+from util.memoryBudget import memoryAccountant, processRss, PRIORITY_NAMES
+import util.metrics as metrics
+from util.profiler import sampleStacks, watchdog
 
 # Set up logging
 logging.basicConfig(
@@ -45,6 +52,7 @@ bot = commands.AutoShardedBot(command_prefix="!", intents=intents, help_command=
 @bot.event
 async def on_ready() -> None:
     logging.info(f'Logged in as {bot.user} with Shard ID: {bot.shard_id}')
+    watchdog.start(asyncio.get_running_loop())
     await bot.change_presence(activity=discord.Game(name="!help for commands"))
 @bot.event
 async def on_error(event, *args, **kwargs):
@@ -65,11 +73,49 @@ async def on_command_error(ctx: commands.Context, error: commands.CommandError)
 async def isconnected(ctx: commands.Context) -> None:
     await ctx.send(embed=create_embed('Connected?', TEXT["game"]["connected"].format(status=str(ctx.voice_client.is_connected()))))
 
+@bot.command()
+@commands.is_owner()
+async def memory(ctx: commands.Context) -> None:
+    report = memoryAccountant.report()
+    total = sum(size for _, _, size in report)
+    rss = processRss()
+    lines = [f'{name} | {PRIORITY_NAMES[priority]} | {size / 1024:.1f} KiB' for name, priority, size in report[:20]]
+    if len(report) > 20:
+        lines.append(f'... and {len(report) - 20} more')
+    await ctx.send(embed=create_embed('Memory', TEXT["game"]["memory"].format(
+        total=total / 1024 / 1024, budget=memoryAccountant.budgetBytes / 1024 / 1024,
+        rss='unknown' if rss is None else f'{rss / 1024 / 1024:.1f} MiB', components='\n'.join(lines))))
+
+@bot.command(name='metrics')
+@commands.is_owner()
+async def showMetrics(ctx: commands.Context) -> None:
+    await ctx.send(embed=create_embed('Metrics', metrics.report() or TEXT["game"]["no_metrics"]))
+
+@bot.command()
+@commands.is_owner()
+async def profile(ctx: commands.Context, seconds: float=10.0) -> None:
+    seconds = min(max(seconds, 1.0), 60.0)
+    await ctx.send(embed=create_embed('Profile', TEXT["game"]["profiling"].format(seconds=seconds)))
+    # The sampler runs on its own thread so the loop keeps serving games while it is profiled
+    folded = await asyncio.get_running_loop().run_in_executor(None, sampleStacks, seconds)
+    await ctx.send(file=discord.File(io.BytesIO(folded.encode('utf-8')), filename='profile.folded'))
+
+@bot.command()
+@commands.is_owner()
+async def stalls(ctx: commands.Context) -> None:
+    await ctx.send(embed=create_embed('Event Loop Stalls', watchdog.report() or TEXT["game"]["no_stalls"]))
+
 @bot.command()
 @commands.is_owner()
 async def shutdown(ctx: commands.Context) -> None:
     logging.info('Shutting down bot')
     await ctx.send(embed=create_embed('Shutdown', TEXT["game"]["shutdown"]))
+    await statsStore.close()
+    # Closing waits for the TTS loop to stop, so it is kept off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, ttsService.close)
+    tossupCog = bot.get_cog('TossupCommands')
+    if tossupCog is not None:
+        await snapshotStore.save(tossupCog.concurrentTossups)
     await bot.close()
 
 # Run the bot
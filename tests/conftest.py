@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Tests import the bot's modules the way main.py does, from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tests never reach QBReader or Google, which also lets modules that check for credentials at import load
+os.environ.setdefault('UPSTREAM_MODE', 'replay')
@@ -0,0 +1,70 @@
+import logging
+import subprocess
+import sys
+import threading
+import time
+from concurrent import futures
+from typing import Callable
+import grpc
+from google.cloud import texttospeech
+
+def silentMp3(text: str, speed: float) -> bytes:
+    # Silence about as long as the text would take to read
+    seconds = max(0.5, len(text.split()) / 2.5 / speed)
+    return subprocess.run(['ffmpeg', '-loglevel', 'error', '-f', 'lavfi', '-i', 'anullsrc=r=24000:cl=mono', '-t', f'{seconds:.2f}',
+                           '-f', 'mp3', 'pipe:1'], check=True, capture_output=True).stdout
+
+def echo(text: str, speed: float) -> bytes:
+    return f'{text}@{speed:g}'.encode('utf-8')
+
+class FakeTextToSpeech:
+    '''
+    Local stand-in for the Google TTS gRPC service, answering after a fixed latency. It counts the requests it
+    received, the most it was serving at once and the connections they came over.
+    '''
+
+    def __init__(self, latency: float=0.3, audio: Callable[[str, float], bytes]=echo):
+        self.latency = latency
+        self.audio = audio
+        self.requests = 0
+        self.active = 0
+        self.peak = 0
+        self.peers = set()
+        self.lock = threading.Lock()
+
+    def synthesizeSpeech(self, request: texttospeech.SynthesizeSpeechRequest, context) -> texttospeech.SynthesizeSpeechResponse:
+        with self.lock:
+            self.requests += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.peers.add(context.peer())
+        try:
+            time.sleep(self.latency)
+            return texttospeech.SynthesizeSpeechResponse(audio_content=self.audio(request.input.text, request.audio_config.speaking_rate or 1.0))
+        finally:
+            with self.lock:
+                self.active -= 1
+
+def serveFake(port: int=0, latency: float=0.3, audio: Callable[[str, float], bytes]=echo) -> grpc.Server:
+    '''
+    Start a fake TTS server on a port, any free one for 0, which is kept in server.port. To run the bot against it,
+    `python tests/fakeTts.py 50051` and TTS_ENDPOINT=localhost:50051.
+    '''
+
+    fake = FakeTextToSpeech(latency, audio)
+    handler = grpc.method_handlers_generic_handler('google.cloud.texttospeech.v1.TextToSpeech', {
+        'SynthesizeSpeech': grpc.unary_unary_rpc_method_handler(
+            fake.synthesizeSpeech, request_deserializer=texttospeech.SynthesizeSpeechRequest.deserialize,
+            response_serializer=texttospeech.SynthesizeSpeechResponse.serialize),
+    })
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=32))
+    server.add_generic_rpc_handlers((handler,))
+    server.port = server.add_insecure_port(f'127.0.0.1:{port}')
+    server.start()
+    server.fake = fake
+    logging.info(f'Serving fake TTS on port {server.port}')
+    return server
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    serveFake(int(sys.argv[1]) if len(sys.argv) > 1 else 50051, float(sys.argv[2]) if len(sys.argv) > 2 else 0.3, silentMp3).wait_for_termination()
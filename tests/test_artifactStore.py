@@ -0,0 +1,132 @@
+import io
+import json
+import os
+import threading
+from http.server import ThreadingHTTPServer
+import pytest
+import util.artifactStore as artifacts
+from util.artifactStore import ArtifactRequestHandler, CachedArtifactStore, HttpArtifactStore, LocalArtifactStore, SqliteArtifactStore
+
+class CountingStore(LocalArtifactStore):
+    def __init__(self, root: str):
+        super().__init__(root)
+        self.opened = 0
+
+    def open(self, key: str):
+        self.opened += 1
+        return super().open(key)
+
+@pytest.fixture
+def httpStore(tmp_path):
+    handler = type('Handler', (ArtifactRequestHandler,), {'store': LocalArtifactStore(str(tmp_path / 'server'))})
+    handler.log_message = lambda *args: None
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield HttpArtifactStore(f'http://127.0.0.1:{server.server_port}')
+    server.shutdown()
+    server.server_close()
+
+def put(store, key: str, data: bytes) -> None:
+    store.put(key, io.BytesIO(data), len(data))
+
+def read(store, key: str):
+    stream = store.open(key)
+    if stream is None:
+        return None
+    with stream:
+        return stream.read()
+
+@pytest.mark.parametrize('kind', ['local', 'sqlite', 'http'])
+def test_roundTrip(kind, tmp_path, request):
+    '''
+    Every store returns what was put under a key, replaces it on a second put and reports missing keys as None.
+    '''
+
+    if kind == 'local':
+        store = LocalArtifactStore(str(tmp_path / 'local'))
+    elif kind == 'sqlite':
+        store = SqliteArtifactStore(str(tmp_path / 'artifacts.db'))
+    else:
+        store = request.getfixturevalue('httpStore')
+
+    audio = os.urandom(3 * artifacts.CHUNK_SIZE + 17)
+    put(store, 'v1/tossup/1/tossup.mp3', audio)
+    assert read(store, 'v1/tossup/1/tossup.mp3') == audio
+    put(store, 'v1/tossup/1/tossup.mp3', b'again')
+    assert read(store, 'v1/tossup/1/tossup.mp3') == b'again'
+    assert read(store, 'v1/tossup/2/tossup.mp3') is None
+
+def test_invalidLocalKey(tmp_path):
+    with pytest.raises(ValueError):
+        LocalArtifactStore(str(tmp_path)).open('v1/../secret')
+
+def test_cacheIsLeastRecentlyUsed(tmp_path):
+    '''
+    The cache serves hits without the backend, evicts the least recently read values once over its byte bound,
+    passes large values through without keeping them and drops a value when it is replaced.
+    '''
+
+    backend = CountingStore(str(tmp_path))
+    cache = CachedArtifactStore(backend, maxBytes=250, maxEntryBytes=150)
+    for key in 'abc':
+        put(backend, key, key.encode() * 100)
+    put(backend, 'large', b'x' * 200)
+
+    assert read(cache, 'a') == b'a' * 100
+    assert read(cache, 'b') == b'b' * 100
+    assert read(cache, 'a') == b'a' * 100
+    assert backend.opened == 2
+    # Over the bound, so b, the least recently read, is evicted
+    assert read(cache, 'c') == b'c' * 100
+    assert list(cache.entries) == ['a', 'c']
+    assert cache.memoryFootprint() == 200
+
+    assert read(cache, 'large') == b'x' * 200
+    assert 'large' not in cache.entries
+
+    put(cache, 'a', b'new')
+    assert read(cache, 'a') == b'new'
+    assert backend.opened == 5
+
+def test_fetchBundleRemovesPartialCopies(tmp_path, monkeypatch):
+    '''
+    A bundle missing one of its files is not copied at all.
+    '''
+
+    store = LocalArtifactStore(str(tmp_path / 'store'))
+    monkeypatch.setattr(artifacts, 'artifactStore', store)
+    files = ['/tossup.txt', '/tossup.mp3', '/tossupMeta.json']
+    put(store, artifacts.bundleKey('7', '/tossupMeta.json'), b'{}')
+    put(store, artifacts.bundleKey('7', '/tossup.txt'), b'text')
+    directory = tmp_path / 'game'
+    directory.mkdir()
+
+    assert not artifacts.fetchBundle('7', str(directory), files)
+    assert os.listdir(directory) == []
+
+    put(store, artifacts.bundleKey('7', '/tossup.mp3'), b'audio')
+    assert artifacts.fetchBundle('7', str(directory), files)
+    assert sorted(os.listdir(directory)) == ['tossup.mp3', 'tossup.txt', 'tossupMeta.json']
+
+@pytest.mark.parametrize('engine, shared', [('google', True), ('espeak-ng', False)])
+def test_onlyGoogleAudioIsShared(engine, shared, tmp_path, monkeypatch):
+    '''
+    Questions read by the offline fallback are not published, so other hosts never reuse that audio.
+    '''
+
+    pytest.importorskip('aeneas')
+    import util.forcedAlignment as fa
+    store = LocalArtifactStore(str(tmp_path / 'store'))
+    monkeypatch.setattr(artifacts, 'artifactStore', store)
+    directory = f'{tmp_path}/bundle'
+    os.mkdir(directory)
+    kwargs = {'directory_path': directory, 'audio_file_path': '/tossup.mp3', 'text_file_path': '/tossup.txt',
+              'sync_map_file_path': '/tossupSyncmap.json', 'answer_file_path': '/tossupAnswer.txt', 'tossup': {'id': '9'}}
+    for file in ['/tossup.mp3', '/tossup.txt', '/tossupSyncmap.json', '/tossupAnswer.txt']:
+        with open(f'{directory}{file}', 'w') as f:
+            f.write(file)
+    with open(f'{directory}/tossupMeta.json', 'w') as f:
+        json.dump({'duration': 1.0, 'engine': engine}, f)
+
+    fa.publishShared(kwargs, fa.sharedBundle(kwargs))
+    assert (read(store, artifacts.bundleKey('9', '/tossupMeta.json')) is not None) == shared
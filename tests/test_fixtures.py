@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip('google.cloud.texttospeech')
+
+import util.fetchQuestions as fq
+import util.fixtures as fixtures
+from util.fixtures import FixtureArchive, FixtureMissingError
+
+TOSSUP = {'_id': 'abc', 'category': 'Science', 'difficulty': 3, 'question_sanitized': 'This element (*) is Fe.',
+          'answer_sanitized': 'iron', 'answer': '<b>iron</b>'}
+
+class LiveResponse:
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> dict:
+        return {'tossups': [TOSSUP]}
+
+def useArchive(monkeypatch, mode: str, path: str) -> None:
+    monkeypatch.setattr(fixtures, 'UPSTREAM_MODE', mode)
+    monkeypatch.setattr(fixtures, 'archive', FixtureArchive(path))
+
+def test_recordThenReplay(monkeypatch, tmp_path):
+    '''
+    A QBReader and TTS exchange recorded once is replayed from the archive alone, without any network call.
+    '''
+
+    calls = []
+    monkeypatch.setattr(fq.requests, 'get', lambda *args, **kwargs: calls.append('qbreader') or LiveResponse())
+    monkeypatch.setattr(fq, 'ttsService', SimpleNamespace(synthesizeBlocking=lambda text, speed: calls.append('tts') or b'ID3 audio'))
+
+    useArchive(monkeypatch, 'record', str(tmp_path))
+    recorded = (fq.fetchTossups('3', 'Science', 1), fq.synthesizeGoogle('This element is Fe.', 1.0))
+    assert 'qbreader' in calls and 'tts' in calls
+
+    def offline(*args, **kwargs):
+        raise AssertionError('replay made a network call')
+
+    monkeypatch.setattr(fq.requests, 'get', offline)
+    monkeypatch.setattr(fq, 'ttsService', SimpleNamespace(synthesizeBlocking=offline))
+    useArchive(monkeypatch, 'replay', str(tmp_path))
+    replayed = (fq.fetchTossups('3', 'Science', 1), fq.synthesizeGoogle('This element is Fe.', 1.0))
+
+    assert replayed == recorded
+    assert replayed[0][0]['id'] == 'abc'
+    assert replayed[1] == b'ID3 audio'
+    # Speech is keyed by its text and speed, so a reading that was never recorded is not served
+    with pytest.raises(FixtureMissingError):
+        fq.synthesizeGoogle('Another tossup.', 1.0)
@@ -0,0 +1,93 @@
+import asyncio
+import random
+import threading
+from collections import defaultdict
+from util.gameActor import GameActor
+
+GAMES = 50
+TASKS = 8
+THREADS = 4
+EVENTS = 200
+
+class FakeGame:
+    '''
+    Game whose handlers yield to the loop halfway through changing their state, so any interleaving of two
+    handlers of the same game would lose updates or be seen by the overlap check.
+    '''
+
+    def __init__(self, name: str):
+        self.handled = 0
+        self.busy = False
+        self.overlaps = 0
+        self.seen = defaultdict(list)
+        self.rng = random.Random(name)
+        self.actor = GameActor(name, {
+            'buzz': self.onEvent,
+            'answer': self.onEvent,
+            'command': self.onCommand,
+        })
+
+    async def onEvent(self, source: str, sequence: int) -> None:
+        if self.busy:
+            self.overlaps += 1
+        self.busy = True
+        handled = self.handled
+        # A varying number of yields, so handlers of an actor that ran them concurrently could not stay in lockstep
+        for _ in range(self.rng.randint(0, 4)):
+            await asyncio.sleep(0)
+        self.handled = handled + 1
+        self.seen[source].append(sequence)
+        self.busy = False
+
+    async def onCommand(self, source: str, sequence: int) -> int:
+        await self.onEvent(source, sequence)
+        # A command waiting on another command of its own game runs it in place instead of deadlocking
+        return await self.actor.submit('answer', f'{source}-inner', sequence)
+
+async def produceTask(game: FakeGame, source: str, rng: random.Random) -> None:
+    for sequence in range(EVENTS):
+        kind = rng.choice(('buzz', 'answer', 'command'))
+        if kind == 'command':
+            await game.actor.submit('command', source, sequence)
+        else:
+            game.actor.post(kind, source, sequence)
+        if rng.random() < 0.3:
+            await asyncio.sleep(0)
+
+def produceThread(game: FakeGame, source: str, seed: int) -> None:
+    rng = random.Random(seed)
+    for sequence in range(EVENTS):
+        game.actor.postThreadsafe(rng.choice(('buzz', 'answer')), source, sequence)
+
+def test_interleavedEventsStayOrdered():
+    async def main():
+        rng = random.Random(47)
+        games = [FakeGame(f'game{i}') for i in range(GAMES)]
+        for game in games:
+            # postThreadsafe needs the actor to know its loop
+            game.actor.post('buzz', 'start', 0)
+
+        threads = [threading.Thread(target=produceThread, args=(game, f'thread{t}', rng.random()))
+                   for game in games for t in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        await asyncio.gather(*[produceTask(game, f'task{t}', random.Random(rng.random())) for game in games for t in range(TASKS)])
+        await asyncio.get_running_loop().run_in_executor(None, lambda: [thread.join() for thread in threads])
+        # Everything posted is in the queues now, a submit behind it waits for all of it
+        await asyncio.gather(*[game.actor.submit('buzz', 'end', 0) for game in games])
+        return games
+
+    games = asyncio.run(main())
+    for game in games:
+        assert game.overlaps == 0
+        total = sum(len(sequences) for sequences in game.seen.values())
+        assert game.handled == total
+        for source, sequences in game.seen.items():
+            if source.endswith('-inner'):
+                continue
+            # Events of one producer are handled in the order they were posted
+            assert sequences == sorted(sequences), source
+            assert len(sequences) == (1 if source in ('start', 'end') else EVENTS), source
+
+if __name__ == '__main__':
+    test_interleavedEventsStayOrdered()
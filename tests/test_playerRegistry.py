@@ -0,0 +1,67 @@
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip('discord')
+
+from util.baseGame import BaseGame
+
+PLAYERS = 1000
+RESULTS = 20000
+READS = 2000
+
+def timed(fn, count: int) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) / count * 1e6
+
+def test_thousandPlayers():
+    '''
+    Drive 1,000 players through addPlayer, score updates and scoreboard reads, check the ranking against a full
+    sort and print the time per operation (run with -s to see it).
+    '''
+
+    rng = random.Random(44)
+    game = BaseGame()
+    authors = [SimpleNamespace(id=10_000 + i, display_name=f'player{i}') for i in range(PLAYERS)]
+    ctx = SimpleNamespace(author=authors[0])
+
+    async def addAll():
+        for author in authors:
+            assert await game.addPlayer(author)
+
+    def recordAll():
+        for _ in range(RESULTS):
+            game.players.record(rng.choice(authors).id, rng.choice(('ten', 'ten', 'power', 'neg', 'bonus')))
+
+    def readAll():
+        for i in range(READS):
+            game.players.top(10)
+            game.players.rank(authors[i % PLAYERS].id)
+
+    async def pagesAll():
+        for i in range(READS):
+            await game.getScores(ctx, i % 40 + 1)
+
+    timings = {
+        'addPlayer': timed(lambda: asyncio.run(addAll()), PLAYERS),
+        'record': timed(recordAll, RESULTS),
+        'top10+rank': timed(readAll, READS),
+        'getScores page': timed(lambda: asyncio.run(pagesAll()), READS),
+    }
+    for name, micros in timings.items():
+        print(f'{name}: {micros:.1f}us per call with {PLAYERS} players')
+
+    expected = sorted(game.players, key=lambda player: -player.calcTotal())
+    assert [player.calcTotal() for player in game.players.top(PLAYERS)] == [player.calcTotal() for player in expected]
+    for player in game.players:
+        rank = game.players.rank(player.id)
+        assert game.players.top(rank)[-1] is player
+    assert not asyncio.run(game.addPlayer(authors[0]))
+    # Each operation only touches the keys of one player, well under a millisecond even on slow machines
+    assert max(timings['record'], timings['top10+rank']) < 1000
+
+if __name__ == '__main__':
+    test_thousandPlayers()
@@ -0,0 +1,25 @@
+import os
+import traceback
+from util.profiler import REPO_ROOT, blamedFrame
+
+ASYNCIO = os.path.join('/usr', 'lib', 'python3.11', 'asyncio')
+LIBRARY = os.path.join('/usr', 'lib', 'python3.11')
+
+def stackOf(*frames) -> traceback.StackSummary:
+    return traceback.StackSummary.from_list([traceback.FrameSummary(path, line, name, lookup_line=False) for path, line, name in frames])
+
+def test_stallIsBlamedOnTheBotsCode():
+    stack = stackOf((os.path.join(ASYNCIO, 'base_events.py'), 1, 'run_forever'),
+                    (os.path.join(ASYNCIO, 'events.py'), 2, '_run'),
+                    (os.path.join(REPO_ROOT, 'tossup.py'), 3, 'onBuzz'),
+                    (os.path.join(REPO_ROOT, 'util', 'fetchQuestions.py'), 4, 'checkAnswer'),
+                    (os.path.join(LIBRARY, 'ssl.py'), 5, 'recv_into'))
+    assert blamedFrame(stack).name == 'checkAnswer'
+
+def test_stallOutsideTheBotIsBlamedOnTheCallback():
+    stack = stackOf((os.path.join(REPO_ROOT, 'main.py'), 1, '<module>'),
+                    (os.path.join(ASYNCIO, 'base_events.py'), 1, 'run_forever'),
+                    (os.path.join(ASYNCIO, 'events.py'), 2, '_run'),
+                    (os.path.join(LIBRARY, 'site-packages', 'discord', 'gateway.py'), 3, 'poll_event'),
+                    (os.path.join(LIBRARY, 'selectors.py'), 4, 'select'))
+    assert blamedFrame(stack).name == 'poll_event'
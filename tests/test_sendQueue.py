@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+import discord
+from util.sendQueue import ChannelSendQueue, MAX_EMBED_CHARACTERS
+
+class FakeChannel:
+    '''
+    Channel refusing messages whose embeds hold a refused description, like Discord refusing an invalid embed.
+    '''
+
+    id = 1
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, embeds=()):
+        if any(embed.description == 'refused' for embed in embeds):
+            raise discord.HTTPException(SimpleNamespace(status=400, reason='Bad Request'), 'Invalid Form Body')
+        self.sent.append([embed.description for embed in embeds])
+        return len(self.sent)
+
+def sendAll(descriptions):
+    async def main():
+        channel = FakeChannel()
+        queue = ChannelSendQueue(channel, window=0, idleTimeout=0.01)
+        futures = [queue.put(embed=discord.Embed(description=description)) for description in descriptions]
+        return channel, await asyncio.gather(*futures)
+
+    return asyncio.run(main())
+
+def test_mergedEmbedsStayUnderTheCharacterLimit():
+    reveals = ['x' * 2500 for _ in range(5)]
+    channel, messages = sendAll(reveals)
+    assert all(sum(map(len, message)) <= MAX_EMBED_CHARACTERS for message in channel.sent)
+    assert sum(map(len, channel.sent)) == 5
+    assert None not in messages
+
+def test_refusedBatchIsSentOneByOne():
+    '''
+    A merged message that is refused is sent again message by message, so only the bad one is dropped.
+    '''
+
+    channel, messages = sendAll(['buzz', 'refused', 'verdict'])
+    assert channel.sent == [['buzz'], ['verdict']]
+    assert messages[1] is None
+    assert messages[0] is not None and messages[2] is not None
@@ -0,0 +1,36 @@
+import asyncio
+from util.statsStore import StatsStore
+
+def test_failedWriteIsRetried(tmp_path):
+    '''
+    Score events of a failed write stay buffered, ahead of newer ones, and are saved by the next flush exactly once.
+    '''
+
+    store = StatsStore(str(tmp_path / 'stats.db'), flushInterval=60)
+    writeBatch = store.writeBatch
+    failures = [OSError('disk I/O error')]
+
+    def failOnce(batch, sketches=()):
+        if failures:
+            raise failures.pop()
+        writeBatch(batch, sketches)
+
+    store.writeBatch = failOnce
+
+    async def main():
+        store.record(1, 10, 'alice', 'Science', 'power')
+        store.record(1, 11, 'bob', 'Science', 'neg')
+        await store.flush()
+        assert [event[1] for event in store.buffer] == [10, 11]
+
+        store.record(1, 10, 'alice', 'History', 'ten')
+        await store.flush()
+        assert store.buffer == []
+        board = await store.leaderboard(1)
+        rows = store.connect().execute('SELECT player_id, result FROM buzzes ORDER BY rowid').fetchall()
+        await store.close()
+        return board, rows
+
+    board, rows = asyncio.run(main())
+    assert rows == [(10, 'power'), (11, 'neg'), (10, 'ten')]
+    assert [(name, points) for _, name, points in board] == [('alice', 35), ('bob', -5)]
@@ -0,0 +1,63 @@
+import asyncio
+import time
+import pytest
+
+pytest.importorskip('grpc')
+
+import util.metrics as metrics
+from fakeTts import serveFake
+from util.ttsService import TtsService
+
+@pytest.fixture
+def fake():
+    server = serveFake(latency=0.2)
+    yield server
+    server.stop(0)
+
+def runAll(service: TtsService, requests):
+    async def main():
+        return await asyncio.gather(*(service.synthesize(text, speed) for text, speed in requests), return_exceptions=True)
+
+    return asyncio.run_coroutine_threadsafe(main(), service.start()).result()
+
+def test_identicalRequestsShareOneRpc(fake):
+    service = TtsService(endpoint=f'127.0.0.1:{fake.port}', channels=2, maxInFlight=4, deadline=5)
+    coalesced = metrics.counters.get('tts.coalesced', 0)
+    try:
+        results = runAll(service, [('the same tossup', 1.0)] * 10 + [('the same tossup', 1.5)])
+    finally:
+        service.close()
+    assert results[:10] == [b'the same tossup@1'] * 10
+    assert results[10] == b'the same tossup@1.5'
+    assert fake.fake.requests == 2
+    assert metrics.counters['tts.coalesced'] - coalesced == 9
+
+def test_distinctRequestsSpreadOverTheChannels(fake):
+    '''
+    Distinct requests each get an RPC, at most maxInFlight at once, spread over every channel of the pool.
+    '''
+
+    service = TtsService(endpoint=f'127.0.0.1:{fake.port}', channels=2, maxInFlight=4, deadline=5)
+    try:
+        start = time.monotonic()
+        results = runAll(service, [(f'tossup {i}', 1.0) for i in range(8)])
+        elapsed = time.monotonic() - start
+    finally:
+        service.close()
+    assert results == [f'tossup {i}@1'.encode('utf-8') for i in range(8)]
+    assert fake.fake.requests == 8
+    assert fake.fake.peak == 4
+    assert len(fake.fake.peers) == 2
+    # Two waves of four, not eight requests in a row
+    assert 0.4 <= elapsed < 1.2
+
+def test_requestsGiveUpAtTheDeadline(fake):
+    fake.fake.latency = 1.0
+    service = TtsService(endpoint=f'127.0.0.1:{fake.port}', channels=1, maxInFlight=4, deadline=0.3)
+    try:
+        start = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            service.synthesizeBlocking('a slow tossup')
+        assert time.monotonic() - start < 0.8
+    finally:
+        service.close()
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import pytest
+
+pytest.importorskip('aeneas')
+
+import util.warmPool as wp
+from util.warmPool import BUNDLE_FILES, WarmPool
+
+TOSSUP = {'id': 't1', 'category': 'Science', 'difficulty': '3', 'question': 'q', 'answer': 'a', 'displayAnswer': 'a'}
+
+def preparedWithoutMeta(**kwargs) -> bool:
+    # Synthesis where probing the audio failed, so every file but the metadata is written
+    for name, file in BUNDLE_FILES.items():
+        if name != 'meta':
+            with open(f"{kwargs['directory_path']}{file}", 'w', encoding='utf-8') as f:
+                f.write(name)
+    return True
+
+def usePool(monkeypatch, tmp_path, generateSyncMap) -> WarmPool:
+    monkeypatch.chdir(tmp_path)
+
+    async def nextTossup(difficulties, categories, heard=None):
+        return TOSSUP
+
+    async def generate(**kwargs):
+        return generateSyncMap(**kwargs)
+
+    monkeypatch.setattr(wp, 'nextTossup', nextTossup)
+    monkeypatch.setattr(wp.fa, 'generateSyncMap', generate)
+    return WarmPool()
+
+def test_bundleWithoutMeta(monkeypatch, tmp_path):
+    '''
+    A bundle prepared without metadata is sized from the files it has, and moving it into a game replaces the
+    metadata of the previous question instead of failing.
+    '''
+
+    pool = usePool(monkeypatch, tmp_path, preparedWithoutMeta)
+    bundle = asyncio.run(pool.prepare(('3', 'Science')))
+    assert bundle is not None
+    assert bundle['duration'] is None
+    assert bundle['size'] == sum(len(name) for name in BUNDLE_FILES if name != 'meta')
+
+    game = 'temp/game'
+    os.makedirs(game)
+    with open(f"{game}{BUNDLE_FILES['meta']}", 'w', encoding='utf-8') as f:
+        f.write('{"duration": 12.0}')
+    pool.moveBundle(bundle, game)
+
+    for name, file in BUNDLE_FILES.items():
+        assert os.path.exists(f'{game}{file}') == (name != 'meta')
+    assert not os.path.exists(bundle['directory'])
+
+def test_failedPrepareRemovesDirectory(monkeypatch, tmp_path):
+    '''
+    A preparation that raises leaves no bundle directory behind.
+    '''
+
+    def failing(**kwargs):
+        preparedWithoutMeta(**kwargs)
+        raise OSError('disk full')
+
+    pool = usePool(monkeypatch, tmp_path, failing)
+    with pytest.raises(OSError):
+        asyncio.run(pool.prepare(('3', 'Science')))
+    assert os.listdir(wp.POOL_PATH) == []
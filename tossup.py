@@ -1,19 +1,44 @@
 import asyncio
 import json
+import os
 import time
-from typing import List
+from typing import List, Optional
 from util.baseGame import BaseGame
 import util.forcedAlignment as fa
 import util.fetchQuestions as fq
+import util.timeStretch as ts
+import util.audioProcessing as ap
+import util.tracing as tracing
+import util.metrics as metrics
+import util.voiceBuzz as voiceBuzz
+from util.questionBuffer import BloomFilter, nextTossup
+from util.warmPool import warmPool
+from util.statsStore import statsStore
+from util.buzzAnalytics import buzzAnalytics
+from util.queuedAudio import FirstFrameSource, QueuedAudioSource
+from util.gameActor import GameActor
+from util.packetPipeline import PACKET_WAIT, PacketPipeline
 import discord.ext.commands
 from discord.ext.commands import Context
 import aiofiles
 import logging
 from pathlib import Path
-from util.player import Player
+from util.playerRegistry import PlayerRegistry
 from util.timers import PausableTimer, AudioTracker
+from util.sendQueue import queueSend, PRIORITY_GAME
+from util.text import TEXT
 from util.utils import create_embed
 
+# Phases of a tossup, only changed by the event handlers the actor of the game runs
+IDLE = 'idle' # no tossup is being played
+READING = 'reading'
+WINDOW = 'window' # the reading finished and players have a few seconds left to buzz
+BUZZED_READING = 'buzzedReading'
+BUZZED_WINDOW = 'buzzedWindow'
+# A buzz pauses the phase it arrived in and a wrong answer resumes it
+BUZZ = {READING: BUZZED_READING, WINDOW: BUZZED_WINDOW}
+RESUME = {buzzed: phase for phase, buzzed in BUZZ.items()}
+
 class TossupGame(BaseGame):
     '''
     Class representing a TossupGame instance for managing tossup reading functionalities.
@@ -22,9 +47,16 @@ class TossupGame(BaseGame):
             textChannel (TextChannel): The text channel for communication.
             cats (str): Categories for the game questions.
             diff (str): Difficulty level for the questions.
-            players (List[Player]): List of players participating in the game.
+            speed (float): Reading speed of the questions, applied as a time-stretch of the audio synthesized at 1.0.
+            autoAdvanceGap (float): Seconds between the answer reveal and the next tossup, or None to wait for !next.
+            players (PlayerRegistry): The players participating in the game, ranked by score.
             timer (PausableTimer): Timer for managing game time.
+            state (str): The phase of the current tossup, IDLE between tossups.
+            generation (int): Number of the current reading, so events left over from an earlier one are dropped.
+            packet (PacketPipeline): The packet read in order in packet mode, otherwise None.
+            actor (GameActor): The task handling the buzz, voiceBuzz, answer, readingEnded, timerExpired and command events of the game in order.
             playback_position (AudioTracker): Tracker for audio playback position.
+            audioDuration (float): Length of the current tossup audio at the game speed, from the bundle metadata.
             buzzWordIndex (int): Index of the buzz word in the question.
             displayAnswer (str): Displayed answer for the current question.
             tossup (str): Current tossup question text.
@@ -35,54 +67,192 @@ class TossupGame(BaseGame):
             checkAnswer (ctx: Context, answer: str) -> Tuple[str, str]: Check the answer provided by a player.
             createTossup () -> bool: Create a new tossup question.
             playTossup (ctx: Context) -> None: Start playing the tossup question.
-            pauseTossup (ctx: Context) -> None: Pause the current tossup question.
+            pauseTossup (author: User, at: float) -> None: Pause the current tossup question.
             resumeTossup (ctx: Context) -> None: Resume the paused tossup question.
             stopTossup (ctx: Context) -> None: Stop the current tossup question.
-            getScores (ctx: Context) -> str: Get scores of all players in the game.
+            close () -> None: Release what the game holds once it has ended.
+            getScores (ctx: Context, page: int) -> str: Get one page of the scoreboard of the game.
             getCatsAndDiff (ctx: Context) -> Tuple[List[str], str]: Get the categories and difficulty level of the game questions.
     '''
 
-    def __init__(self, guild: discord.Guild=None, textChannel: discord.TextChannel=None, cats:str='', diff:str=''):
+    def __init__(self, guild: discord.Guild=None, textChannel: discord.TextChannel=None, cats:str='', diff:str='', speed: float=1.0,
+                 autoAdvanceGap: Optional[float]=None):
 
         super().__init__(guild, textChannel, cats, diff)
+        self.speed = speed
+        self.autoAdvanceGap = autoAdvanceGap
+        self.queuedSource: Optional[QueuedAudioSource] = None
+        self.nextBundle: Optional[asyncio.Task] = None
+        self.alignment: Optional[asyncio.Future] = None
+        self.packet: Optional[PacketPipeline] = None
+        self.packetIndex = 0
+        self.advanceTask: Optional[asyncio.Task] = None
+        self.traceSpan: Optional[tracing.Span] = None
         self.gameStart = False
-        self.tossupStart = False
-        self.questionEnd = True
-        self.buzzedIn = False
+        self.state = IDLE
+        self.generation = 0
         self.buzzedInBy = None
+        self.actor = GameActor(f'{guild.id}-{textChannel.id}', {
+            'buzz': self.onBuzz,
+            'voiceBuzz': self.onVoiceBuzz,
+            'answer': self.onAnswer,
+            'readingEnded': self.onReadingEnded,
+            'timerExpired': self.onTimerExpired,
+            'command': self.runCommand,
+        })
 
         self.playback_position = AudioTracker()
         self.buzzWordIndex = None
         self.tossup = ''
+        self.category = ''
+        self.difficulty = ''
 
         self.DIRECTORY_PATH = f'temp/{self.guild.id}-{self.textChannel.id}'
         self.TOSSUP_PATH = '/tossup.txt'
         self.AUDIO_PATH = '/tossup.mp3'
         self.SYNCMAP_PATH = '/tossupSyncmap.json'
         self.ANSWER_PATH = '/tossupAnswer.txt'
+        self.playbackAudioPath = f'{self.DIRECTORY_PATH}{self.AUDIO_PATH}'
+        self.playbackSyncMapPath = f'{self.DIRECTORY_PATH}{self.SYNCMAP_PATH}'
+        self.audioDuration = None
+        self.playbackPcmPath = None
 
         self.tossupsHeard = 0
+        self.heard = BloomFilter()
 
         path = Path(self.DIRECTORY_PATH)
 
         path.mkdir(parents=True, exist_ok=True)
     
-    async def getScores(self, ctx:Context):
+    def memoryFootprint(self) -> int:
+        return super().memoryFootprint() + len(self.heard.bits) + (self.packet.memoryFootprint() if self.packet is not None else 0)
+
+    @property
+    def tossupStart(self) -> bool:
+        return self.state in (READING, BUZZED_READING)
+
+    @property
+    def questionEnd(self) -> bool:
+        return self.state == IDLE
+
+    @property
+    def buzzedIn(self) -> bool:
+        return self.state in RESUME
+
+    async def runCommand(self, command, *args):
         '''
-        Get scores of all players in the game.
+        Handle a command event: run a coroutine function of a command in order with the other events of the game.
+        '''
+
+        return await command(*args)
+
+    async def onBuzz(self, message: discord.Message, generation: int) -> None:
+        '''
+        Handle a buzz event, pausing the tossup if nobody else is answering.
 
         Parameters:
-            ctx (Context): The context of the command.
+            message (discord.Message): The buzz message.
+            generation (int): The reading the buzz was sent during.
+        '''
 
-        Returns:
-            str: A formatted string representing the scores of all players. 
+        if generation != self.generation or self.state == IDLE:
+            return
+        if not await self.checkForPlayer(message.author.id):
+            queueSend(message.channel, embed=create_embed('Error', TEXT["error"]["not_joined"].format(user=message.author.display_name)), priority=PRIORITY_GAME)
+        elif self.state not in BUZZ:
+            queueSend(message.channel, embed=create_embed('Error', TEXT["error"]["cannot_buzz"]), priority=PRIORITY_GAME)
+        else:
+            await self.takeBuzz(message.author, message.channel)
+
+    async def onVoiceBuzz(self, member: discord.Member, onset: float, generation: int) -> None:
         '''
+        Handle a voice buzz event, pausing the tossup where the player started speaking.
+
+        Parameters:
+            member (discord.Member): The player who spoke.
+            onset (float): The wall clock time they started speaking.
+            generation (int): The reading they spoke during.
+        '''
+
+        # Speech from spectators, or while someone is answering, is conversation rather than a buzz
+        if generation != self.generation or self.state not in BUZZ or not await self.checkForPlayer(member.id):
+            return
+        metrics.observe('voiceBuzz.lag', time.time() - onset)
+        await self.takeBuzz(member, self.textChannel, onset)
+
+    async def takeBuzz(self, author: discord.abc.User, channel: discord.abc.Messageable, at: Optional[float]=None) -> None:
+        await self.pauseTossup(author, at)
+        queueSend(channel, embed=create_embed('Buzzed In', TEXT["game"]["buzzed_in"].format(user=author.display_name)), priority=PRIORITY_GAME)
+
+    def voiceUtterance(self, member: discord.Member, onset: float) -> None:
+        self.actor.post('voiceBuzz', member, onset, self.generation)
+
+    async def onAnswer(self, message: discord.Message, generation: int) -> None:
+        '''
+        Handle a message sent during a tossup, taking it as the answer if it comes from the player who buzzed.
+
+        Parameters:
+            message (discord.Message): The message.
+            generation (int): The reading the message was sent during.
+        '''
+
+        if generation != self.generation or self.state not in RESUME:
+            return
+        if not await self.checkForPlayer(message.author.id):
+            queueSend(message.channel, embed=create_embed('Error', TEXT["error"]["not_joined"].format(user=message.author.display_name)), priority=PRIORITY_GAME)
+            return
+        if self.buzzedInBy != message.author.id:
+            queueSend(message.channel, embed=create_embed('Error', TEXT["error"]["cannot_use_command"]), priority=PRIORITY_GAME)
+            return
+
+        try:
+            correctOrNot, correct = await self.checkAnswer(message.author.id, message.content)
+            queueSend(message.channel, embed=create_embed('Answer Submitted', f'You answered: {message.content}'), priority=PRIORITY_GAME)
+            queueSend(message.channel, embed=create_embed('Result', correctOrNot), priority=PRIORITY_GAME)
+            if correct == 'accept':
+                await self.stopTossup(message.channel)
+            elif correct == 'reject':
+                await self.resumeTossup()
+        except Exception as e:
+            logging.error(f'Error sending message: {e}')
+
+    async def onReadingEnded(self, generation: int, error: Optional[Exception]) -> None:
+        '''
+        Handle the end of a reading, giving players a few more seconds to buzz.
+
+        Parameters:
+            generation (int): The reading that ended.
+            error (Exception): The error that ended playback, if any.
+        '''
+
+        # Stopping a tossup also ends its reading, which needs no handling
+        if generation != self.generation or self.state not in (READING, BUZZED_READING):
+            return
+        if error:
+            logging.error(f'Error: {error}')
+        else:
+            logging.info('Question finished')
+        if self.traceSpan is not None:
+            self.traceSpan.addEvent('readingEnded', error=repr(error) if error else '')
+
+        self.playback_position.pauseAudio()
+        if self.state == BUZZED_READING:
+            self.timer.pause()
+        self.state = WINDOW if self.state == READING else BUZZED_WINDOW
+        asyncio.create_task(self.runWindow(generation))
+
+    async def runWindow(self, generation: int) -> None:
+        if await self.timer.start_timer(5, self.textChannel):
+            self.actor.post('timerExpired', generation)
+
+    async def onTimerExpired(self, generation: int) -> None:
+        '''
+        Handle the end of the buzzing window after a reading, ending the tossup.
+        '''
+
+        if generation == self.generation and self.state == WINDOW:
+            await self.stopTossup(self.textChannel)
 
-        allPlayerScores = {}
-        for player in self.players:
-            allPlayerScores[player.name] = player.calcTotal()
-        return str(allPlayerScores).replace(', ', '\n').replace(':', ' | ').replace('{', '').replace('}', '')
-    
     async def getCatsAndDiff(self, ctx:Context):
         '''
         Get the number of tossups heard, categories, and difficulty level.
@@ -96,16 +266,257 @@ class TossupGame(BaseGame):
 
         return self.tossupsHeard, self.categories, self.diff
     
+    def startTrace(self) -> None:
+        '''
+        Start the trace of the next tossup, ending the trace of the previous one if it is still open.
+        '''
+
+        self.finishTrace()
+        self.traceSpan = tracing.startTrace('tossup', guild=self.guild.id, channel=self.textChannel.id, tossup=self.tossupsHeard + 1)
+
+    def finishTrace(self) -> None:
+        if self.traceSpan is not None:
+            self.traceSpan.finish()
+            self.traceSpan = None
+
     async def createTossup(self) -> bool:
+        '''
+        Prepare the next tossup and start its trace.
+
+        Returns:
+            bool: True if the tossup is ready to be played.
+        '''
+
+        self.startTrace()
+        with tracing.span('createTossup', parent=self.traceSpan) as span:
+            completed = await self.loadTossup()
+            span.setAttribute('ready', completed)
+        return completed
+
+    async def loadTossup(self) -> bool:
+        '''
+        Prepare the next tossup, taking a ready bundle from the warm pool when one matches the game's filter.
+
+        Returns:
+            bool: True if the tossup is ready to be played.
+        '''
+
+        loop = asyncio.get_running_loop()
+        key = (self.diff, str(self.categories))
+        if self.alignment is not None:
+            # The last question may still be aligning in the directory the next one is written to
+            await self.alignment
+            self.alignment = None
+        bundle = None
+        if self.packet is not None:
+            # Packets are read in order, skipping questions that could not be prepared
+            try:
+                while bundle is None and self.packetIndex < len(self.packet):
+                    bundle = await self.packet.take(self.packetIndex, PACKET_WAIT)
+                    self.packetIndex += 1
+            except asyncio.TimeoutError:
+                # Every event of the game waits behind this one, so callers wait for the question with waitReady instead
+                metrics.increment('packet.notReady')
+                return False
+            if bundle is None:
+                return False
+            self.heard.add(bundle['id'])
+        elif self.nextBundle is not None:
+            bundle = await self.nextBundle
+            self.nextBundle = None
+        if bundle is None:
+            bundle = await warmPool.take(key, self.heard)
+        if bundle is not None:
+            await loop.run_in_executor(None, warmPool.moveBundle, bundle, self.DIRECTORY_PATH)
+            self.category = bundle['category']
+            self.difficulty = bundle['difficulty']
+            completed = True
+        else:
+            tossup = await nextTossup(self.diff, str(self.categories), self.heard)
+            if tossup is None:
+                return False
+            self.category = tossup['category']
+            self.difficulty = tossup['difficulty']
+
+            prepare = fa.generateAudio if fa.LAZY_ALIGNMENT else fa.generateSyncMap
+            completed = await prepare(directory_path=self.DIRECTORY_PATH, audio_file_path=self.AUDIO_PATH,
+                                      text_file_path=self.TOSSUP_PATH,
+                                      sync_map_file_path=self.SYNCMAP_PATH,
+                                      answer_file_path=self.ANSWER_PATH, reading_speed=1.0,
+                                      guildId=self.guild.id, channelId=self.textChannel.id,
+                                      subjects=str(self.categories), question_numbers=self.diff,
+                                      tossup=tossup)
+            if fa.LAZY_ALIGNMENT:
+                # Playback starts now and a buzz awaits the alignment if it has not finished yet
+                self.alignment = completed
+                completed = completed is not None
+        if not completed:
+            return False
+
+        await self.preparePlayback()
+        if self.autoAdvanceGap is not None and self.packet is None:
+            # Prepare the next tossup while this one is being read
+            self.nextBundle = asyncio.create_task(self.prepareBundle())
+        return True
+
+    def startPacket(self, name: str, number: int, tossups: List[dict]) -> None:
+        '''
+        Switch the game to packet mode, reading the tossups of a packet in order, and start preparing them.
+
+        Parameters:
+            name (str): The name of the set.
+            number (int): The number of the packet.
+            tossups (List[dict]): The tossups of the packet in reading order.
+        '''
+
+        self.packet = PacketPipeline(name, number, tossups, f'{self.DIRECTORY_PATH}/packet')
+        self.packetIndex = 0
+        self.packet.start()
 
-        completed = await fa.generateSyncMap(directory_path=self.DIRECTORY_PATH, audio_file_path=self.AUDIO_PATH, 
+    @property
+    def packetDone(self) -> bool:
+        return self.packet is not None and self.packetIndex >= len(self.packet)
+
+    @property
+    def packetPreparing(self) -> bool:
+        return self.packet is not None and not self.packetDone and not self.packet.ready(self.packetIndex)
+
+    async def preparePlayback(self) -> None:
+        '''
+        Derive the playback files of the tossup in the game directory for the game's speed.
+        '''
+
+        loop = asyncio.get_running_loop()
+        syncMapPath = f'{self.DIRECTORY_PATH}{self.SYNCMAP_PATH}'
+        aligned = self.alignment is None or (self.alignment.done() and self.alignment.result())
+        # The question is synthesized and aligned once at 1.0; other speeds are a time-stretch of that audio
+        self.playbackAudioPath, self.playbackSyncMapPath = await loop.run_in_executor(
+            None, ts.stretchBundle, f'{self.DIRECTORY_PATH}{self.AUDIO_PATH}', syncMapPath if aligned else None, self.speed)
+        if not aligned:
+            self.alignment = asyncio.ensure_future(self.scaleWhenAligned(self.alignment, syncMapPath))
+        duration = ap.readDuration(f'{self.DIRECTORY_PATH}{self.AUDIO_PATH}')
+        self.audioDuration = duration / self.speed if duration is not None else None
+
+        if self.autoAdvanceGap is not None:
+            self.playbackPcmPath = await loop.run_in_executor(None, ap.decodePcm, self.playbackAudioPath)
+
+    async def scaleWhenAligned(self, alignment: asyncio.Future, syncMapPath: str) -> bool:
+        '''
+        Wait for a background alignment, then derive the playback sync map for the game's speed.
+
+        Parameters:
+            alignment (Future): The alignment returned by generateAudio.
+            syncMapPath (str): The path of the sync map it writes.
+
+        Returns:
+            bool: True if the playback sync map is ready.
+        '''
+
+        if not await alignment:
+            return False
+        try:
+            self.playbackSyncMapPath = await asyncio.get_running_loop().run_in_executor(None, ts.scaleSyncMap, syncMapPath, self.speed)
+            return True
+        except (OSError, ValueError) as e:
+            logging.error(f'Failed to scale {syncMapPath} to speed {self.speed}: {e}')
+            return False
+
+    def toSnapshot(self) -> dict:
+        '''
+        Capture the state needed to resume the game after a restart. Prepared files stay on disk and are only referenced.
+
+        Returns:
+            dict: The JSON-serializable state of the game.
+        '''
+
+        nextBundle = None
+        if self.nextBundle is not None and self.nextBundle.done() and not self.nextBundle.cancelled() and self.nextBundle.exception() is None:
+            nextBundle = self.nextBundle.result()
+        # Warm pool directories are not kept across restarts, only the staging directory of the game is
+        if nextBundle is not None and not nextBundle['directory'].startswith(self.DIRECTORY_PATH):
+            nextBundle = None
+
+        voiceClient = self.guild.voice_client
+        return {
+            'voiceChannel': voiceClient.channel.id if voiceClient is not None and voiceClient.channel is not None else None,
+            'cats': self.cats,
+            'diff': self.diff,
+            'speed': self.speed,
+            'autoAdvanceGap': self.autoAdvanceGap,
+            'gameStart': self.gameStart,
+            'tossupsHeard': self.tossupsHeard,
+            'category': self.category,
+            'difficulty': self.difficulty,
+            'players': self.players.toList(),
+            'heard': self.heard.toDict(),
+            'nextBundle': nextBundle,
+        }
+
+    @classmethod
+    async def restore(cls, guild: discord.Guild, textChannel: discord.TextChannel, snapshot: dict) -> Optional['TossupGame']:
+        '''
+        Rebuild a game from a snapshot, reusing the question and prefetched bundle it left on disk.
+
+        Parameters:
+            guild (Guild): The guild of the game.
+            textChannel (TextChannel): The text channel of the game.
+            snapshot (dict): A snapshot returned by toSnapshot.
+
+        Returns:
+            TossupGame: The game, or None if it had no question and a new one could not be prepared.
+        '''
+
+        game = cls(guild, textChannel, snapshot['cats'], snapshot['diff'], snapshot['speed'], snapshot['autoAdvanceGap'])
+        game.players = PlayerRegistry.fromList(snapshot['players'])
+        game.heard = BloomFilter.fromDict(snapshot['heard'])
+        game.tossupsHeard = snapshot['tossupsHeard']
+        game.category = snapshot['category']
+        game.difficulty = snapshot['difficulty']
+        game.gameStart = snapshot['gameStart']
+
+        if not game.gameStart:
+            # A game that was set up but not started still has its first question on disk
+            files = [f'{game.DIRECTORY_PATH}{path}' for path in (game.TOSSUP_PATH, game.AUDIO_PATH, game.SYNCMAP_PATH, game.ANSWER_PATH)]
+            if all(os.path.exists(file) for file in files):
+                await game.preparePlayback()
+            elif not await game.createTossup():
+                return None
+
+        bundle = snapshot['nextBundle']
+        if bundle is not None and os.path.isdir(bundle['directory']):
+            game.nextBundle = asyncio.get_running_loop().create_future()
+            game.nextBundle.set_result(bundle)
+        return game
+
+    async def prepareBundle(self) -> Optional[dict]:
+        '''
+        Prepare the next tossup in a staging directory of the game, so createTossup only has to move it in place.
+
+        Returns:
+            dict: A bundle in the same form as warm pool bundles, or None if it could not be prepared.
+        '''
+
+        key = (self.diff, str(self.categories))
+        try:
+            bundle = await warmPool.take(key, self.heard)
+            if bundle is not None:
+                return bundle
+
+            tossup = await nextTossup(self.diff, str(self.categories), self.heard)
+            if tossup is None:
+                return None
+            directory = f'{self.DIRECTORY_PATH}/next'
+            Path(directory).mkdir(parents=True, exist_ok=True)
+            if not await fa.generateSyncMap(directory_path=directory, audio_file_path=self.AUDIO_PATH,
                                             text_file_path=self.TOSSUP_PATH,
                                             sync_map_file_path=self.SYNCMAP_PATH,
                                             answer_file_path=self.ANSWER_PATH, reading_speed=1.0,
-                                            guildId=self.guild.id, channelId=self.textChannel.id,
-                                            subjects=str(self.categories), question_numbers=self.diff)
-
-        return True if completed else False
+                                            subjects=str(self.categories), question_numbers=self.diff, tossup=tossup):
+                return None
+            return {'id': tossup['id'], 'category': tossup['category'], 'difficulty': tossup['difficulty'], 'directory': directory}
+        except Exception as e:
+            logging.error(f'Error while preparing the next tossup: {e}')
+            return None
 
     async def checkAnswer(self, authorID: int, answer: str):
         '''
@@ -123,42 +534,71 @@ class TossupGame(BaseGame):
         self.playback_position.resumeAudio()
         buzzInTime = self.playback_position.getPlaybackPosition()
 
-        async def checkPowerMark(playback_position: float) -> bool:
+        async def locateBuzz(playback_position: float):
+            if self.alignment is not None and not await fa.awaitAlignment(self.alignment):
+                return await estimateBuzz(playback_position)
+
             # Load JSON file asynchronously
-            async with aiofiles.open(f'{self.DIRECTORY_PATH}{self.SYNCMAP_PATH}', mode='r') as f:
+            async with aiofiles.open(self.playbackSyncMapPath, mode='r') as f:
                 data = json.loads(await f.read())
 
-            # Check if playback_position falls within any power mark ranges
+            # Find the fragment playback_position falls within
             for i, fragment in enumerate(data['fragments']):
                 begin = float(fragment['begin'])
                 end = float(fragment['end'])
                 if begin <= playback_position <= end:
-                    self.buzzWordIndex = i
-                    return '*' in fragment['lines']  # Check if power mark is present
+                    return i, len(data['fragments']), '*' in fragment['lines']  # Check if power mark is present
 
-            return False
+            return None, len(data['fragments']), False
+
+        async def estimateBuzz(playback_position: float):
+            # Without a sync map, assume the words are read at an even pace and count buzzes before the power mark as powers
+            async with aiofiles.open(f'{self.DIRECTORY_PATH}{self.TOSSUP_PATH}', mode='r', encoding='utf-8') as f:
+                words = await f.readlines()
+            if not words or not self.audioDuration:
+                return None, 0, False
+            index = min(int(playback_position / self.audioDuration * len(words)), len(words) - 1)
+            powerIndex = next((i for i, word in enumerate(words) if '*' in word), None)
+            return index, len(words), powerIndex is not None and index < powerIndex
 
-        correct = await fq.checkAnswer(answer, f'{self.DIRECTORY_PATH}{self.ANSWER_PATH}')
+        async def checkPowerMark(playback_position: float) -> bool:
+            index, wordCount, isPower = await locateBuzz(playback_position)
+            if index is not None:
+                self.buzzWordIndex = index
+            recordBuzzPosition(index, wordCount)
+            return isPower
+
+        def recordBuzzPosition(index, wordCount):
+            # Buzzes after the last word count as the end of the question
+            position = index / wordCount if index is not None and wordCount else 1.0
+            buzzAnalytics.record(authorID, self.category, self.difficulty, position)
+
+        with tracing.span('checkAnswer', parent=self.traceSpan, player=authorID) as span:
+            correct = await fq.checkAnswer(answer, f'{self.DIRECTORY_PATH}{self.ANSWER_PATH}')
+            span.setAttribute('directive', correct)
         msg = ""
         if correct == 'accept':
-            for i in range(len(self.players)):
-                if self.players[i].id == authorID:
-                    if await checkPowerMark(buzzInTime):
-                        self.players[i].addPower()
-                    self.players[i].addTen()
-                    break
+            player = self.players.get(authorID)
+            if player is not None:
+                if await checkPowerMark(buzzInTime):
+                    # A power also counts as a ten
+                    self.players.record(authorID, 'power', 'ten')
+                    statsStore.record(self.guild.id, authorID, player.name, self.category, 'power')
+                else:
+                    self.players.record(authorID, 'ten')
+                    statsStore.record(self.guild.id, authorID, player.name, self.category, 'ten')
             msg = 'You are correct!'
         elif correct == 'prompt':
             msg = 'Your answer is close. Prompt?'
 
         elif correct == 'reject':
-            for i in range(len(self.players)):
-                if self.players[i].id == authorID:
-                    if self.tossupStart:
-                        self.players[i].addNeg()
-                    break
+            player = self.players.get(authorID)
+            if player is not None and self.tossupStart:
+                index, wordCount, _ = await locateBuzz(buzzInTime)
+                recordBuzzPosition(index, wordCount)
+                self.players.record(authorID, 'neg')
+                statsStore.record(self.guild.id, authorID, player.name, self.category, 'neg')
             msg = 'You are incorrect.'
-            self.buzzedIn = False
         return msg, correct
     
     async def playTossup(self, ctx: Context):
@@ -166,66 +606,154 @@ class TossupGame(BaseGame):
         Start playing a tossup.
 
         Parameters:
-            ctx (Context): The context of the command.
+            ctx (Context): The context of the command, or the text channel of the game when auto-advancing.
 
         Returns:
             None
         '''
 
         self.gameStart = True
-        self.questionEnd = False
         self.timer.seconds_passed = 0
         self.timer.stopped = False
         self.tossupsHeard += 1
-
-        async def trueTossupEnded(error):
-            if error:
-                logging.error(f'Error: {error}')
-            else:
-                logging.info('Question finished')
-            
-            self.tossupStart = False
-            self.playback_position.pauseAudio()
-            # Wait for timer to complete
-            if not self.questionEnd:
-                await self.timer.start_timer(5, ctx)
-                if not self.questionEnd:
-                    await self.stopTossup(ctx)
+        self.generation += 1
+        self.state = READING
+        generation = self.generation
+        if self.guild.voice_client is not None:
+            voiceBuzz.listen(self.guild.voice_client, lambda: self.state in BUZZ, self.voiceUtterance)
+        loop = asyncio.get_running_loop()
+        span = self.traceSpan
+        if span is not None:
+            span.addEvent('play')
+
+        def firstFrame():
+            if span is not None:
+                span.addEvent('firstFrame')
 
         def tossupEnded(error):
-            asyncio.run_coroutine_threadsafe(trueTossupEnded(error), ctx.bot.loop)
-
-        audio_source = discord.FFmpegPCMAudio(f'{self.DIRECTORY_PATH}{self.AUDIO_PATH}')
+            # Runs on the voice player thread
+            self.actor.postThreadsafe('readingEnded', generation, error)
+
+        if self.autoAdvanceGap is not None:
+            self.playback_position.reset()
+            self.playback_position.playAudio()
+            try:
+                self.queueAudio(lambda: self.actor.post('readingEnded', generation, None), firstFrame)
+            except Exception as e:
+                logging.error(f'Error during audio playback: {e}')
+                queueSend(ctx, embed=create_embed('Error', 'Failed to play audio. Please try again.'))
+            return
+
+        audio_source = FirstFrameSource(self.createAudioSource(), firstFrame)
         await asyncio.sleep(0.2)
-        self.tossupStart = True
 
         self.playback_position.reset()
         self.playback_position.playAudio()
 
-        loop = asyncio.get_event_loop()
         try:
-            await loop.run_in_executor(None, lambda: self.guild.voice_client.play(audio_source, after=tossupEnded))
+            # The after callback runs on the voice player thread, so it needs the trace context bound to it
+            after = tracing.bind(tossupEnded)
+            await loop.run_in_executor(None, lambda: self.guild.voice_client.play(audio_source, after=after))
         except Exception as e:
             logging.error(f'Error during audio playback: {e}')
-            await ctx.send(embed=create_embed('Error', 'Failed to play audio. Please try again.'))
+            queueSend(ctx, embed=create_embed('Error', 'Failed to play audio. Please try again.'))
+
+    def queueAudio(self, onEnd, onStart=None) -> None:
+        '''
+        Queue the current tossup on the continuous source of the game, starting the source if it is not playing yet.
+
+        Parameters:
+            onEnd (Callable): Called on the event loop once the tossup has been read.
+            onStart (Callable): Called from the voice player thread when the first frame of the tossup is read.
+        '''
+
+        voiceClient = self.guild.voice_client
+        if self.queuedSource is None or not (voiceClient.is_playing() or voiceClient.is_paused()):
+            self.queuedSource = QueuedAudioSource(asyncio.get_running_loop())
+            voiceClient.play(self.queuedSource)
+        self.queuedSource.enqueue(self.playbackPcmPath, onEnd, onStart)
+
+    async def autoAdvance(self, channel: discord.TextChannel) -> None:
+        '''
+        Wait for the auto-advance gap, then read the next tossup unless the game ended or !next already moved on.
+
+        Parameters:
+            channel (discord.TextChannel): The text channel of the game.
+        '''
 
-    async def pauseTossup(self, ctx: discord.Message) -> None:
+        async def advance():
+            if not self.gameStart or not self.questionEnd:
+                return
+            if self.packetDone:
+                queueSend(channel, embed=create_embed('Packet Finished', TEXT["game"]["packet_finished"]))
+                return
+            if not await self.createTossup():
+                if self.packetPreparing:
+                    queueSend(channel, embed=create_embed('Packet', TEXT["game"]["packet_preparing"]))
+                else:
+                    queueSend(channel, embed=create_embed('Error', TEXT["error"]["something_wrong"]))
+                return
+            queueSend(channel, embed=create_embed('Reading Tossup', TEXT["game"]["reading_tossup"]))
+            await self.playTossup(channel)
+
+        await asyncio.sleep(self.autoAdvanceGap)
+        if self.packetPreparing:
+            queueSend(channel, embed=create_embed('Packet', TEXT["game"]["packet_preparing"]))
+            await self.packet.waitReady(self.packetIndex)
+        # Cancelling this task before the command event comes up drops the event
+        await self.actor.submit('command', advance)
+
+    def cancelAutoAdvance(self) -> None:
+        '''
+        Cancel a pending auto-advance, e.g. because a player moved on with !next or ended the game.
+        '''
+
+        if self.advanceTask is not None and self.advanceTask is not asyncio.current_task():
+            self.advanceTask.cancel()
+        self.advanceTask = None
+
+    def close(self) -> None:
+        '''
+        Release what the game holds outside its own state once it has ended, such as the prepared questions of its packet.
+        '''
+
+        if self.packet is not None:
+            self.packet.cancel()
+
+    def createAudioSource(self) -> discord.AudioSource:
+        '''
+        Create the audio source the current tossup is played from.
+
+        Returns:
+            discord.AudioSource: The source to pass to the voice client.
+        '''
+
+        return discord.FFmpegPCMAudio(self.playbackAudioPath)
+
+    async def pauseTossup(self, author: discord.abc.User, at: Optional[float]=None) -> None:
         '''
         Pause the current tossup.
 
         Parameters:
-            ctx (discord.Message): The message context triggering the pause action.
+            author (discord.abc.User): The player who buzzed.
+            at (float): The wall clock time of the buzz if it was earlier than now, e.g. when the player started speaking.
 
         Returns:
             None
         '''
 
-        self.buzzedIn = True
-        self.buzzedInBy = ctx.author.id
-        if not self.tossupStart and not self.questionEnd:
+        self.buzzedInBy = author.id
+        if at is not None:
+            # A speech onset from before the reading started or resumed, or ahead of the clock, would misplace the buzz
+            at = self.playback_position.clampOnset(at)
+        if self.traceSpan is not None:
+            position = self.playback_position.getPlaybackPosition() - (time.time() - at if at is not None else 0)
+            self.traceSpan.addEvent('buzz', player=author.id, position=round(position, 3))
+        if self.state == WINDOW:
             self.timer.pause()
-        if self.tossupStart:
-            self.playback_position.pauseAudio()
+        else:
+            self.playback_position.pauseAudio(at)
+        self.state = BUZZ[self.state]
         self.guild.voice_client.pause()
 
     async def resumeTossup(self) -> None:
@@ -233,7 +761,8 @@ class TossupGame(BaseGame):
         Resume the paused tossup question and resume the timer if the tossup has not started and the question has not ended. Then, resume the voice client for the guild.
         '''
 
-        if not self.tossupStart and not self.questionEnd:
+        self.state = RESUME[self.state]
+        if self.state == WINDOW:
             self.timer.resume()
         self.guild.voice_client.resume()
     
@@ -248,12 +777,20 @@ class TossupGame(BaseGame):
             None
         '''
 
-        self.buzzedIn = False
-        self.tossupStart = False
-        self.questionEnd = True
+        self.state = IDLE
         self.timer.stop()
         logging.info('Tossup ended')
-        self.guild.voice_client.stop()
+        if self.traceSpan is not None:
+            self.traceSpan.addEvent('stopTossup', buzzWordIndex=self.buzzWordIndex)
+        self.finishTrace()
+        if self.queuedSource is not None and self.gameStart:
+            # Keep the continuous source playing silence instead of stopping the voice player
+            self.queuedSource.skip()
+            if self.guild.voice_client.is_paused():
+                self.guild.voice_client.resume()
+        else:
+            self.guild.voice_client.stop()
+            self.queuedSource = None
 
         if self.gameStart:
             async with aiofiles.open(f'{self.DIRECTORY_PATH}{self.TOSSUP_PATH}', 'r', encoding='utf-8') as tossup:
@@ -270,8 +807,12 @@ class TossupGame(BaseGame):
                 answerLine = file[1].replace('\n', '')
                 displayAnswer = answerLine.strip().replace('<b>', '**').replace('</b>', '**').replace('<u>', '__').replace('</u>', '__')
                     
-            await channel.send(embed=create_embed('Tossup', f'{real_tossup}'))
-            await channel.send(embed=create_embed('Answer', f'{displayAnswer}\n\nTo get the next tossup, type !next'))
+            queueSend(channel, embed=create_embed('Tossup', f'{real_tossup}'))
+            if self.autoAdvanceGap is not None:
+                queueSend(channel, embed=create_embed('Answer', f'{displayAnswer}\n\n' + TEXT["game"]["auto_next"].format(gap=self.autoAdvanceGap)))
+                self.advanceTask = asyncio.create_task(self.autoAdvance(channel))
+            else:
+                queueSend(channel, embed=create_embed('Answer', f'{displayAnswer}\n\nTo get the next tossup, type !next'))
         else:
             self.initalized = False
-            await channel.send('Game Ended.')
\ No newline at end of file
+            queueSend(channel, content='Game Ended.')
\ No newline at end of file
@@ -0,0 +1,410 @@
+import io
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import BinaryIO, List, Optional
+import requests
+from dotenv import load_dotenv
+import util.metrics as metrics
+from util.memoryBudget import memoryAccountant, PRIORITY_CACHE
+from util.upstream import CircuitBreaker
+
+load_dotenv()
+
+# 'none', 'local', 'sqlite' or 'http'
+ARTIFACT_STORE = os.getenv('ARTIFACT_STORE', 'none')
+ARTIFACT_PATH = os.getenv('ARTIFACT_PATH', 'artifacts')
+ARTIFACT_URL = os.getenv('ARTIFACT_URL', 'http://127.0.0.1:8750')
+# Bump when the way questions are synthesized changes, so hosts stop sharing artifacts made the old way
+ARTIFACT_NAMESPACE = os.getenv('ARTIFACT_NAMESPACE', 'v1')
+CHUNK_SIZE = 64 * 1024
+
+class ArtifactStore(ABC):
+    '''
+    Class representing a key-value store of prepared question files shared by every host running the bot.
+
+    Values are read and written as streams, so an audio file is copied chunk by chunk and never held in memory whole.
+
+        Methods:
+            open (key: str) -> BinaryIO: A stream of the value of a key, or None if it is not stored.
+            put (key: str, stream: BinaryIO, size: int): Store the contents of a stream under a key.
+    '''
+
+    @abstractmethod
+    def open(self, key: str) -> Optional[BinaryIO]:
+        ...
+
+    @abstractmethod
+    def put(self, key: str, stream: BinaryIO, size: int) -> None:
+        ...
+
+class LocalArtifactStore(ArtifactStore):
+    '''
+    Artifact store keeping every value as a file under a directory, e.g. on a disk shared over NFS.
+    '''
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        parts = key.split('/')
+        if '..' in parts or '' in parts:
+            raise ValueError(f'Invalid artifact key {key}')
+        return os.path.join(self.root, *parts)
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        try:
+            return open(self.path(key), 'rb')
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, stream: BinaryIO, size: int) -> None:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Readers on other hosts never see a partly written file
+        temporaryPath = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+        with open(temporaryPath, 'wb') as f:
+            shutil.copyfileobj(stream, f, CHUNK_SIZE)
+        os.replace(temporaryPath, path)
+
+class SqliteArtifactStore(ArtifactStore):
+    '''
+    Artifact store keeping every value as a row of a SQLite database. Values are streamed with incremental blob I/O.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection: Optional[sqlite3.Connection] = None
+        self.lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS artifacts (key TEXT PRIMARY KEY, data BLOB NOT NULL)')
+        return self.connection
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        with self.lock:
+            self.connect()
+        # Each reader gets its own connection, so it can stream its blob while other threads use the store
+        connection = sqlite3.connect(self.path)
+        row = connection.execute('SELECT rowid FROM artifacts WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            connection.close()
+            return None
+        return BlobReader(connection, connection.blobopen('artifacts', 'data', row[0], readonly=True))
+
+    def put(self, key: str, stream: BinaryIO, size: int) -> None:
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                rowid = connection.execute('INSERT OR REPLACE INTO artifacts (key, data) VALUES (?, zeroblob(?))', (key, size)).lastrowid
+                with connection.blobopen('artifacts', 'data', rowid) as blob:
+                    while chunk := stream.read(CHUNK_SIZE):
+                        blob.write(chunk)
+
+class BlobReader(io.RawIOBase):
+    '''
+    Stream reading a SQLite blob, closing its connection with it.
+    '''
+
+    def __init__(self, connection: sqlite3.Connection, blob):
+        self.connection = connection
+        self.blob = blob
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.blob.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.blob.close()
+            self.connection.close()
+        super().close()
+
+class HttpArtifactStore(ArtifactStore):
+    '''
+    Artifact store on a networked key-value server, read with GET and written with PUT at {url}/{key}.
+
+    Repeated failures open a circuit breaker, after which keys are reported missing until the server recovers,
+    so questions are prepared locally instead of waiting on an unreachable store.
+    '''
+
+    def __init__(self, url: str, timeout: float=5.0):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.breaker = CircuitBreaker()
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        if not self.breaker.allow():
+            return None
+        try:
+            response = self.session.get(f'{self.url}/{key}', stream=True, timeout=self.timeout)
+            if response.status_code == 404:
+                self.breaker.recordSuccess()
+                response.close()
+                return None
+            response.raise_for_status()
+        except requests.RequestException:
+            self.breaker.recordFailure()
+            raise
+        self.breaker.recordSuccess()
+        response.raw.decode_content = True
+        return response.raw
+
+    def put(self, key: str, stream: BinaryIO, size: int) -> None:
+        if not self.breaker.allow():
+            return
+        try:
+            # requests sends a file object in chunks
+            self.session.put(f'{self.url}/{key}', data=stream, headers={'Content-Length': str(size)}, timeout=self.timeout).raise_for_status()
+        except requests.RequestException:
+            self.breaker.recordFailure()
+            raise
+        self.breaker.recordSuccess()
+
+class CachingReader(io.RawIOBase):
+    '''
+    Stream passing a value through while keeping a copy, which is added to the cache once it has been read to the end.
+    Values over the cache's entry limit are passed through without keeping them.
+    '''
+
+    def __init__(self, stream: BinaryIO, cache: 'CachedArtifactStore', key: str):
+        self.stream = stream
+        self.cache = cache
+        self.key = key
+        self.copy: Optional[bytearray] = bytearray()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.stream.read(len(buffer))
+        buffer[:len(data)] = data
+        if self.copy is not None:
+            if not data:
+                self.cache.add(self.key, bytes(self.copy))
+                self.copy = None
+            elif len(self.copy) + len(data) > self.cache.maxEntryBytes:
+                self.copy = None
+            else:
+                self.copy += data
+        return len(data)
+
+    def close(self) -> None:
+        self.stream.close()
+        super().close()
+
+class CachedArtifactStore(ArtifactStore):
+    '''
+    In-process read-through LRU cache in front of another artifact store, bounded in bytes.
+
+        Attributes:
+            backend (ArtifactStore): The store read on a miss and written through on put.
+            maxBytes (int): Most bytes of values kept in memory.
+            maxEntryBytes (int): Values larger than this are streamed without caching them.
+    '''
+
+    def __init__(self, backend: ArtifactStore, maxBytes: int=32 * 1024 * 1024, maxEntryBytes: int=4 * 1024 * 1024):
+        self.backend = backend
+        self.maxBytes = maxBytes
+        self.maxEntryBytes = maxEntryBytes
+        self.entries: OrderedDict = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def memoryFootprint(self) -> int:
+        return self.size
+
+    def evictMemory(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def add(self, key: str, data: bytes) -> None:
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = data
+            self.size += len(data)
+            while self.size > self.maxBytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+        if data is not None:
+            metrics.increment('artifacts.cacheHits')
+            return io.BytesIO(data)
+        metrics.increment('artifacts.cacheMisses')
+        stream = self.backend.open(key)
+        return CachingReader(stream, self, key) if stream is not None else None
+
+    def put(self, key: str, stream: BinaryIO, size: int) -> None:
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+        self.backend.put(key, stream, size)
+
+def createStore(kind: str=ARTIFACT_STORE) -> Optional[CachedArtifactStore]:
+    '''
+    Create the artifact store configured by ARTIFACT_STORE, behind a read-through cache.
+
+    Returns:
+        CachedArtifactStore: The store, or None if artifacts are not shared.
+    '''
+
+    if kind == 'local':
+        backend = LocalArtifactStore(ARTIFACT_PATH)
+    elif kind == 'sqlite':
+        backend = SqliteArtifactStore(ARTIFACT_PATH)
+    elif kind == 'http':
+        backend = HttpArtifactStore(ARTIFACT_URL)
+    else:
+        return None
+    store = CachedArtifactStore(backend, int(float(os.getenv('ARTIFACT_CACHE_MB', '32')) * 1024 * 1024))
+    memoryAccountant.register(store, 'artifactCache', PRIORITY_CACHE)
+    return store
+
+artifactStore = createStore()
+
+def bundleKey(bundleId: str, file: str) -> str:
+    return f'{ARTIFACT_NAMESPACE}/tossup/{bundleId}{file}'
+
+def fetchBundle(bundleId: str, directory: str, files: List[str]) -> bool:
+    '''
+    Copy the files of a question another host already prepared into a directory. Blocking, run it on an executor thread.
+
+    Args:
+        bundleId (str): The ID of the tossup.
+        directory (str): The directory to write the files to.
+        files (List[str]): The file names, each starting with '/'. The last one is written last by publishBundle,
+            so a bundle is only complete once it exists.
+
+    Returns:
+        bool: True if every file was copied. Otherwise none of the files are left in the directory.
+    '''
+
+    if artifactStore is None:
+        return False
+    written = []
+    try:
+        for file in [files[-1]] + files[:-1]:
+            stream = artifactStore.open(bundleKey(bundleId, file))
+            if stream is None:
+                break
+            written.append(f'{directory}{file}')
+            with stream, open(written[-1], 'wb') as f:
+                shutil.copyfileobj(stream, f, CHUNK_SIZE)
+        else:
+            metrics.increment('artifacts.bundleHits')
+            return True
+    except (OSError, sqlite3.Error, requests.RequestException) as e:
+        logging.warning(f'Failed to fetch tossup {bundleId} from the artifact store: {e}')
+
+    # A partly copied bundle would pass for a prepared one
+    for path in written:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return False
+
+def publishBundle(bundleId: str, directory: str, files: List[str]) -> None:
+    '''
+    Store the files of a prepared question for other hosts. Blocking, run it on an executor thread.
+
+    Args:
+        bundleId (str): The ID of the tossup.
+        directory (str): The directory holding the files.
+        files (List[str]): The file names, each starting with '/', stored in order.
+    '''
+
+    if artifactStore is None:
+        return
+    try:
+        for file in files:
+            path = f'{directory}{file}'
+            with open(path, 'rb') as f:
+                artifactStore.put(bundleKey(bundleId, file), f, os.path.getsize(path))
+    except (OSError, sqlite3.Error, requests.RequestException) as e:
+        logging.warning(f'Failed to publish tossup {bundleId} to the artifact store: {e}')
+
+class ArtifactRequestHandler(BaseHTTPRequestHandler):
+    '''
+    Handler of a minimal key-value server over a LocalArtifactStore, speaking the protocol of HttpArtifactStore.
+    '''
+
+    store: LocalArtifactStore = None
+
+    def do_GET(self) -> None:
+        try:
+            stream = self.store.open(self.path.lstrip('/'))
+        except ValueError:
+            self.send_error(400)
+            return
+        if stream is None:
+            self.send_error(404)
+            return
+        with stream:
+            self.send_response(200)
+            self.send_header('Content-Length', str(os.fstat(stream.fileno()).st_size))
+            self.end_headers()
+            shutil.copyfileobj(stream, self.wfile, CHUNK_SIZE)
+
+    def do_PUT(self) -> None:
+        size = int(self.headers.get('Content-Length', 0))
+        try:
+            self.store.put(self.path.lstrip('/'), io.BufferedReader(LimitedReader(self.rfile, size)), size)
+        except ValueError:
+            self.send_error(400)
+            return
+        self.send_response(204)
+        self.end_headers()
+
+class LimitedReader(io.RawIOBase):
+    '''
+    Stream reading at most a number of bytes from another one, e.g. the body of a request.
+    '''
+
+    def __init__(self, stream: BinaryIO, remaining: int):
+        self.stream = stream
+        self.remaining = remaining
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.stream.read(min(len(buffer), self.remaining))
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+def serve(root: str, port: int) -> None:
+    '''
+    Run a local stand-in for the networked artifact store, e.g. `python -m util.artifactStore artifacts 8750`.
+    '''
+
+    ArtifactRequestHandler.store = LocalArtifactStore(root)
+    server = ThreadingHTTPServer(('127.0.0.1', port), ArtifactRequestHandler)
+    logging.info(f'Serving artifacts from {root} on port {port}')
+    server.serve_forever()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    serve(sys.argv[1] if len(sys.argv) > 1 else ARTIFACT_PATH, int(sys.argv[2]) if len(sys.argv) > 2 else 8750)
@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import subprocess
+from typing import Optional
+
+# Loudness target of every reading, in LUFS, so all voices and engines play at the same volume
+LOUDNESS_TARGET = -16.0
+SILENCE_THRESHOLD = '-50dB'
+
+def silenceFilter() -> str:
+    '''
+    Builds an FFmpeg filter that removes leading silence. Trailing silence is removed by running it on the
+    reversed audio.
+    '''
+
+    return f'silenceremove=start_periods=1:start_threshold={SILENCE_THRESHOLD}:start_silence=0.05'
+
+def postProcess(audioPath: str) -> str:
+    '''
+    Trims leading and trailing silence from a synthesized reading and normalizes its loudness, replacing the file.
+    This runs once, right after synthesis, so alignment and every later speed variant see the processed audio.
+
+    Args:
+        audioPath (str): The path of the synthesized audio.
+
+    Returns:
+        str: The path of the audio, which is left untouched if processing failed.
+    '''
+
+    root, ext = os.path.splitext(audioPath)
+    processedPath = f'{root}-processed{ext}'
+    filters = ','.join([silenceFilter(), 'areverse', silenceFilter(), 'areverse',
+                        f'loudnorm=I={LOUDNESS_TARGET}:TP=-1.5:LRA=11'])
+    try:
+        subprocess.run(
+            ['ffmpeg', '-y', '-loglevel', 'error', '-i', audioPath, '-filter:a', filters, '-ar', '48000', processedPath],
+            check=True, capture_output=True
+        )
+        os.replace(processedPath, audioPath)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logging.error(f'Failed to post-process {audioPath}, keeping the raw audio: {e}')
+        if os.path.exists(processedPath):
+            os.remove(processedPath)
+    return audioPath
+
+def audioDuration(audioPath: str) -> float:
+    '''
+    Returns the duration of an audio file in seconds, as reported by ffprobe.
+    '''
+
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', audioPath],
+        check=True, capture_output=True, text=True
+    )
+    return float(result.stdout.strip())
+
+def metaPath(audioPath: str) -> str:
+    '''
+    Returns the path of the metadata file kept next to an audio file, e.g. temp/tossup.mp3 -> temp/tossupMeta.json.
+    '''
+
+    return f'{os.path.splitext(audioPath)[0]}Meta.json'
+
+def writeMeta(audioPath: str, engine: str='google') -> dict:
+    '''
+    Writes the metadata of a prepared reading next to its audio. If the audio cannot be probed, no metadata is
+    written and the reading is played without it, like one prepared before metadata existed.
+
+    Args:
+        audioPath (str): The path of the post-processed audio.
+        engine (str): The TTS engine that read the audio, 'google' or the offline engine.
+
+    Returns:
+        dict: The metadata, the duration of the audio in seconds and its engine, or an empty dict if probing failed.
+    '''
+
+    try:
+        meta = {'duration': audioDuration(audioPath), 'engine': engine}
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        logging.error(f'Failed to probe {audioPath}, preparing it without metadata: {e}')
+        # Metadata left from an earlier question in the same directory would describe the wrong audio
+        try:
+            os.remove(metaPath(audioPath))
+        except OSError:
+            pass
+        return {}
+    with open(metaPath(audioPath), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return meta
+
+def readMeta(audioPath: str) -> dict:
+    '''
+    Returns the metadata of a prepared reading, or an empty dict if it has none.
+    '''
+
+    try:
+        with open(metaPath(audioPath), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def readDuration(audioPath: str) -> Optional[float]:
+    '''
+    Returns the duration recorded in the metadata of a prepared reading, or None if it has none.
+    '''
+
+    return readMeta(audioPath).get('duration')
+
+def decodePcm(audioPath: str) -> str:
+    '''
+    Decodes an audio file to the raw 48kHz stereo PCM the voice client sends, kept next to the original, so
+    it can be played without starting FFmpeg.
+
+    Args:
+        audioPath (str): The path of the audio file.
+
+    Returns:
+        str: The path of the PCM file.
+    '''
+
+    outputPath = f'{os.path.splitext(audioPath)[0]}.pcm'
+    if os.path.exists(outputPath) and os.path.getmtime(outputPath) >= os.path.getmtime(audioPath):
+        return outputPath
+
+    subprocess.run(
+        ['ffmpeg', '-y', '-loglevel', 'error', '-i', audioPath, '-f', 's16le', '-ar', '48000', '-ac', '2', outputPath],
+        check=True, capture_output=True
+    )
+    return outputPath
@@ -1,9 +1,10 @@
-from typing import List
 import discord
 
 import discord.ext
 from discord.ext.commands import Context
-from util.player import Player
+from util.text import TEXT
+from util.memoryBudget import memoryAccountant, sizeOf, PRIORITY_ACTIVE
+from util.playerRegistry import PlayerRegistry
 from util.timers import PausableTimer
 
 class BaseGame:
@@ -12,7 +13,7 @@ class BaseGame:
 
         self.guild = guild
         self.textChannel = textChannel
-        self.players: List[Player] = []
+        self.players = PlayerRegistry()
         self.timer = PausableTimer()
 
         catsDict = {
@@ -29,6 +30,7 @@ class BaseGame:
             '': '',
         }
 
+        self.cats = cats
         cats = cats.split(',')
 
         self.categories = []
@@ -39,6 +41,19 @@ class BaseGame:
                 return False
             self.categories.append(catsDict[category])
 
+        if guild is not None and textChannel is not None:
+            memoryAccountant.register(self, f'{type(self).__name__}:{guild.id}-{textChannel.id}', PRIORITY_ACTIVE)
+
+    def memoryFootprint(self) -> int:
+        '''
+        Approximate the memory used by the game, reported to the memory accountant.
+
+        Returns:
+            int: The approximate size of the game state in bytes.
+        '''
+
+        return sizeOf(self.__dict__, self.players.byId, self.players.keys, self.players.ranking, self.categories) + sum(sizeOf(player) for player in self.players)
+
     async def addPlayer(self, author: Context.author):
         '''
         Add a player to the game.
@@ -47,11 +62,10 @@ class BaseGame:
             author (Context.author): The author of the player being added.
         
         Returns:
-            bool: True if the player is successfully added.
+            bool: True if the player is successfully added, False if they already joined.
         '''
 
-        self.players.append(Player(author))
-        return True
+        return self.players.add(author)
 
     async def checkForPlayer(self, playerID: int):
         '''
@@ -64,20 +78,24 @@ class BaseGame:
             bool: True if the player is found in the game, False otherwise.
         '''
 
-        return any(playerID == part.id for part in self.players)
+        return playerID in self.players
 
-    async def getScores(self, ctx: Context):
+    async def getScores(self, ctx: Context, page: int=1):
         '''
-        Get scores of all players in the game.
+        Get one page of the scoreboard of the game.
 
         Parameters:
             ctx (Context): The context of the command.
+            page (int): The 1-based page of the scoreboard.
 
         Returns:
-            str: A formatted string representing the scores of all players. 
+            str: The ranked scores of the page, followed by the page number and the rank of the author when they are on another page.
         '''
 
-        allPlayerScores = {}
-        for player in self.players:
-            allPlayerScores[player.name] = player.calcTotal()
-        return str(allPlayerScores).replace(', ', '\n').replace(':', ' | ').replace('{', '').replace('}', '')
\ No newline at end of file
+        scores, page, pages = self.players.page(page)
+        if pages > 1:
+            scores += '\n\n' + TEXT["game"]["scores_page"].format(page=page, pages=pages)
+            rank = self.players.rank(ctx.author.id)
+            if rank is not None:
+                scores += '\n' + TEXT["game"]["your_rank"].format(rank=rank, players=len(self.players))
+        return scores
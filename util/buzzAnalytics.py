@@ -0,0 +1,149 @@
+from array import array
+from typing import Dict, Iterable, List, Optional
+from util.memoryBudget import memoryAccountant, sizeOf, PRIORITY_ACTIVE
+
+class BuzzSketch:
+    '''
+    Class representing a fixed-size streaming summary of buzz positions, where a position is the buzz word index
+    divided by the number of words in the tossup (0 is the first word, 1 is after the last word).
+
+    Every update is O(1), the memory used never grows, and two sketches merge exactly, so summaries kept by
+    different shards can be combined.
+
+        Attributes:
+            count (int): Number of buzzes recorded.
+            mean (float): Running mean of the positions.
+            m2 (float): Running sum of squared differences from the mean.
+            bins (array): Histogram of the positions in BINS equal-width bins.
+
+        Methods:
+            add (position: float): Record a buzz position.
+            merge (other: BuzzSketch): Add the buzzes of another sketch.
+            quantile (q: float) -> float: Estimate a quantile of the positions.
+            variance () -> float: The variance of the positions.
+    '''
+
+    __slots__ = ('count', 'mean', 'm2', 'bins')
+    BINS = 20
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.bins = array('I', [0] * self.BINS)
+
+    def add(self, position: float) -> None:
+        position = min(max(position, 0.0), 1.0)
+        self.count += 1
+        delta = position - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (position - self.mean)
+        self.bins[min(int(position * self.BINS), self.BINS - 1)] += 1
+
+    def merge(self, other: 'BuzzSketch') -> None:
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        for i in range(self.BINS):
+            self.bins[i] += other.bins[i]
+
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, binCount in enumerate(self.bins):
+            if binCount and seen + binCount >= target:
+                # Interpolate linearly inside the bin
+                return (i + (target - seen) / binCount) / self.BINS
+            seen += binCount
+        return 1.0
+
+    def toDict(self) -> dict:
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'bins': list(self.bins)}
+
+    @classmethod
+    def fromDict(cls, data: dict) -> 'BuzzSketch':
+        sketch = cls()
+        sketch.count = data['count']
+        sketch.mean = data['mean']
+        sketch.m2 = data['m2']
+        sketch.bins = array('I', data['bins'])
+        return sketch
+
+class BuzzAnalytics:
+    '''
+    Class representing buzz position summaries, kept per player, category and difficulty.
+
+    The module-level instance only holds the buzzes recorded since the last flush of the stats store, which
+    drains it and merges it into the summaries saved in the database. Every shard does the same, so the saved
+    summaries cover all of them and survive restarts.
+
+        Methods:
+            record (playerId: int, category: str, difficulty: str, position: float): Record a buzz in O(1).
+            summary (playerId: int) -> Dict[str, BuzzSketch]: The summaries of a player by category, plus an 'All' entry.
+            byDifficulty (playerId: int) -> Dict[str, BuzzSketch]: The summaries of a player by difficulty.
+            merge (other: BuzzAnalytics): Add the summaries of another instance.
+            drain () -> List[list]: Take the summaries as rows, leaving the instance empty.
+    '''
+
+    def __init__(self):
+        self.sketches: Dict[tuple, BuzzSketch] = {}
+
+    def memoryFootprint(self) -> int:
+        return sizeOf(self.sketches) + sum(sizeOf(*key) + sizeOf(sketch, sketch.bins) for key, sketch in self.sketches.items())
+
+    def record(self, playerId: int, category: str, difficulty: str, position: float) -> None:
+        key = (playerId, category or 'Unknown', str(difficulty))
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            sketch = self.sketches[key] = BuzzSketch()
+        sketch.add(position)
+
+    def summary(self, playerId: int) -> Dict[str, BuzzSketch]:
+        categories = self.group(playerId, 1)
+        if categories:
+            overall = BuzzSketch()
+            for sketch in categories.values():
+                overall.merge(sketch)
+            categories['All'] = overall
+        return categories
+
+    def byDifficulty(self, playerId: int) -> Dict[str, BuzzSketch]:
+        return dict(sorted(self.group(playerId, 2).items()))
+
+    def group(self, playerId: int, field: int) -> Dict[str, BuzzSketch]:
+        groups: Dict[str, BuzzSketch] = {}
+        for key, sketch in self.sketches.items():
+            if key[0] == playerId:
+                groups.setdefault(key[field], BuzzSketch()).merge(sketch)
+        return groups
+
+    def merge(self, other: 'BuzzAnalytics') -> None:
+        for key, sketch in other.sketches.items():
+            self.sketches.setdefault(key, BuzzSketch()).merge(sketch)
+
+    def toList(self) -> List[list]:
+        return [[*key, sketch.toDict()] for key, sketch in self.sketches.items()]
+
+    def drain(self) -> List[list]:
+        rows = self.toList()
+        self.sketches = {}
+        return rows
+
+    @classmethod
+    def fromList(cls, rows: Iterable[list]) -> 'BuzzAnalytics':
+        analytics = cls()
+        for playerId, category, difficulty, data in rows:
+            analytics.sketches[(playerId, category, difficulty)] = BuzzSketch.fromDict(data)
+        return analytics
+
+buzzAnalytics = BuzzAnalytics()
+memoryAccountant.register(buzzAnalytics, 'buzzAnalytics', PRIORITY_ACTIVE)
@@ -1,17 +1,42 @@
 import discord
 from discord.ext import commands
-from discord.ui import Select
+from discord.ui import Button, Modal, Select, TextInput
 from discord.ui.view import View
 from util.text import TEXT
 
 from util.utils import create_embed, mainColor
 
+class PacketModal(Modal, title='Play a packet'):
+    setName = TextInput(label='Set name', placeholder='2023 ACF Regionals', max_length=100)
+    packetNumber = TextInput(label='Packet number', placeholder='1', max_length=3)
+
+    def __init__(self, view: 'GameSetupView'):
+        super().__init__()
+        self.view = view
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            number = int(self.packetNumber.value)
+        except ValueError:
+            await interaction.response.send_message(embed=create_embed('Error', TEXT["error"]["packet_number"]), ephemeral=True)
+            return
+        self.view.packet = (self.setName.value.strip(), number)
+        await interaction.response.send_message(embed=create_embed('Game Setup', TEXT["game"]["packet_selected"].format(setName=self.view.packet[0], number=number)), ephemeral=True)
+
 class GameSetupView(View):
-    def __init__(self, ctx: commands.Context):
+    def __init__(self, ctx: commands.Context, autoAdvance: bool=False, packets: bool=False):
         super().__init__(timeout=90.0)
         self.ctx = ctx
         self.categories = []
         self.difficulties = []
+        self.speed = 1.0
+        self.autoAdvanceGap = None
+        self.packet = None
+        if not autoAdvance:
+            # Only tossup games can read questions back to back
+            self.remove_item(self.auto_advance_callback)
+        if not packets:
+            self.remove_item(self.packet_callback)
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         # Check if the interaction user is the same as the command invoker
@@ -49,6 +74,45 @@ class GameSetupView(View):
         self.difficulties = interaction.data.get("values", [])
         await interaction.response.defer()
 
+    @discord.ui.select(
+        placeholder="Select reading speed (default 1x)",
+        options=[
+            discord.SelectOption(label=f'{speed}x', value=speed) for speed in TEXT["speeds"]
+        ],
+        min_values=0,
+        max_values=1,
+        custom_id="speed_select"
+    )
+    async def speed_callback(self, interaction: discord.Interaction, select: Select):
+        # Extract the selected speed from interaction data
+        values = interaction.data.get("values", [])
+        self.speed = float(values[0]) if values else 1.0
+        await interaction.response.defer()
+
+    @discord.ui.select(
+        placeholder="Select auto-advance (default off)",
+        options=[discord.SelectOption(label='Off', value='off')] + [
+            discord.SelectOption(label=f'Next tossup after {gap}s', value=gap) for gap in TEXT["gaps"]
+        ],
+        min_values=0,
+        max_values=1,
+        custom_id="auto_advance_select"
+    )
+    async def auto_advance_callback(self, interaction: discord.Interaction, select: Select):
+        # Extract the selected gap from interaction data
+        values = interaction.data.get("values", [])
+        self.autoAdvanceGap = float(values[0]) if values and values[0] != 'off' else None
+        await interaction.response.defer()
+
+    @discord.ui.button(
+            label="Packet",
+            style=discord.ButtonStyle.blurple,
+            custom_id="packet_button"
+        )
+    async def packet_callback(self, interaction: discord.Interaction, button: Button):
+        # Ask for the set and packet to read instead of random tossups
+        await interaction.response.send_modal(PacketModal(self))
+
     @discord.ui.button(
             label="Done",
             style=discord.ButtonStyle.green,
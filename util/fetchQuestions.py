@@ -1,20 +1,64 @@
 import asyncio
+import json
 from typing import Final
 from dotenv import load_dotenv
+import logging
 import os
 import re
 import requests 
-from google.cloud import texttospeech
+import subprocess
+import threading
+import time
 import urllib.parse
+import util.audioProcessing as ap
+import util.fixtures as fixtures
+import util.metrics as metrics
+import util.tracing as tracing
+from util.ttsService import TTS_DEADLINE, TTS_ENDPOINT, ttsService
+from util.upstream import UpstreamError, policy
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Set the environment variable for Google credentials
 credentials_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-if not credentials_path:
+# Replay serves recorded audio and TTS_ENDPOINT points at a local server, so neither needs credentials
+if fixtures.UPSTREAM_MODE != 'replay' and not TTS_ENDPOINT and not credentials_path:
     raise Exception("Google Application Credentials not set in .env file.")
-client = texttospeech.TextToSpeechClient()
+
+# 'espeak-ng' or 'piper' (which also needs PIPER_MODEL)
+OFFLINE_TTS = os.getenv("OFFLINE_TTS", "espeak-ng")
+offlineSlots = threading.BoundedSemaphore(int(os.getenv("OFFLINE_TTS_WORKERS", "2")))
+# Timeout of a single QBReader request, hedging and retries happen on top of it
+REQUEST_TIMEOUT = float(os.getenv("QBREADER_TIMEOUT", "5"))
+# Directory of packets saved as {set name}/{packet number}.json in the format of the packet-tossups endpoint, read before the API
+PACKET_CORPUS = os.getenv("PACKET_CORPUS", "")
+
+def getJson(endpoint, params):
+    '''
+    Makes a GET request to a QBReader API endpoint under the hedging, retry and circuit breaker policy of that endpoint.
+
+    Args:
+        endpoint (str): The name of the endpoint, such as 'random-tossup'.
+        params (str): The encoded query string.
+
+    Returns:
+        dict: The decoded response.
+
+    Raises:
+        UpstreamError: If every attempt failed or the circuit of the endpoint is open.
+    '''
+
+    def live():
+        response = requests.get(f'https://www.qbreader.org/api/{endpoint}', params=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def request():
+        # Random endpoints may replay a response recorded for other filters, answer checks must match exactly
+        return fixtures.call(endpoint, params, live, anyKey=endpoint.startswith('random-'))
+
+    return policy(endpoint).call(request)
 
 def fetchTossup(difficulties=None, categories=None):
     '''
@@ -26,17 +70,39 @@ def fetchTossup(difficulties=None, categories=None):
 
     Returns:
         tuple: A tuple containing the sanitized question and answer retrieved from the API.
+
+    Raises:
+        UpstreamError: If the API could not be reached.
+    '''
+
+    tossups = fetchTossups(difficulties, categories, 1)
+    if not tossups:
+        raise UpstreamError('random-tossup returned no tossups')
+    return tossups[0]['question'], tossups[0]['answer'], tossups[0]['displayAnswer']
+
+def fetchTossups(difficulties=None, categories=None, number=1):
+    '''
+    Fetches a batch of random questions from the QBReader API in a single request.
+
+    Args:
+        difficulties (list): List of difficulty levels to filter the questions.
+        categories (str): String of categories to filter the questions.
+        number (int): Number of questions to fetch.
+
+    Returns:
+        list: A list of dicts with the question id, category, difficulty, sanitized question, sanitized answer and formatted answer.
+
+    Raises:
+        UpstreamError: If the API could not be reached.
     '''
-    
-    url = 'https://www.qbreader.org/api/random-tossup'
+
     categories = ''.join(char for char in categories if char not in [';', ':', '!', '*', '[', ']', '"', "'"])
     categories = categories.replace(', ', ',')
-    #print(categories, difficulties)
     # Prepare parameters
     params = {
         'difficulties': str(difficulties),
         'categories': str(categories),
-        'number': 1,
+        'number': number,
         'minYear': 2014,
         'maxYear': 2024,
         'powermarkOnly': True,
@@ -45,24 +111,67 @@ def fetchTossup(difficulties=None, categories=None):
 
     # Make the GET request with params dictionary
     encoded_params = urllib.parse.urlencode(params, safe=",")
-    response = requests.get(url, params=encoded_params)
-    
-    try:
-        pattern = r'(\[.*?\]|\(".*?"\))'
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        tossup = data['tossups'][0]
-        return re.sub(pattern, '', tossup['question_sanitized']), tossup['answer_sanitized'], tossup['answer']
-    except requests.exceptions.RequestException as e:
-        print(f"Error: {e}")
-        return None
+
+    data = getJson('random-tossup', encoded_params)
+    return [parseTossup(tossup) for tossup in data['tossups']]
+
+def parseTossup(tossup):
+    pattern = r'(\[.*?\]|\(".*?"\))'
+    return {
+        'id': tossup['_id'],
+        'category': tossup.get('category', ''),
+        'difficulty': str(tossup.get('difficulty', '')),
+        'question': re.sub(pattern, '', tossup['question_sanitized']),
+        'answer': tossup['answer_sanitized'],
+        'displayAnswer': tossup['answer'],
+    }
+
+def fetchPacket(setName, packetNumber):
+    '''
+    Fetches every tossup of a tournament packet in a single request, or from PACKET_CORPUS if the packet is saved there.
+
+    Args:
+        setName (str): The name of the set, e.g. '2023 ACF Regionals'.
+        packetNumber (int): The number of the packet in the set.
+
+    Returns:
+        list: The tossups in reading order, as dicts like the ones returned by fetchTossups.
+
+    Raises:
+        UpstreamError: If the API could not be reached or the packet has no tossups.
+    '''
+
+    corpusPath = os.path.join(PACKET_CORPUS, setName, f'{packetNumber}.json')
+    # The set name comes from players, so it must not point outside the corpus
+    inCorpus = PACKET_CORPUS and os.path.dirname(os.path.normpath(os.path.join(PACKET_CORPUS, setName))) == os.path.normpath(PACKET_CORPUS)
+    if inCorpus and os.path.exists(corpusPath):
+        with open(corpusPath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    else:
+        data = getJson('packet-tossups', urllib.parse.urlencode({'setName': setName, 'packetNumber': packetNumber}))
+
+    tossups = sorted(data.get('tossups', []), key=lambda tossup: tossup.get('number', 0))
+    if not tossups:
+        raise UpstreamError(f'{setName} has no tossups in packet {packetNumber}')
+    return [parseTossup(tossup) for tossup in tossups]
 
 def fetchBonus(difficulties=None, categories=None):
-    url = 'https://www.qbreader.org/api/random-bonus'
+    '''
+    Fetches a random three part bonus from the QBReader API based on specified difficulties and categories.
+
+    Args:
+        difficulties (list): List of difficulty levels to filter the questions.
+        categories (str): String of categories to filter the questions.
+
+    Returns:
+        tuple: The sanitized lead-in, the list of sanitized parts, the list of sanitized answers, the list of formatted answers and the category.
+
+    Raises:
+        UpstreamError: If the API could not be reached.
+    '''
+
     categories = ''.join(char for char in categories if char not in [';', ':', '!', '*', '[', ']', '"', "'"])
     categories = categories.replace(', ', ',')
-    print(categories, difficulties)
     # Prepare parameters
     params = {
         'difficulties': str(difficulties),
@@ -76,62 +185,130 @@ def fetchBonus(difficulties=None, categories=None):
 
     # Make the GET request with params dictionary
     encoded_params = urllib.parse.urlencode(params, safe=",")
-    response = requests.get(url, params=encoded_params)
-    response.raise_for_status()
-    data = response.json()
-    leadIn = data['bonuses'][0]['leadin_sanitized']
-    bonuses = data['bonuses'][0]['parts_sanitized']
-    answers = data['bonuses'][0]['answers']
-    return leadIn, bonuses, answers
+
+    pattern = r'(\[.*?\]|\(".*?"\))'
+    bonuses = getJson('random-bonus', encoded_params)['bonuses']
+    if not bonuses:
+        raise UpstreamError('random-bonus returned no bonuses')
+    bonus = bonuses[0]
+    parts = [re.sub(pattern, '', part) for part in bonus['parts_sanitized']]
+    return bonus['leadin_sanitized'], parts, bonus['answers_sanitized'], bonus['answers'], bonus.get('category', '')
 
 def saveSpeaking(text="", speaking_speed=1.0, textPath='temp/myFile.txt', audioPath='temp/audio.mp3'):
     '''
-    Generates speech from the given text and saves it as an MP3 file. Also writes the text content to a UTF-8 encoded file excluding sentences with quotes.
+    Generates speech from the given text, trims its silence, normalizes its loudness and saves it as an MP3 file. Also writes the text content to a UTF-8 encoded file excluding sentences with quotes.
 
     Args:
         text (str): The text to convert to speech.
         speaking_speed (float): The speed of speech generation.
 
     Returns:
-        str: The filename of the generated audio file.
-    '''
-
-    # Synthesize speech
-    synthesis_input = texttospeech.SynthesisInput(text=text)
-    voice = texttospeech.VoiceSelectionParams(
-        language_code="en-US", ssml_gender=texttospeech.SsmlVoiceGender.MALE
-    )
-    audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.MP3, speaking_rate=speaking_speed
-    )
-    response = client.synthesize_speech(
-        input=synthesis_input, voice=voice, audio_config=audio_config
-    )
-
-    # Write the audio content to a file
-    with open(audioPath, "wb") as audio_file:
-        audio_file.write(response.audio_content)
-    #print(f'Audio content written to file "{audioPath}"')
+        str: The engine that read the text, 'google' or OFFLINE_TTS if Google TTS failed.
+    '''
+
+    start = time.monotonic()
+    engine = 'google'
+    try:
+        with tracing.span('tts.google', characters=len(text)):
+            audio = synthesizeGoogle(text, speaking_speed)
+        metrics.observe('tts.google', time.monotonic() - start)
+        # Write the audio content to a file
+        with open(audioPath, "wb") as audio_file:
+            audio_file.write(audio)
+    except Exception as e:
+        logging.warning(f'Google TTS failed after {time.monotonic() - start:.1f}s, falling back to {OFFLINE_TTS}: {e}')
+        metrics.increment('tts.fallback')
+        engine = OFFLINE_TTS
+        offlineStart = time.monotonic()
+        with tracing.span(f'tts.{OFFLINE_TTS}', characters=len(text)):
+            synthesizeOffline(text, speaking_speed, audioPath)
+        metrics.observe('tts.offline', time.monotonic() - offlineStart)
+    with tracing.span('postProcess'):
+        ap.postProcess(audioPath)
 
     # Write sentences to a text file
     with open(textPath, "w", encoding='utf-8') as output_file:
         output_file.writelines(sentence + "\n"for sentence in text.split())
 
-    return audioPath
+    return engine
+
+def synthesizeGoogle(text="", speaking_speed=1.0):
+    '''
+    Synthesizes speech with Google TTS, giving up once TTS_DEADLINE seconds have passed.
+
+    Args:
+        text (str): The text to convert to speech.
+        speaking_speed (float): The speed of speech generation.
+
+    Returns:
+        bytes: The MP3 audio content.
+    '''
+
+    return fixtures.call('synthesize-speech', fixtures.hashKey(text, speaking_speed), lambda: requestGoogle(text, speaking_speed))
+
+def requestGoogle(text="", speaking_speed=1.0):
+    # The pooled service runs the RPC on its own loop, so concurrent games no longer wait on each other
+    return ttsService.synthesizeBlocking(text, speaking_speed)
+
+def synthesizeOffline(text="", speaking_speed=1.0, audioPath='temp/audio.mp3'):
+    '''
+    Synthesizes speech with a local offline engine and converts it to an MP3 file, so it goes through the same
+    alignment and playback path as Google TTS output. At most OFFLINE_TTS_WORKERS engine processes run at once.
+
+    Args:
+        text (str): The text to convert to speech.
+        speaking_speed (float): The speed of speech generation.
+        audioPath (str): The path of the MP3 file to write.
+    '''
+
+    wavPath = os.path.splitext(audioPath)[0] + '-offline.wav'
+    with offlineSlots:
+        if OFFLINE_TTS == 'piper':
+            subprocess.run(['piper', '--model', os.getenv("PIPER_MODEL", ""), '--output_file', wavPath,
+                            '--length_scale', str(1 / speaking_speed)],
+                           input=text.encode('utf-8'), check=True, capture_output=True, timeout=TTS_DEADLINE * 4)
+        else:
+            subprocess.run(['espeak-ng', '-v', 'en-us', '-s', str(int(175 * speaking_speed)), '-w', wavPath, text],
+                           check=True, capture_output=True, timeout=TTS_DEADLINE * 4)
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-i', wavPath, audioPath],
+                       check=True, capture_output=True, timeout=TTS_DEADLINE * 4)
+    os.remove(wavPath)
+
+def normalizeAnswer(text):
+    return re.sub(r'[^a-z0-9 ]', '', text.lower()).split()
+
+def localCheckAnswer(answer, answerLine):
+    '''
+    Judges an answer without the API, used while the check-answer endpoint is unavailable. Only accepts the main
+    answer (everything before the first bracket) or its last word, such as a surname, and never prompts.
+
+    Args:
+        answer (str): The user's answer to the question.
+        answerLine (str): The sanitized answer line.
+
+    Returns:
+        str: 'accept' or 'reject'.
+    '''
+
+    given = normalizeAnswer(answer)
+    expected = normalizeAnswer(re.split(r'[\[\(]', answerLine)[0])
+    if given and (given == expected or given == expected[-1:]):
+        return 'accept'
+    return 'reject'
 
 async def checkAnswer(answer: str='', answerPath='temp/answer.txt'):
     '''
-    Makes an API requrest to the QBReader API to verify whether or not an answer is correct.
+    Makes an API requrest to the QBReader API to verify whether or not an answer is correct, judging it locally
+    if the API could not be reached.
 
     Args:
         answer (str): The user's answer to the question.
         answerPath (str): The path to the file containing the answer.
 
     Returns:
-        tuple: A tuple containing the sanitized question and answer retrieved from the API.
+        str: The directive of the API ('accept', 'reject' or 'prompt').
     '''
 
-    url = 'https://www.qbreader.org/api/check-answer'
     with open(answerPath, 'r', encoding='utf-8') as answers:
         file = answers.readlines()
         answerLine = file[1].replace('\n', '')
@@ -140,17 +317,12 @@ async def checkAnswer(answer: str='', answerPath='temp/answer.txt'):
         'givenAnswer' : answer
     }
     encoded_params = urllib.parse.urlencode(params, safe=",")
-    response = requests.get(url, params=encoded_params)
-    
+
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        correct = data['directive']
-        # print(correct)
-        return correct
-    
-    except requests.exceptions.RequestException as e:
-        print(f"Error: {e}")
-        return None
-    
+        # The policy may sleep between retries, so keep it off the event loop
+        data = await asyncio.get_running_loop().run_in_executor(None, tracing.bind(getJson), 'check-answer', encoded_params)
+        return data['directive']
+    except UpstreamError as e:
+        logging.warning(f'Judging answer locally: {e}')
+        metrics.increment('checkAnswer.fallback')
+        return localCheckAnswer(answer, file[0].replace('\n', ''))
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 'live' calls upstream, 'record' calls upstream and saves every response, 'replay' serves saved responses only
+UPSTREAM_MODE = os.getenv('UPSTREAM_MODE', 'live')
+FIXTURE_PATH = os.getenv('FIXTURE_PATH', 'fixtures')
+# Replayed responses wait for their recorded latency times this factor, 0 serves them immediately
+REPLAY_LATENCY_SCALE = float(os.getenv('REPLAY_LATENCY_SCALE', '0'))
+
+class FixtureMissingError(Exception):
+    '''Raised in replay mode when the archive holds no response for a request.'''
+
+class FixtureArchive:
+    '''
+    Class representing an archive of recorded upstream responses and their latencies.
+
+    The archive is a directory with an index.jsonl of recordings; binary responses such as synthesized audio are
+    kept as separate files named by their hash. Responses to the same request are replayed in the order they were
+    recorded, cycling once exhausted.
+
+        Attributes:
+            path (str): The directory of the archive.
+            latencyScale (float): Factor applied to recorded latencies on replay.
+
+        Methods:
+            record (kind: str, key: str, latency: float, response): Append a response to the archive.
+            replay (kind: str, key: str, anyKey: bool) -> Any: Serve a recorded response.
+    '''
+
+    def __init__(self, path: str='fixtures', latencyScale: float=0.0):
+        self.path = path
+        self.latencyScale = latencyScale
+        self.recordings: Dict[tuple, List[dict]] = defaultdict(list)
+        self.cursors: Dict[tuple, int] = defaultdict(int)
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def indexPath(self) -> str:
+        return f'{self.path}/index.jsonl'
+
+    def load(self) -> None:
+        if self.loaded:
+            return
+        self.loaded = True
+        if not os.path.exists(self.indexPath()):
+            logging.warning(f'Fixture archive {self.path} is empty, every replayed request will fail')
+            return
+        with open(self.indexPath(), 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                self.recordings[(entry['kind'], entry['key'])].append(entry)
+                self.recordings[(entry['kind'], None)].append(entry)
+
+    def record(self, kind: str, key: str, latency: float, response) -> None:
+        entry = {'kind': kind, 'key': key, 'latency': round(latency, 4)}
+        with self.lock:
+            os.makedirs(f'{self.path}/blobs', exist_ok=True)
+            if isinstance(response, bytes):
+                blob = f'blobs/{hashlib.sha256(response).hexdigest()}'
+                with open(f'{self.path}/{blob}', 'wb') as f:
+                    f.write(response)
+                entry['blob'] = blob
+            else:
+                entry['response'] = response
+            with open(self.indexPath(), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def replay(self, kind: str, key: str, anyKey: bool=False):
+        with self.lock:
+            self.load()
+            recordings = self.recordings.get((kind, key)) or (self.recordings.get((kind, None)) if anyKey else None)
+            if not recordings:
+                raise FixtureMissingError(f'No recorded {kind} response for {key}')
+            cursor = (kind, key if recordings is self.recordings.get((kind, key)) else None)
+            entry = recordings[self.cursors[cursor] % len(recordings)]
+            self.cursors[cursor] += 1
+
+        if self.latencyScale > 0:
+            time.sleep(entry['latency'] * self.latencyScale)
+        if 'blob' in entry:
+            with open(f"{self.path}/{entry['blob']}", 'rb') as f:
+                return f.read()
+        return entry['response']
+
+archive = FixtureArchive(FIXTURE_PATH, REPLAY_LATENCY_SCALE)
+
+def call(kind: str, key: str, fn: Callable, anyKey: bool=False):
+    '''
+    Make an upstream call according to UPSTREAM_MODE.
+
+    Args:
+        kind (str): The kind of call, such as the endpoint name.
+        key (str): What identifies the request within its kind.
+        fn (Callable): Makes the live call and returns a JSON-serializable value or bytes.
+        anyKey (bool): Whether replay may serve a response recorded for another key, for requests whose
+            response is random anyway.
+
+    Returns:
+        The live, or in replay mode recorded, response.
+
+    Raises:
+        FixtureMissingError: In replay mode, if nothing was recorded for the request.
+    '''
+
+    if UPSTREAM_MODE == 'replay':
+        return archive.replay(kind, key, anyKey)
+
+    start = time.monotonic()
+    response = fn()
+    if UPSTREAM_MODE == 'record':
+        archive.record(kind, key, time.monotonic() - start, response)
+    return response
+
+def hashKey(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
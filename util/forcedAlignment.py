@@ -1,4 +1,9 @@
 # coding=utf-8
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
 from aeneas.executetask import ExecuteTask
 from aeneas.task import Task
 from aeneas.language import Language
@@ -6,10 +11,127 @@ from aeneas.syncmap import SyncMapFormat
 from aeneas.task import TaskConfiguration
 from aeneas.textfile import TextFileFormat
 import aeneas.globalconstants as gc
+import util.artifactStore as artifacts
+import util.audioProcessing as ap
 import util.fetchQuestions as mc
+import util.metrics as metrics
+import util.tracing as tracing
 import pandas as pd
 
-async def generateSyncMap(directory_path="temp/", audio_file_path="temp/audio.mp3", text_file_path="temp/myFile.txt", sync_map_file_path="temp/syncmap.json", answer_file_path="temp/answer.txt", question_numbers='', subjects='', reading_speed=1.0, guildId=0, channelId=0):
+# Start reading as soon as the audio exists and align in the background, instead of aligning before playback
+LAZY_ALIGNMENT = os.getenv('LAZY_ALIGNMENT', '1') == '1'
+# Longest a buzz waits for a background alignment before the power decision is made without it
+ALIGNMENT_WAIT = float(os.getenv('ALIGNMENT_WAIT', '2'))
+
+async def generateSyncMap(*args, **kwargs):
+    '''
+    Runs buildSyncMap on an executor thread so synthesis and alignment never block the event loop. Takes the same arguments as buildSyncMap.
+
+    Returns:
+        bool: True if the question was prepared.
+    '''
+
+    loop = asyncio.get_running_loop()
+    submitted = time.monotonic()
+
+    def run():
+        # Time spent waiting for a free executor thread shows up on the span
+        with tracing.span('buildSyncMap', queueSeconds=round(time.monotonic() - submitted, 3)) as span:
+            shared = sharedBundle(kwargs)
+            if shared is not None and artifacts.fetchBundle(*shared):
+                span.setAttribute('shared', True)
+                return True
+            completed = buildSyncMap(*args, **kwargs)
+            if completed and shared is not None:
+                publishShared(kwargs, shared)
+            return completed
+
+    return await loop.run_in_executor(None, tracing.bind(run))
+
+async def generateAudio(*args, **kwargs) -> Optional[asyncio.Future]:
+    '''
+    Runs synthesizeQuestion on an executor thread, then starts aligning the question in the background so it can be
+    played before its sync map exists. Takes the same arguments as buildSyncMap.
+
+    Returns:
+        Future: Resolves to True once the sync map is written, or False if alignment failed. None if the question could not be synthesized.
+    '''
+
+    loop = asyncio.get_running_loop()
+    shared = sharedBundle(kwargs)
+
+    if shared is not None and await loop.run_in_executor(None, tracing.bind(lambda: artifacts.fetchBundle(*shared))):
+        # Another host already synthesized and aligned the question
+        aligned = loop.create_future()
+        aligned.set_result(True)
+        return aligned
+
+    def synthesize():
+        with tracing.span('synthesizeQuestion'):
+            return synthesizeQuestion(*args, **kwargs)
+
+    if not await loop.run_in_executor(None, tracing.bind(synthesize)):
+        return None
+
+    def align():
+        aligned = alignQuestion(*args, **kwargs)
+        if aligned and shared is not None:
+            publishShared(kwargs, shared)
+        return aligned
+
+    return asyncio.ensure_future(loop.run_in_executor(None, tracing.bind(align)))
+
+async def awaitAlignment(alignment: asyncio.Future, timeout: float=ALIGNMENT_WAIT) -> bool:
+    '''
+    Wait a bounded time for a background alignment, e.g. when a player buzzes before it finished.
+
+    Args:
+        alignment (Future): A future returned by generateAudio.
+        timeout (float): The longest to wait in seconds.
+
+    Returns:
+        bool: True if the sync map is ready, False if alignment failed or did not finish in time.
+    '''
+
+    if alignment.done():
+        return alignment.result()
+    start = time.monotonic()
+    try:
+        # Shielded so a timed out buzz does not cancel the alignment for later ones
+        aligned = await asyncio.wait_for(asyncio.shield(alignment), timeout)
+        metrics.observe('alignment.wait', time.monotonic() - start)
+        return aligned
+    except asyncio.TimeoutError:
+        metrics.increment('alignment.timeouts')
+        logging.warning(f'Alignment did not finish within {timeout:g}s of a buzz, deciding without the sync map')
+        return False
+
+def sharedBundle(kwargs: dict) -> Optional[tuple]:
+    '''
+    Returns the arguments of artifacts.fetchBundle and publishBundle for a question prepared with the given arguments
+    of buildSyncMap, or None if it cannot be shared.
+    '''
+
+    tossup = kwargs.get('tossup')
+    if artifacts.artifactStore is None or tossup is None:
+        return None
+    audio = kwargs['audio_file_path']
+    # The metadata goes last, it marks the bundle as complete
+    files = [kwargs['text_file_path'], kwargs['answer_file_path'], audio, kwargs['sync_map_file_path'], ap.metaPath(audio)]
+    return tossup['id'], kwargs['directory_path'], files
+
+def publishShared(kwargs: dict, shared: tuple) -> None:
+    '''
+    Publish a question prepared with the given arguments of buildSyncMap, unless Google TTS did not read it.
+    '''
+
+    # Offline fallback audio stays on this host, other hosts synthesize the question with Google themselves
+    if ap.readMeta(kwargs['directory_path'] + kwargs['audio_file_path']).get('engine') != 'google':
+        metrics.increment('artifacts.notShared')
+        return
+    artifacts.publishBundle(*shared)
+
+def buildSyncMap(directory_path="temp/", audio_file_path="temp/audio.mp3", text_file_path="temp/myFile.txt", sync_map_file_path="temp/syncmap.json", answer_file_path="temp/answer.txt", question_numbers='', subjects='', reading_speed=1.0, guildId=0, channelId=0, tossup=None):
     '''
     Generates a synchronized map file for the provided audio and text files, based on fetched question content and reading speed.
 
@@ -20,15 +142,47 @@ async def generateSyncMap(directory_path="temp/", audio_file_path="temp/audio.mp
         question_numbers (str): Comma-separated question numbers to fetch.
         subjects (str): Comma-separated subjects to fetch questions from.
         reading_speed (float): The speed at which the text is read.
+        tossup (dict): An already fetched tossup to use instead of fetching one.
+
+    Returns:
+        bool: True if the question was synthesized and aligned.
+    '''
+
+    return synthesizeQuestion(directory_path, audio_file_path, text_file_path, sync_map_file_path, answer_file_path, question_numbers, subjects, reading_speed, guildId, channelId, tossup) \
+        and alignQuestion(directory_path, audio_file_path, text_file_path, sync_map_file_path)
+
+def synthesizeQuestion(directory_path="temp/", audio_file_path="temp/audio.mp3", text_file_path="temp/myFile.txt", sync_map_file_path="temp/syncmap.json", answer_file_path="temp/answer.txt", question_numbers='', subjects='', reading_speed=1.0, guildId=0, channelId=0, tossup=None):
+    '''
+    Writes the audio, text and answer files of a question. Takes the same arguments as buildSyncMap.
 
     Returns:
-        None
+        bool: True if the question was synthesized.
     '''
     try:
         # Fetch and save the audio file
-        tossup, answer, displayAnswer = mc.fetchTossup(question_numbers, subjects)
-        mc.saveSpeaking(tossup, reading_speed, directory_path + text_file_path, directory_path + audio_file_path)
-        
+        if tossup is None:
+            tossup, answer, displayAnswer = mc.fetchTossup(question_numbers, subjects)
+        else:
+            tossup, answer, displayAnswer = tossup['question'], tossup['answer'], tossup['displayAnswer']
+        engine = mc.saveSpeaking(tossup, reading_speed, directory_path + text_file_path, directory_path + audio_file_path)
+        ap.writeMeta(directory_path + audio_file_path, engine)
+
+        with open(f"{directory_path}{answer_file_path}", "w", encoding="utf-8") as answerFile:
+            answerFile.write(answer + '\n')
+            answerFile.write(displayAnswer)
+            return True
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        return False
+
+def alignQuestion(directory_path="temp/", audio_file_path="temp/audio.mp3", text_file_path="temp/myFile.txt", sync_map_file_path="temp/syncmap.json", *args, **kwargs):
+    '''
+    Aligns the text of a synthesized question against its audio and writes the sync map. Takes the same arguments as buildSyncMap.
+
+    Returns:
+        bool: True if the sync map was written.
+    '''
+    try:
         # Configure task
         config = TaskConfiguration()
         config[gc.PPN_TASK_LANGUAGE] = Language.ENG
@@ -43,15 +197,12 @@ async def generateSyncMap(directory_path="temp/", audio_file_path="temp/audio.mp
         task.sync_map_file_path_absolute = directory_path + sync_map_file_path
 
         # Process task
-        ExecuteTask(task).execute()
+        with tracing.span('alignment'):
+            ExecuteTask(task).execute()
 
-        # Print produced sync map
+        # Aligned against the post-processed audio, so the sync map already accounts for the trimmed silence
         task.output_sync_map_file()
-
-        with open(f"{directory_path}{answer_file_path}", "w", encoding="utf-8") as answerFile:
-            answerFile.write(answer + '\n')
-            answerFile.write(displayAnswer)
-            return True
+        return True
     except Exception as e:
         print(f"Error occurred: {e}")
-        return False
\ No newline at end of file
+        return False
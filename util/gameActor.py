@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+import util.metrics as metrics
+
+class GameActor:
+    '''
+    Class representing the single task that drives a game.
+
+    Everything that changes the state of the game, from chat messages, commands, timers and the voice player
+    thread, is posted as an event to the actor's queue. The actor handles one event at a time in the order they
+    were posted, so handlers never interleave and need no locks. Handlers are looked up by event kind in a dict.
+    The task exits after idleTimeout seconds without events and the next event starts it again, so games that
+    were abandoned without !end do not keep a task alive.
+
+        Attributes:
+            name (str): The name of the game, used in logs.
+            handlers (Dict[str, Callable]): The coroutine function handling each kind of event.
+
+        Methods:
+            post (kind: str, *args): Queue an event without waiting for it.
+            postThreadsafe (kind: str, *args): Queue an event from another thread, e.g. the voice player thread.
+            submit (kind: str, *args) -> Any: Queue an event and wait for the result of its handler.
+    '''
+
+    def __init__(self, name: str, handlers: Dict[str, Callable[..., Awaitable]], idleTimeout: float=60.0):
+        self.name = name
+        self.handlers = handlers
+        self.idleTimeout = idleTimeout
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def post(self, kind: str, *args, future: Optional[asyncio.Future]=None) -> None:
+        if kind not in self.handlers:
+            raise KeyError(f'No handler for {kind} events')
+        if self.task is None or self.task.done():
+            self.loop = asyncio.get_running_loop()
+            self.task = self.loop.create_task(self.run(), name=f'game-{self.name}')
+        self.queue.put_nowait((kind, args, future, time.monotonic()))
+
+    def postThreadsafe(self, kind: str, *args) -> None:
+        if self.loop is None:
+            logging.warning(f'Dropped {kind} event of game {self.name}, its actor has not started')
+            return
+        self.loop.call_soon_threadsafe(self.post, kind, *args)
+
+    async def submit(self, kind: str, *args):
+        if self.task is not None and asyncio.current_task() is self.task:
+            # A handler waiting on an event queued behind itself would never finish, so run it in place
+            return await self.handlers[kind](*args)
+        future = asyncio.get_running_loop().create_future()
+        self.post(kind, *args, future=future)
+        return await future
+
+    async def run(self) -> None:
+        while True:
+            try:
+                kind, args, future, posted = await asyncio.wait_for(self.queue.get(), self.idleTimeout)
+            except asyncio.TimeoutError:
+                # An event may have been posted between the timeout and now, while the task still looked alive
+                if self.queue.empty():
+                    return
+                continue
+            if future is not None and future.cancelled():
+                # Whoever submitted the event no longer wants it handled
+                continue
+            metrics.observe('actor.queueDelay', time.monotonic() - posted)
+            try:
+                result = await self.handlers[kind](*args)
+            except Exception as e:
+                logging.error(f'Error while handling {kind} event of game {self.name}: {e}')
+                if future is not None and not future.done():
+                    future.set_exception(e)
+                continue
+            if future is not None and not future.done():
+                future.set_result(result)
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import os
+import sys
+import weakref
+from collections import deque
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Components are evicted from the lowest priority up, PRIORITY_ACTIVE components are never evicted
+PRIORITY_PREFETCH = 0 # prefetched questions nobody is waiting on yet
+PRIORITY_CACHE = 1 # prepared data that can be rebuilt on demand
+PRIORITY_ACTIVE = 2 # in-progress games and statistics
+
+PRIORITY_NAMES = {PRIORITY_PREFETCH: 'prefetch', PRIORITY_CACHE: 'cache', PRIORITY_ACTIVE: 'active'}
+
+def sizeOf(*objects) -> int:
+    '''
+    Approximates the memory used by some objects, including the items of lists, dicts and other containers at any
+    depth, so byte payloads such as encoded audio frames nested in them are counted in full. Each object is counted
+    once however often it is referenced. Other objects are counted without what they reference.
+    '''
+
+    total = 0
+    seen = set()
+    stack = list(objects)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+    return total
+
+def processRss() -> Optional[int]:
+    '''
+    Returns the resident set size of the process in bytes, or None where /proc is not available.
+    '''
+
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+class MemoryAccountant:
+    '''
+    Class representing the process-wide memory accountant.
+
+    Caches and games register with it and report their approximate footprint through memoryFootprint(). When the
+    total goes over the budget, components are asked to shrink through evictMemory(), lowest priority first and the
+    largest first within a priority, until the total is back under the budget. Components are held by weak
+    reference, so a finished game drops out of the accounting on its own.
+
+        Attributes:
+            budgetBytes (int): The memory budget of all registered components.
+            checkInterval (float): Seconds between budget checks.
+
+        Methods:
+            register (component, name: str, priority: int): Start accounting a component.
+            unregister (name: str): Stop accounting a component.
+            report () -> List[Tuple[str, int, int]]: The name, priority and footprint of every component.
+            enforce () -> int: Evict until the total is under the budget, returning the bytes freed.
+    '''
+
+    def __init__(self, budgetBytes: int, checkInterval: float=10.0):
+        self.budgetBytes = budgetBytes
+        self.checkInterval = checkInterval
+        self.components = {}
+        self.monitorTask: Optional[asyncio.Task] = None
+
+    def register(self, component, name: str, priority: int) -> None:
+        '''
+        Start accounting a component.
+
+        Parameters:
+            component: An object with memoryFootprint() -> int and, unless it is PRIORITY_ACTIVE, evictMemory() -> None.
+            name (str): A unique name of the component, shown by !memory.
+            priority (int): PRIORITY_PREFETCH, PRIORITY_CACHE or PRIORITY_ACTIVE.
+        '''
+
+        self.components[name] = (weakref.ref(component), priority)
+        try:
+            if self.monitorTask is None or self.monitorTask.done():
+                self.monitorTask = asyncio.get_running_loop().create_task(self.monitor())
+        except RuntimeError:
+            # Registered outside the event loop (at import time), the first registration inside it starts the monitor
+            pass
+
+    def unregister(self, name: str) -> None:
+        self.components.pop(name, None)
+
+    def live(self) -> List[Tuple[str, object, int]]:
+        alive = []
+        for name, (ref, priority) in list(self.components.items()):
+            component = ref()
+            if component is None:
+                self.components.pop(name, None)
+            else:
+                alive.append((name, component, priority))
+        return alive
+
+    def footprint(self, component) -> int:
+        try:
+            return component.memoryFootprint()
+        except Exception as e:
+            logging.error(f'Failed to measure {type(component).__name__}: {e}')
+            return 0
+
+    def report(self) -> List[Tuple[str, int, int]]:
+        return sorted(((name, priority, self.footprint(component)) for name, component, priority in self.live()),
+                      key=lambda row: row[2], reverse=True)
+
+    def enforce(self) -> int:
+        components = [(name, component, priority, self.footprint(component)) for name, component, priority in self.live()]
+        total = sum(size for *_, size in components)
+        if total <= self.budgetBytes:
+            return 0
+
+        freed = 0
+        candidates = sorted((c for c in components if c[2] < PRIORITY_ACTIVE), key=lambda c: (c[2], -c[3]))
+        for name, component, priority, size in candidates:
+            if total - freed <= self.budgetBytes:
+                break
+            try:
+                component.evictMemory()
+            except Exception as e:
+                logging.error(f'Failed to evict {name}: {e}')
+                continue
+            released = size - self.footprint(component)
+            freed += released
+            logging.warning(f'Memory budget exceeded, evicted {name} ({PRIORITY_NAMES[priority]}) freeing {released} bytes')
+        return freed
+
+    async def monitor(self) -> None:
+        while self.components:
+            await asyncio.sleep(self.checkInterval)
+            self.enforce()
+
+memoryAccountant = MemoryAccountant(int(float(os.getenv('MEMORY_BUDGET_MB', '512')) * 1024 * 1024))
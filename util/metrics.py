@@ -0,0 +1,74 @@
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+class LatencyStats:
+    '''
+    Class representing the recent latencies of one operation, kept in a fixed-size window of samples.
+
+        Attributes:
+            count (int): Number of samples ever observed.
+            samples (deque): The most recent samples in seconds.
+
+        Methods:
+            observe (seconds: float): Record a sample.
+            percentile (q: float) -> float: Estimate a percentile of the recent samples.
+    '''
+
+    def __init__(self, window: int=512):
+        self.count = 0
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self.lock:
+            self.count += 1
+            self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self.lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+counters: Dict[str, int] = {}
+latencies: Dict[str, LatencyStats] = {}
+countersLock = threading.Lock()
+
+def increment(name: str, amount: int=1) -> None:
+    '''
+    Increment a counter. Safe to call from executor threads.
+    '''
+
+    with countersLock:
+        counters[name] = counters.get(name, 0) + amount
+
+def latency(name: str) -> LatencyStats:
+    '''
+    Get the latency stats of an operation, creating them on first use.
+    '''
+
+    with countersLock:
+        if name not in latencies:
+            latencies[name] = LatencyStats()
+        return latencies[name]
+
+def observe(name: str, seconds: float) -> None:
+    '''
+    Record a latency sample of an operation. Safe to call from executor threads.
+    '''
+
+    latency(name).observe(seconds)
+
+def report() -> str:
+    '''
+    Returns the counters and latency percentiles as lines of text.
+    '''
+
+    lines = [f'{name}: {value}' for name, value in sorted(counters.items())]
+    for name, stats in sorted(latencies.items()):
+        p50, p95, p99 = stats.percentile(0.5), stats.percentile(0.95), stats.percentile(0.99)
+        if p50 is not None:
+            lines.append(f'{name}: n={stats.count} p50={p50 * 1000:.0f}ms p95={p95 * 1000:.0f}ms p99={p99 * 1000:.0f}ms')
+    return '\n'.join(lines)
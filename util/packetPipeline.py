@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import List, Optional
+import util.forcedAlignment as fa
+import util.metrics as metrics
+from util.memoryBudget import sizeOf
+from util.warmPool import BUNDLE_FILES
+
+# Questions of a packet prepared at the same time once the first one is ready
+PACKET_WORKERS = int(os.getenv('PACKET_WORKERS', '3'))
+# Seconds a game event waits for a question still being prepared before giving up, so the game is never stuck behind it
+PACKET_WAIT = float(os.getenv('PACKET_WAIT', '2'))
+
+class PacketPipeline:
+    '''
+    Class representing the batch preparation of every tossup of a tournament packet.
+
+    The first tossup is prepared on its own so the game can start as soon as possible. The rest are then
+    synthesized and aligned by several workers in parallel, each taking the next question in reading order,
+    so questions finish roughly in the order they are read. Every question becomes a bundle directory like the
+    ones of the warm pool.
+
+        Attributes:
+            name (str): The name of the set.
+            number (int): The number of the packet.
+            tossups (List[dict]): The tossups of the packet in reading order.
+            workers (int): Questions prepared in parallel.
+
+        Methods:
+            start (): Start preparing the packet.
+            ready (index: int) -> bool: Whether the bundle of a question is prepared.
+            waitReady (index: int): Wait until the first question from index on that could be prepared is ready.
+            take (index: int, timeout: float) -> dict: Wait for the bundle of a question, or None if it could not be prepared.
+            progress () -> tuple: The prepared and total question counts and the estimated seconds left.
+            cancel (): Stop preparing and delete the prepared bundles.
+    '''
+
+    def __init__(self, name: str, number: int, tossups: List[dict], directory: str, workers: int=PACKET_WORKERS):
+        self.name = name
+        self.number = number
+        self.tossups = tossups
+        self.directory = directory
+        self.workers = workers
+        self.bundles: List[asyncio.Future] = []
+        self.nextIndex = 0
+        self.completed = 0
+        self.started: Optional[float] = None
+        self.tasks: List[asyncio.Task] = []
+        self.cancelled = False
+
+    def memoryFootprint(self) -> int:
+        return sizeOf(self.tossups)
+
+    def __len__(self) -> int:
+        return len(self.tossups)
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.bundles = [loop.create_future() for _ in self.tossups]
+        self.started = time.monotonic()
+        self.tasks = [asyncio.create_task(self.run())]
+
+    async def run(self) -> None:
+        await self.work()
+        # The other workers only start once the first question is ready, so they do not slow it down
+        self.tasks += [asyncio.create_task(self.work()) for _ in range(max(1, self.workers))]
+
+    async def work(self) -> None:
+        while self.nextIndex < len(self.tossups):
+            index = self.nextIndex
+            self.nextIndex += 1
+            try:
+                bundle = await self.prepare(index)
+            except Exception as e:
+                logging.error(f'Error while preparing tossup {index + 1} of {self.name} packet {self.number}: {e}')
+                bundle = None
+            self.completed += 1
+            if not self.bundles[index].done():
+                self.bundles[index].set_result(bundle)
+            if index == 0:
+                return
+
+    async def prepare(self, index: int) -> Optional[dict]:
+        tossup = self.tossups[index]
+        directory = f'{self.directory}/{index + 1}'
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        start = time.monotonic()
+        if not await fa.generateSyncMap(directory_path=directory, audio_file_path=BUNDLE_FILES['audio'],
+                                        text_file_path=BUNDLE_FILES['text'],
+                                        sync_map_file_path=BUNDLE_FILES['syncMap'],
+                                        answer_file_path=BUNDLE_FILES['answer'], reading_speed=1.0, tossup=tossup):
+            shutil.rmtree(directory, ignore_errors=True)
+            return None
+        metrics.observe('packet.prepare', time.monotonic() - start)
+        return {'id': tossup['id'], 'category': tossup['category'], 'difficulty': tossup['difficulty'], 'directory': directory}
+
+    def ready(self, index: int) -> bool:
+        return self.bundles[index].done()
+
+    async def waitReady(self, index: int) -> None:
+        while index < len(self.bundles):
+            if await asyncio.shield(self.bundles[index]) is not None:
+                return
+            index += 1
+
+    async def take(self, index: int, timeout: Optional[float]=None) -> Optional[dict]:
+        '''
+        Wait for the bundle of a question.
+
+        Parameters:
+            index (int): The index of the question in reading order.
+            timeout (float): Seconds to wait, or None to wait until it is prepared.
+
+        Returns:
+            dict: The bundle, or None if the question could not be prepared.
+
+        Raises:
+            asyncio.TimeoutError: If the question was still being prepared after timeout seconds.
+        '''
+
+        # Giving up must not cancel the bundle, which the next attempt takes
+        return await asyncio.wait_for(asyncio.shield(self.bundles[index]), timeout)
+
+    def progress(self) -> tuple:
+        '''
+        Estimate how far preparation is, from the rate questions have been finishing at so far.
+
+        Returns:
+            tuple: The number of prepared questions, the number of questions and the estimated seconds left, or None before the first question is ready.
+        '''
+
+        remaining = len(self.tossups) - self.completed
+        if self.completed == 0 or self.started is None:
+            return self.completed, len(self.tossups), None
+        rate = self.completed / (time.monotonic() - self.started)
+        return self.completed, len(self.tossups), remaining / rate
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        for task in self.tasks:
+            task.cancel()
+        for bundle in self.bundles:
+            if not bundle.done():
+                bundle.set_result(None)
+        shutil.rmtree(self.directory, ignore_errors=True)
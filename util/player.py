@@ -10,14 +10,19 @@ class Player:
         tens (int): Number of tens scored by the player.
         powers (int): Number of powers scored by the player.
         negs (int): Number of negs received by the player.
+        bonusParts (int): Number of bonus parts answered correctly by the player.
 
     Methods:
         addTen(): Increment the number of tens scored by the player.
         addPower(): Increment the number of powers scored by the player.
         addNeg(): Increment the number of negs received by the player.
+        addBonusPart(): Increment the number of bonus parts answered correctly by the player.
         calcTotal() -> int: Calculate the total score of the player based on tens, powers, and negs.
     '''
 
+    # Slots keep each record small when a game has hundreds of players
+    __slots__ = ('name', 'id', 'tens', 'powers', 'negs', 'bonusParts')
+
     def __init__(self, player: Context.author):
         
         self.name = player.display_name
@@ -26,6 +31,7 @@ class Player:
         self.tens = 0
         self.powers = 0
         self.negs = 0
+        self.bonusParts = 0
 
     def addTen(self):
         self.tens += 1
@@ -36,8 +42,21 @@ class Player:
     def addNeg(self):
         self.negs += 1
 
+    def addBonusPart(self):
+        self.bonusParts += 1
+
     def calcTotal(self):
-        return self.tens * 10 + self.powers * 15 - self.negs * 5
+        return self.tens * 10 + self.powers * 15 - self.negs * 5 + self.bonusParts * 10
+
+    def toDict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    @classmethod
+    def fromDict(cls, data: dict) -> 'Player':
+        player = cls.__new__(cls)
+        for field in cls.__slots__:
+            setattr(player, field, data[field])
+        return player
 
     def toString(self):
-        return f'Tens: {self.tens} | Powers: {self.powers} | Negs: {self.negs}'
\ No newline at end of file
+        return f'Tens: {self.tens} | Powers: {self.powers} | Negs: {self.negs} | Bonus parts: {self.bonusParts}'
\ No newline at end of file
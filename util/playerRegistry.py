@@ -0,0 +1,118 @@
+from bisect import bisect_left, insort
+from typing import Dict, Iterator, List, Optional, Tuple
+import discord
+from discord.ext.commands import Context
+from util.player import Player
+
+# Lines per scoreboard page, well under the 4096 characters of an embed description
+SCOREBOARD_PAGE_SIZE = 25
+
+class PlayerRegistry:
+    '''
+    Class representing the players of a game, indexed by ID and kept ranked by total score.
+
+    The ranking is a sorted list of (-total, join order, id) keys. Recording a result moves only the key of that
+    player, so top-K, rank lookups and scoreboard pages never sort the whole game, and ties keep the player
+    who joined first ahead.
+
+        Methods:
+            add (author: Context.author) -> bool: Add a player, False if they already joined.
+            get (playerId: int) -> Player: The player with an ID, or None.
+            record (playerId: int, *results: str) -> Player: Apply results such as 'ten' or 'neg' to a player and rerank them.
+            top (k: int) -> List[Player]: The k highest scoring players.
+            rank (playerId: int) -> int: The 1-based rank of a player, or None.
+            page (number: int, size: int) -> Tuple[str, int, int]: One page of the scoreboard.
+    '''
+
+    RESULTS = {
+        'ten': Player.addTen,
+        'power': Player.addPower,
+        'neg': Player.addNeg,
+        'bonus': Player.addBonusPart,
+    }
+
+    def __init__(self):
+        self.byId: Dict[int, Player] = {}
+        self.keys: Dict[int, tuple] = {}
+        self.ranking: List[tuple] = []
+        self.joined = 0
+
+    def __len__(self) -> int:
+        return len(self.byId)
+
+    def __iter__(self) -> Iterator[Player]:
+        return iter(self.byId.values())
+
+    def __contains__(self, playerId: int) -> bool:
+        return playerId in self.byId
+
+    def get(self, playerId: int) -> Optional[Player]:
+        return self.byId.get(playerId)
+
+    def add(self, author: Context.author) -> bool:
+        if author.id in self.byId:
+            return False
+        self.insert(Player(author))
+        return True
+
+    def insert(self, player: Player) -> None:
+        self.byId[player.id] = player
+        key = (-player.calcTotal(), self.joined, player.id)
+        self.joined += 1
+        self.keys[player.id] = key
+        insort(self.ranking, key)
+
+    def record(self, playerId: int, *results: str) -> Optional[Player]:
+        player = self.byId.get(playerId)
+        if player is None:
+            return None
+        for result in results:
+            self.RESULTS[result](player)
+
+        oldKey = self.keys[playerId]
+        newKey = (-player.calcTotal(), oldKey[1], playerId)
+        if newKey != oldKey:
+            del self.ranking[bisect_left(self.ranking, oldKey)]
+            insort(self.ranking, newKey)
+            self.keys[playerId] = newKey
+        return player
+
+    def top(self, k: int) -> List[Player]:
+        return [self.byId[key[2]] for key in self.ranking[:k]]
+
+    def rank(self, playerId: int) -> Optional[int]:
+        key = self.keys.get(playerId)
+        if key is None:
+            return None
+        return bisect_left(self.ranking, key) + 1
+
+    def page(self, number: int=1, size: int=SCOREBOARD_PAGE_SIZE) -> Tuple[str, int, int]:
+        '''
+        Render one page of the scoreboard.
+
+        Parameters:
+            number (int): The 1-based page, clamped to the pages there are.
+            size (int): Players per page.
+
+        Returns:
+            tuple: The "rank. name | points" lines of the page, the page rendered and the number of pages.
+        '''
+
+        pages = max(1, -(-len(self.ranking) // size))
+        number = min(max(1, number), pages)
+        start = (number - 1) * size
+        lines = []
+        for position, key in enumerate(self.ranking[start:start + size], start + 1):
+            player = self.byId[key[2]]
+            lines.append(f'{position}. {discord.utils.escape_markdown(player.name)} | {-key[0]}')
+        return '\n'.join(lines), number, pages
+
+    def toList(self) -> List[dict]:
+        return [player.toDict() for player in self.byId.values()]
+
+    @classmethod
+    def fromList(cls, players: List[dict]) -> 'PlayerRegistry':
+        registry = cls()
+        for data in players:
+            registry.insert(Player.fromDict(data))
+        return registry
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import Optional
+import util.metrics as metrics
+
+# Event loop stalls longer than this are logged with the stack of the blocking callback
+STALL_THRESHOLD = float(os.getenv('LOOP_STALL_THRESHOLD', '0.25'))
+# Stalls are counted against the innermost frame of the bot's own code
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def frameName(frame) -> str:
+    return f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}'
+
+def collapseStack(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(frameName(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+def sampleStacks(seconds: float, interval: float=0.005) -> str:
+    '''
+    Samples the stacks of every thread for a time window. Stacks are returned in the folded format read by
+    flamegraph.pl and speedscope, one "thread;outer;...;inner count" line per distinct stack.
+
+    Only the sampling thread does any work, so the profiled code runs at full speed between samples.
+
+    Args:
+        seconds (float): Length of the window.
+        interval (float): Seconds between samples.
+
+    Returns:
+        str: The folded stacks, most frequent first.
+    '''
+
+    stacks = Counter()
+    names = {}
+    current = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread in threading.enumerate():
+            names[thread.ident] = thread.name
+        for ident, frame in sys._current_frames().items():
+            if ident != current:
+                stacks[f'{names.get(ident, ident)};{collapseStack(frame)}'] += 1
+        time.sleep(interval)
+    return '\n'.join(f'{stack} {count}' for stack, count in stacks.most_common())
+
+def blamedFrame(stack: traceback.StackSummary) -> traceback.FrameSummary:
+    '''
+    Picks the frame a stall is counted against. The innermost frame is usually a socket, ssl or selectors call of
+    the standard library, so the innermost frame of the bot's own code is used, or failing that the callback the
+    loop was running, just under asyncio's Handle._run.
+    '''
+
+    # Frames outside the running callback, such as main.py starting the loop, never block it themselves
+    start = 0
+    for i, entry in enumerate(stack[:-1]):
+        if entry.name == '_run' and entry.filename.endswith(os.path.join('asyncio', 'events.py')):
+            start = i + 1
+    for entry in reversed(stack[start:]):
+        path = os.path.abspath(entry.filename)
+        if path.startswith(REPO_ROOT + os.sep) and 'site-packages' not in path:
+            return entry
+    return stack[start] if start else stack[-1]
+
+class LoopWatchdog:
+    '''
+    Class representing an always-on detector of event loop stalls.
+
+    A coroutine on the loop records a heartbeat every interval and a watchdog thread checks it. When the loop
+    has not beaten for longer than the threshold, the stack the loop thread is executing is logged once for that
+    stall and counted by the call site in the bot's own code, so the worst blockers can be listed at any time.
+
+        Attributes:
+            threshold (float): Seconds without a heartbeat that count as a stall.
+            callsites (Counter): Number of stalls by the call site they were detected in.
+
+        Methods:
+            start (loop: AbstractEventLoop): Start watching a loop. Calling it again does nothing.
+            report (limit: int) -> str: The call sites that stalled the loop most often.
+    '''
+
+    def __init__(self, threshold: float=0.25, interval: float=0.05):
+        self.threshold = threshold
+        self.interval = interval
+        self.callsites = Counter()
+        self.lastBeat = time.monotonic()
+        self.loopThread: Optional[int] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self.thread is not None:
+            return
+        self.loopThread = threading.get_ident()
+        loop.create_task(self.heartbeat())
+        self.thread = threading.Thread(target=self.watch, name='loop-watchdog', daemon=True)
+        self.thread.start()
+
+    async def heartbeat(self) -> None:
+        while True:
+            self.lastBeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def watch(self) -> None:
+        reportedBeat = None
+        while True:
+            time.sleep(self.interval)
+            beat = self.lastBeat
+            stalled = time.monotonic() - beat
+            if stalled < self.threshold or beat == reportedBeat:
+                continue
+            # Report each stall once, while the loop thread is still inside the blocking call
+            reportedBeat = beat
+            frame = sys._current_frames().get(self.loopThread)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            blamed = blamedFrame(stack)
+            callsite = f'{os.path.basename(blamed.filename)}:{blamed.lineno} {blamed.name}'
+            self.callsites[callsite] += 1
+            metrics.increment('loop.stalls')
+            logging.warning(f'Event loop blocked for over {stalled:.2f}s at {callsite}:\n{"".join(traceback.format_list(stack))}')
+
+    def report(self, limit: int=15) -> str:
+        return '\n'.join(f'{count} | {callsite}' for callsite, count in self.callsites.most_common(limit))
+
+watchdog = LoopWatchdog(STALL_THRESHOLD)
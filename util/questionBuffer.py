@@ -0,0 +1,157 @@
+import asyncio
+import base64
+import hashlib
+import logging
+import math
+from collections import deque
+from typing import Dict, Optional
+import util.fetchQuestions as fq
+import util.tracing as tracing
+from util.upstream import UpstreamError
+from util.memoryBudget import memoryAccountant, sizeOf, PRIORITY_PREFETCH
+
+class BloomFilter:
+    '''
+    Class representing a fixed-size Bloom filter of question IDs.
+
+    Memory stays constant no matter how many questions are added, at the cost of a small chance of
+    reporting a question as heard when it was not (which only means that question is skipped).
+
+        Attributes:
+            size (int): Number of bits in the filter.
+            hashes (int): Number of bit positions set per item.
+
+        Methods:
+            add (item: str): Add an item to the filter.
+            __contains__ (item: str) -> bool: Check if an item may have been added.
+    '''
+
+    def __init__(self, capacity: int=2000, errorRate: float=0.01):
+        self.size = max(8, int(-capacity * math.log(errorRate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, item: str):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self.positions(item):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self.positions(item))
+
+    def toDict(self) -> dict:
+        return {'size': self.size, 'hashes': self.hashes, 'bits': base64.b64encode(bytes(self.bits)).decode('ascii')}
+
+    @classmethod
+    def fromDict(cls, data: dict) -> 'BloomFilter':
+        bloom = cls.__new__(cls)
+        bloom.size = data['size']
+        bloom.hashes = data['hashes']
+        bloom.bits = bytearray(base64.b64decode(data['bits']))
+        return bloom
+
+class QuestionBuffer:
+    '''
+    Class representing a buffer of fetched tossups for one category/difficulty filter.
+
+    Tossups are fetched in batches with a single API request, handed out one at a time, and the buffer is
+    refilled in the background once it drops below the low-water mark. Every channel with the same filter shares
+    the buffer, so a tossup a channel has already heard is skipped but left for the others. The oldest tossups are
+    dropped once the buffer holds maxSize.
+
+        Attributes:
+            difficulties (str): Difficulty filter of the buffered tossups.
+            categories (str): Category filter of the buffered tossups.
+            batchSize (int): Number of tossups fetched per request.
+            lowWater (int): Buffer size below which a background refill starts.
+            maxSize (int): Most tossups kept in the buffer.
+
+        Methods:
+            get (heard: BloomFilter) -> dict: Take the next tossup the channel has not heard yet.
+    '''
+
+    MAX_REFILLS = 3
+
+    def __init__(self, difficulties: str, categories: str, batchSize: int=20, lowWater: int=5, maxSize: int=100):
+        self.difficulties = difficulties
+        self.categories = categories
+        self.batchSize = batchSize
+        self.lowWater = lowWater
+        self.tossups = deque(maxlen=maxSize)
+        self.refillTask: Optional[asyncio.Task] = None
+
+    def memoryFootprint(self) -> int:
+        return sizeOf(self.tossups) + sum(sizeOf(tossup) for tossup in self.tossups)
+
+    def evictMemory(self) -> None:
+        # Buffered tossups are only prefetches, the next get refetches them
+        self.tossups.clear()
+
+    async def fetch(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            tossups = await loop.run_in_executor(None, tracing.bind(fq.fetchTossups), self.difficulties, self.categories, self.batchSize)
+        except UpstreamError as e:
+            # Whatever is still buffered keeps games going until the API is back
+            logging.warning(f'Failed to refill question buffer for {self.categories} {self.difficulties}: {e}')
+            return
+        self.tossups.extend(tossups)
+
+    def refill(self) -> asyncio.Task:
+        if self.refillTask is None or self.refillTask.done():
+            self.refillTask = asyncio.create_task(self.fetch())
+        return self.refillTask
+
+    async def get(self, heard: Optional[BloomFilter]=None) -> Optional[dict]:
+        '''
+        Take the next tossup the channel has not heard yet, and mark it as heard.
+
+        Parameters:
+            heard (BloomFilter): The IDs of the tossups already read in the channel.
+
+        Returns:
+            dict: The tossup, or None if the API could not be reached.
+        '''
+
+        repeat = None
+        for _ in range(self.MAX_REFILLS + 1):
+            for index, tossup in enumerate(self.tossups):
+                if heard is None or tossup['id'] not in heard:
+                    del self.tossups[index]
+                    if len(self.tossups) < self.lowWater:
+                        self.refill()
+                    if heard is not None:
+                        heard.add(tossup['id'])
+                    return tossup
+                repeat = repeat or tossup
+            await self.refill()
+
+        # Small filters can run out of unheard tossups, so a repeat is better than no question at all
+        return repeat
+
+buffers: Dict[tuple, QuestionBuffer] = {}
+
+async def nextTossup(difficulties: str, categories: str, heard: Optional[BloomFilter]=None) -> Optional[dict]:
+    '''
+    Take the next tossup for a filter from its shared buffer, creating the buffer on first use.
+
+    Parameters:
+        difficulties (str): Comma separated difficulties.
+        categories (str): Categories to filter the tossups.
+        heard (BloomFilter): The IDs of the tossups already read in the channel.
+
+    Returns:
+        dict: The tossup, or None if the API could not be reached.
+    '''
+
+    key = (difficulties, categories)
+    if key not in buffers:
+        buffers[key] = QuestionBuffer(difficulties, categories)
+        memoryAccountant.register(buffers[key], f'questionBuffer:{difficulties}:{categories}', PRIORITY_PREFETCH)
+    return await buffers[key].get(heard)
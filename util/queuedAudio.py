@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Callable, Optional
+import discord
+
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+SILENCE = b'\x00' * FRAME_SIZE
+
+class QueuedAudioSource(discord.AudioSource):
+    '''
+    Audio source that stays playing for a whole game and reads queued readings one after another.
+
+    Readings are raw 48kHz stereo PCM files decoded while the question was prepared, so moving to the next
+    question spawns no FFmpeg process and never restarts the voice player. Between readings it plays silence.
+
+        Methods:
+            enqueue (pcmPath: str, onEnd: Callable, onStart: Callable): Queue a reading, calling onStart from the player
+                thread when its first frame is read and onEnd on the event loop once it has been read.
+            skip (): Drop the reading currently playing without calling its onEnd.
+            close (): Stop the source, ending playback.
+    '''
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue = deque()
+        self.current = None
+        self.onEnd: Optional[Callable] = None
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def enqueue(self, pcmPath: str, onEnd: Optional[Callable]=None, onStart: Optional[Callable]=None) -> None:
+        with self.lock:
+            self.queue.append((pcmPath, onEnd, onStart))
+
+    def skip(self) -> None:
+        with self.lock:
+            self.closeCurrent()
+
+    def close(self) -> None:
+        with self.lock:
+            self.closed = True
+            self.queue.clear()
+            self.closeCurrent()
+
+    def closeCurrent(self) -> None:
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+        self.onEnd = None
+
+    def read(self) -> bytes:
+        # Called from the voice player thread every 20ms
+        with self.lock:
+            if self.closed:
+                return b''
+            if self.current is None and self.queue:
+                pcmPath, self.onEnd, onStart = self.queue.popleft()
+                self.current = open(pcmPath, 'rb')
+                if onStart is not None:
+                    onStart()
+            if self.current is None:
+                return SILENCE
+
+            frame = self.current.read(FRAME_SIZE)
+            if len(frame) < FRAME_SIZE:
+                onEnd = self.onEnd
+                self.closeCurrent()
+                if onEnd is not None:
+                    self.loop.call_soon_threadsafe(onEnd)
+                return frame.ljust(FRAME_SIZE, b'\x00')
+            return frame
+
+    def cleanup(self) -> None:
+        self.close()
+
+class FirstFrameSource(discord.AudioSource):
+    '''
+    Audio source wrapping another one to report when its first frame is read, which is when players start hearing it.
+    '''
+
+    def __init__(self, source: discord.AudioSource, onStart: Callable):
+        self.source = source
+        self.onStart = onStart
+
+    def read(self) -> bytes:
+        if self.onStart is not None:
+            # Called from the voice player thread
+            self.onStart()
+            self.onStart = None
+        return self.source.read()
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self) -> None:
+        self.source.cleanup()
@@ -0,0 +1,170 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Dict, List, Optional
+import discord
+from discord.ext.commands import Context
+
+PRIORITY_GAME = 0 # buzz acknowledgements and verdicts
+PRIORITY_INFO = 1 # question reveals, scores and game info
+
+MAX_EMBEDS = 10
+# Total characters Discord allows over all embeds of a message
+MAX_EMBED_CHARACTERS = 6000
+
+class ChannelSendQueue:
+    '''
+    Class representing the outgoing message queue of a single channel.
+
+    Messages queued within a short window are merged into one multi-embed message within Discord's embed limits,
+    and sent one by one if the merged message is refused. Higher priority messages are sent first, and sends are spaced so the channel stays inside its rate limit bucket instead of hitting 429s.
+    The queue of a channel is dropped once it has been idle and empty for idleTimeout seconds.
+
+        Attributes:
+            channel (discord.abc.Messageable): The channel the messages are sent to.
+            window (float): Seconds to wait for more messages to coalesce before sending.
+            limit (int): Messages allowed per rate limit period.
+            per (float): Length of the rate limit period in seconds.
+
+        Methods:
+            put (content: str, embed: Embed, priority: int, alone: bool) -> Future: Queue a message for sending.
+    '''
+
+    def __init__(self, channel: discord.abc.Messageable, window: float=0.1, limit: int=5, per: float=5.0, idleTimeout: float=30.0):
+        self.channel = channel
+        self.window = window
+        self.limit = limit
+        self.per = per
+        self.idleTimeout = idleTimeout
+
+        self.pending = []
+        self.counter = itertools.count()
+        self.sent = deque()
+        self.blockedUntil = 0.0
+        self.wakeup = asyncio.Event()
+        self.worker: Optional[asyncio.Task] = None
+
+    def put(self, content: Optional[str]=None, embed: Optional[discord.Embed]=None, priority: int=PRIORITY_INFO, alone: bool=False) -> asyncio.Future:
+        '''
+        Queue a message for sending.
+
+        Parameters:
+            content (str): The text content of the message.
+            embed (discord.Embed): The embed of the message.
+            priority (int): PRIORITY_GAME or PRIORITY_INFO.
+            alone (bool): Whether the message is sent on its own, so it can be edited later.
+
+        Returns:
+            asyncio.Future: Resolves to the sent message, or None if sending failed. Callers that do not need the message do not have to await it.
+        '''
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.pending, (priority, next(self.counter), content, embed, alone, future))
+        self.wakeup.set()
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self.run())
+        return future
+
+    def nextBatch(self) -> List[tuple]:
+        # Text messages are sent on their own, embed only messages are merged up to Discord's embed limits
+        batch = [heapq.heappop(self.pending)]
+        if batch[0][2] is not None or batch[0][4]:
+            return batch
+        characters = len(batch[0][3])
+        while self.pending and len(batch) < MAX_EMBEDS and self.pending[0][2] is None and not self.pending[0][4]:
+            characters += len(self.pending[0][3])
+            if characters > MAX_EMBED_CHARACTERS:
+                break
+            batch.append(heapq.heappop(self.pending))
+        return batch
+
+    def retryAlone(self, batch: List[tuple]) -> bool:
+        # One refused message must not take the others merged with it down too
+        if len(batch) < 2:
+            return False
+        for item in batch:
+            heapq.heappush(self.pending, (*item[:4], True, item[5]))
+        return True
+
+    async def waitForBucket(self) -> None:
+        now = time.monotonic()
+        while self.sent and now - self.sent[0] >= self.per:
+            self.sent.popleft()
+        delay = self.blockedUntil - now
+        if len(self.sent) >= self.limit:
+            delay = max(delay, self.sent[0] + self.per - now)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def run(self) -> None:
+        while True:
+            if not self.pending:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.idleTimeout)
+                except asyncio.TimeoutError:
+                    if not self.pending:
+                        if sendQueues.get(self.channel.id) is self:
+                            del sendQueues[self.channel.id]
+                        return
+
+            await asyncio.sleep(self.window)
+            await self.waitForBucket()
+            batch = self.nextBatch()
+            embeds = [item[3] for item in batch if item[3] is not None]
+
+            try:
+                message = await self.channel.send(content=batch[0][2], embeds=embeds)
+                self.sent.append(time.monotonic())
+                for item in batch:
+                    if not item[5].done():
+                        item[5].set_result(message)
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    retryAfter = float(e.response.headers.get('Retry-After', 1.0))
+                    logging.warning(f'Rate limited in channel {getattr(self.channel, "id", None)}, retrying in {retryAfter}s')
+                    self.blockedUntil = time.monotonic() + retryAfter
+                    for item in batch:
+                        heapq.heappush(self.pending, item)
+                    continue
+                logging.error(f'Error sending message: {e}')
+                if self.retryAlone(batch):
+                    continue
+                for item in batch:
+                    if not item[5].done():
+                        item[5].set_result(None)
+            except Exception as e:
+                logging.error(f'Error sending message: {e}')
+                if self.retryAlone(batch):
+                    continue
+                for item in batch:
+                    if not item[5].done():
+                        item[5].set_result(None)
+
+sendQueues: Dict[int, ChannelSendQueue] = {}
+
+def queueSend(channel: discord.abc.Messageable, content: Optional[str]=None, embed: Optional[discord.Embed]=None, priority: int=PRIORITY_INFO,
+              alone: bool=False) -> asyncio.Future:
+    '''
+    Queue a message on the send queue of its channel, creating the queue on first use. Game messages all go
+    through here, so they reach a channel in the order the queue decides.
+
+    Parameters:
+        channel (discord.abc.Messageable): The channel or context to send the message to.
+        content (str): The text content of the message.
+        embed (discord.Embed): The embed of the message.
+        priority (int): PRIORITY_GAME for buzzes and verdicts, PRIORITY_INFO otherwise.
+        alone (bool): Whether the message is sent on its own, so it can be edited later.
+
+    Returns:
+        asyncio.Future: Resolves to the sent message, or None if sending failed.
+    '''
+
+    if isinstance(channel, Context):
+        channel = channel.channel
+    if channel.id not in sendQueues:
+        sendQueues[channel.id] = ChannelSendQueue(channel)
+    return sendQueues[channel.id].put(content, embed, priority, alone)
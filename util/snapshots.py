@@ -0,0 +1,88 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Callable, Dict, Optional
+from dotenv import load_dotenv
+from tossup import TossupGame
+from util.warmPool import warmPool
+
+load_dotenv()
+
+class SnapshotStore:
+    '''
+    Class representing the on-disk snapshot of every tossup game and the warm pool, used to resume after a restart.
+
+    Snapshots only hold scores, settings and references to prepared files, so taking one costs a few kilobytes of
+    JSON written atomically on an executor thread. After a restart the games are not rebuilt until the first
+    command in their channel, and the warm pool keeps the bundles it had ready.
+
+        Attributes:
+            path (str): The path of the snapshot file.
+            interval (float): Seconds between snapshots.
+
+        Methods:
+            load (): Read the snapshot of the previous process and restore the warm pool.
+            take (key: tuple) -> dict: Take the pending snapshot of a game, if it has one.
+            save (games: Dict[tuple, TossupGame]): Write a snapshot of the games and the warm pool.
+            run (games: Callable): Write snapshots periodically.
+    '''
+
+    def __init__(self, path: str='snapshot.json', interval: float=30.0):
+        self.path = path
+        self.interval = interval
+        self.pending: Dict[tuple, dict] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def load(self) -> None:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.error(f'Failed to read snapshot {self.path}: {e}')
+            return
+
+        for key, game in data.get('games', {}).items():
+            guildId, channelId = key.split('-')
+            self.pending[(int(guildId), int(channelId))] = game
+        warmPool.restore(data.get('warmPool', []))
+        logging.info(f'Loaded snapshot with {len(self.pending)} games and {warmPool.bundleCount()} warm pool bundles')
+
+    def take(self, key: tuple) -> Optional[dict]:
+        return self.pending.pop(key, None)
+
+    async def save(self, games: dict) -> None:
+        data = {'games': {}, 'warmPool': warmPool.toSnapshot()}
+        for (guildId, channelId), game in games.items():
+            # Broadcast rooms depend on their session and packets on their preparation, so neither is resumed
+            if type(game) is TossupGame and game.packet is None:
+                data['games'][f'{guildId}-{channelId}'] = game.toSnapshot()
+        # Games not resumed yet are kept until their channel is used again
+        for (guildId, channelId), game in self.pending.items():
+            data['games'].setdefault(f'{guildId}-{channelId}', game)
+
+        payload = json.dumps(data, separators=(',', ':'))
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.write, payload)
+        except OSError as e:
+            logging.error(f'Failed to write snapshot {self.path}: {e}')
+
+    def write(self, payload: str) -> None:
+        # Write to a temporary file first so a crash mid-write never leaves a truncated snapshot
+        temporaryPath = f'{self.path}.tmp'
+        with open(temporaryPath, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(temporaryPath, self.path)
+
+    async def run(self, games: Callable[[], dict]) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.save(games())
+
+    def start(self, games: Callable[[], dict]) -> None:
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run(games))
+
+snapshotStore = SnapshotStore(os.getenv('SNAPSHOT_PATH', 'snapshot.json'), float(os.getenv('SNAPSHOT_INTERVAL', '30')))
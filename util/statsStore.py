@@ -0,0 +1,270 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from dotenv import load_dotenv
+from util.buzzAnalytics import BuzzAnalytics, BuzzSketch, buzzAnalytics
+from util.memoryBudget import memoryAccountant, sizeOf, PRIORITY_CACHE
+
+load_dotenv()
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS buzzes (
+    guild_id INTEGER NOT NULL,
+    player_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    result TEXT NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS player_stats (
+    guild_id INTEGER NOT NULL,
+    player_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    tens INTEGER NOT NULL DEFAULT 0,
+    powers INTEGER NOT NULL DEFAULT 0,
+    negs INTEGER NOT NULL DEFAULT 0,
+    bonus_parts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, player_id, category)
+);
+CREATE TABLE IF NOT EXISTS player_totals (
+    guild_id INTEGER NOT NULL,
+    player_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    points INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, player_id)
+);
+CREATE INDEX IF NOT EXISTS player_totals_points ON player_totals (guild_id, points DESC);
+CREATE TABLE IF NOT EXISTS buzz_sketches (
+    player_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    sketch TEXT NOT NULL,
+    PRIMARY KEY (player_id, category, difficulty)
+);
+CREATE TABLE IF NOT EXISTS leaderboard (
+    guild_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    player_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    points INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, rank)
+);
+'''
+
+# Counter deltas and points of each result, matching how Player counts them (a power is also a ten)
+RESULTS = {
+    'ten': ((1, 0, 0, 0), 10),
+    'power': ((1, 1, 0, 0), 25),
+    'neg': ((0, 0, 1, 0), -5),
+    'bonus': ((0, 0, 0, 1), 10),
+}
+
+class StatsStore:
+    '''
+    Class representing the persistent player statistics store, backed by SQLite in WAL mode.
+
+    Score events are appended to an in-memory buffer and written in batches on a dedicated thread, so scoring
+    never waits on disk. Each flush also rebuilds the top of the leaderboard of every guild it touched, so the
+    leaderboard is read from a precomputed table no matter how many buzzes are recorded, and merges the buzz
+    position summaries recorded since the last flush into the saved ones.
+
+        Attributes:
+            path (str): The path of the SQLite database.
+            flushInterval (float): Seconds between flushes of the buffer.
+            maxBuffer (int): Buffered events that trigger an early flush.
+            topK (int): Number of leaderboard rows kept per guild.
+
+        Methods:
+            record (guildId: int, playerId: int, name: str, category: str, result: str): Buffer a score event.
+            flush (): Write the buffered events.
+            leaderboard (guildId: int) -> List[tuple]: Get the precomputed leaderboard of a guild.
+            playerStats (guildId: int, playerId: int) -> List[tuple]: Get the per-category results of a player.
+            buzzSummaries (playerId: int) -> BuzzAnalytics: Get the buzz position summaries of a player.
+            close (): Flush the buffer and close the database.
+    '''
+
+    def __init__(self, path: str='stats.db', flushInterval: float=2.0, maxBuffer: int=500, topK: int=10):
+        self.path = path
+        self.flushInterval = flushInterval
+        self.maxBuffer = maxBuffer
+        self.topK = topK
+
+        self.buffer = []
+        self.connection: Optional[sqlite3.Connection] = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stats')
+        self.wakeup: Optional[asyncio.Event] = None
+        self.flushTask: Optional[asyncio.Task] = None
+
+    def memoryFootprint(self) -> int:
+        return sizeOf(self.buffer) + sum(sizeOf(*event) for event in self.buffer)
+
+    def evictMemory(self) -> None:
+        # The buffer cannot be dropped, but flushing it early releases it
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def record(self, guildId: int, playerId: int, name: str, category: str, result: str) -> None:
+        '''
+        Buffer a score event. This never touches the disk.
+
+        Parameters:
+            guildId (int): The guild the event happened in.
+            playerId (int): The player who scored.
+            name (str): The display name of the player.
+            category (str): The category of the question.
+            result (str): One of 'ten', 'power', 'neg' or 'bonus'.
+        '''
+
+        self.buffer.append((guildId, playerId, name, category or '', result, time.time()))
+        if self.flushTask is None or self.flushTask.done():
+            self.wakeup = asyncio.Event()
+            self.flushTask = asyncio.create_task(self.flushLoop())
+        if len(self.buffer) >= self.maxBuffer:
+            self.wakeup.set()
+
+    async def flushLoop(self) -> None:
+        while self.buffer:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flushInterval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        batch, self.buffer = self.buffer, []
+        sketches = buzzAnalytics.drain()
+        if not batch and not sketches:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.writeBatch, batch, sketches)
+        except Exception as e:
+            logging.error(f'Failed to write {len(batch)} score events, retrying with the next flush: {e}')
+            # The batch is written in one transaction, so nothing of it was saved and it goes back in front of newer events
+            self.buffer[:0] = batch
+            # Summaries merge exactly, so the next flush can still save them
+            buzzAnalytics.merge(BuzzAnalytics.fromList(sketches))
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.executescript(SCHEMA)
+        return self.connection
+
+    def writeBatch(self, batch: List[tuple], sketches: List[list]=()) -> None:
+        connection = self.connect()
+
+        # Fold the batch into one row per counter before touching the database
+        stats = defaultdict(lambda: [0, 0, 0, 0])
+        totals = {}
+        for guildId, playerId, name, category, result, _ in batch:
+            deltas, points = RESULTS[result]
+            counters = stats[(guildId, playerId, category)]
+            for i, delta in enumerate(deltas):
+                counters[i] += delta
+            _, total = totals.get((guildId, playerId), (name, 0))
+            totals[(guildId, playerId)] = (name, total + points)
+
+        with connection:
+            connection.executemany(
+                'INSERT INTO buzzes (guild_id, player_id, category, result, recorded_at) VALUES (?, ?, ?, ?, ?)',
+                [(guildId, playerId, category, result, recordedAt) for guildId, playerId, _, category, result, recordedAt in batch])
+            connection.executemany(
+                '''INSERT INTO player_stats (guild_id, player_id, category, tens, powers, negs, bonus_parts) VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (guild_id, player_id, category) DO UPDATE SET tens = tens + excluded.tens, powers = powers + excluded.powers,
+                   negs = negs + excluded.negs, bonus_parts = bonus_parts + excluded.bonus_parts''',
+                [(*key, *counters) for key, counters in stats.items()])
+            connection.executemany(
+                '''INSERT INTO player_totals (guild_id, player_id, name, points) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (guild_id, player_id) DO UPDATE SET name = excluded.name, points = points + excluded.points''',
+                [(*key, name, points) for key, (name, points) in totals.items()])
+
+            for playerId, category, difficulty, data in sketches:
+                sketch = BuzzSketch.fromDict(data)
+                row = connection.execute('SELECT sketch FROM buzz_sketches WHERE player_id = ? AND category = ? AND difficulty = ?',
+                                         (playerId, category, difficulty)).fetchone()
+                if row is not None:
+                    sketch.merge(BuzzSketch.fromDict(json.loads(row[0])))
+                connection.execute('INSERT OR REPLACE INTO buzz_sketches (player_id, category, difficulty, sketch) VALUES (?, ?, ?, ?)',
+                                   (playerId, category, difficulty, json.dumps(sketch.toDict())))
+
+            for guildId in {guildId for guildId, _ in totals}:
+                connection.execute('DELETE FROM leaderboard WHERE guild_id = ?', (guildId,))
+                rows = connection.execute(
+                    'SELECT player_id, name, points FROM player_totals WHERE guild_id = ? ORDER BY points DESC LIMIT ?',
+                    (guildId, self.topK)).fetchall()
+                connection.executemany(
+                    'INSERT INTO leaderboard (guild_id, rank, player_id, name, points) VALUES (?, ?, ?, ?, ?)',
+                    [(guildId, rank + 1, *row) for rank, row in enumerate(rows)])
+
+    async def leaderboard(self, guildId: int) -> List[tuple]:
+        '''
+        Get the precomputed leaderboard of a guild.
+
+        Parameters:
+            guildId (int): The guild of the leaderboard.
+
+        Returns:
+            List[tuple]: (rank, name, points) rows, best first.
+        '''
+
+        def read():
+            return self.connect().execute(
+                'SELECT rank, name, points FROM leaderboard WHERE guild_id = ? ORDER BY rank', (guildId,)).fetchall()
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, read)
+
+    async def playerStats(self, guildId: int, playerId: int) -> List[tuple]:
+        '''
+        Get the per-category results of a player in a guild.
+
+        Parameters:
+            guildId (int): The guild of the results.
+            playerId (int): The player of the results.
+
+        Returns:
+            List[tuple]: (category, tens, powers, negs, bonus parts) rows.
+        '''
+
+        def read():
+            return self.connect().execute(
+                'SELECT category, tens, powers, negs, bonus_parts FROM player_stats WHERE guild_id = ? AND player_id = ? ORDER BY category',
+                (guildId, playerId)).fetchall()
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, read)
+
+    async def buzzSummaries(self, playerId: int) -> BuzzAnalytics:
+        '''
+        Get the buzz position summaries of a player, saved and not yet flushed.
+
+        Parameters:
+            playerId (int): The player of the summaries.
+
+        Returns:
+            BuzzAnalytics: The summaries of the player.
+        '''
+
+        def read():
+            return self.connect().execute(
+                'SELECT player_id, category, difficulty, sketch FROM buzz_sketches WHERE player_id = ?', (playerId,)).fetchall()
+
+        rows = await asyncio.get_running_loop().run_in_executor(self.executor, read)
+        analytics = BuzzAnalytics.fromList([(player, category, difficulty, json.loads(sketch)) for player, category, difficulty, sketch in rows])
+        analytics.merge(buzzAnalytics)
+        return analytics
+
+    async def close(self) -> None:
+        await self.flush()
+        if self.connection is not None:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.connection.close)
+            self.connection = None
+
+statsStore = StatsStore(os.getenv('STATS_DB_PATH', 'stats.db'))
+memoryAccountant.register(statsStore, 'statsStore', PRIORITY_CACHE)
@@ -52,11 +52,12 @@ TEXT = {
         """,
 
         """
-            Displays the current scores of all players in the game.
+            Displays the current scores of all players in the game, ranked from highest to lowest. Large games are split into pages.
             Limits: Cannot be called while a tossup is being answered or if the game hasn't started.
 
             **Example Usage**:
             `!getscores`
+            `!getscores 2`
         """,
 
         """
@@ -75,6 +76,76 @@ TEXT = {
 
             **Example Usage**:
             `!end`
+        """,
+
+        """
+            Creates a config menu for a bonus game and starts reading bonuses once the setup is done.
+            You must be connected to a voice channel. After each part is read, any player in the game can answer by typing the answer in the chat.
+
+            **Example Usage**:
+            `!bonus`
+        """,
+
+        """
+            Adds the user to the current bonus game.
+            Limits: Cannot add users if the bonus game has not started yet.
+
+            **Example Usage**:
+            `!joinbonus`
+        """,
+
+        """
+            Moves to the next bonus. The next bonus is prepared while the current one is read.
+            Limits: Only players in the bonus game can use this command.
+
+            **Example Usage**:
+            `!nextbonus`
+        """,
+
+        """
+            Displays the final scores and ends the bonus game.
+            Limits: Cannot be called if a bonus game has not been started yet.
+
+            **Example Usage**:
+            `!endbonus`
+        """,
+
+        """
+            Creates a config menu for a broadcast and starts a room in this channel. Other channels can join the broadcast with the code it prints.
+            Every room hears the same tossups, but buzzing and scores are separate for each room. Use `!start` and `!next` as in a normal game.
+
+            **Example Usage**:
+            `!broadcast`
+        """,
+
+        """
+            Joins a broadcast from this channel. You must be connected to a voice channel.
+
+            **Example Usage**:
+            `!joinbroadcast 1A2B3C`
+        """,
+
+        """
+            Ends a broadcast in every room. Must be called from one of the rooms of the broadcast.
+
+            **Example Usage**:
+            `!endbroadcast 1A2B3C`
+        """,
+
+        """
+            Displays the players with the most points in this server across all games.
+            Scores are saved a few seconds after each question, so the latest question may not be counted yet.
+
+            **Example Usage**:
+            `!leaderboard`
+        """,
+
+        """
+            Displays your results in this server by category, and how early you buzz on tossups.
+            Buzz positions are counted since the bot was last restarted.
+
+            **Example Usage**:
+            `!mystats`
         """
     ],
     "error": {
@@ -88,19 +159,42 @@ TEXT = {
         "failed_to_start": "Failed to start the game.",
         "something_wrong": "Something went wrong! If this issue occurs again, please fill out this form: https://forms.gle/fLd6r4yZGRyaRDnw6",
         "cannot_use_command": "You are not allowed to use this command right now.",
-        "failed_to_add": "Failed to add player to the game."
+        "failed_to_add": "Failed to add player to the game.",
+        "no_broadcast": "There is no broadcast with the code {code}.",
+        "voice_failed": "Could not connect to your voice channel. Please try again.",
+        "voice_busy": "Another game in this server is reading in a different voice channel. Join that channel or wait for the game to end.",
+        "packet_number": "The packet number must be a whole number.",
+        "packet_not_found": "Could not find packet {number} of {setName}. Check the set name on qbreader.org and try again."
     },
     "game": {
-        "instructions": "Use the dropdown menu to select the categories and difficulties for the game. Leaving either field blank will select all categories or difficulties.",
+        "instructions": "Use the dropdown menu to select the categories, difficulties, reading speed and auto-advance for the game. Leaving categories or difficulties blank will select all categories or difficulties. To read a whole tournament packet in order instead, press Packet.",
         "initialized": "Game started successfully! You have successfully initialized a game! Note, to start the game, type !start. To buzz on a question, type 'buzz'. To answer a question after buzzing, type [your answer], with no commands. To add another player to the game, the user must type !add while a game is running to add themselves.",
+        "voice_buzzing": "Voice buzzing is on: speak in the voice channel to buzz, then type your answer.",
         "reading_tossup": "Reading tossup.",
+        "reading_bonus": "Reading bonus.",
+        "resumed": "Resumed the game that was running before the bot restarted. Scores were kept.",
+        "packet_selected": "Selected packet {number} of {setName}. Press Done to start.",
+        "packet_progress": "Preparing packet {number} of {setName}: {done}/{total} tossups ready{eta}.",
+        "packet_ready": "Every tossup of packet {number} of {setName} is ready.",
+        "packet_preparing": "The next tossup of the packet is still being prepared, it will be read as soon as it is ready.",
+        "packet_finished": "That was the last tossup of the packet. Type !end to see the final scores.",
+        "auto_next": "Next tossup in {gap:g} seconds. Type !next to skip ahead.",
+        "broadcast_started": "Broadcast started! Other channels can join with `!joinbroadcast {code}`. Type !start to start reading in this room.",
+        "broadcast_joined": "Joined broadcast {code} ({rooms} rooms). Type !start to start reading in this room.",
         "buzzed_in": "{user} has buzzed in. Answer?",
         "player_added": "{user} has been added to the game!",
         "scores": "Scores:\n{scores}",
         "final_scores": "Final Scores: {scores}",
-        "game_info": "Number of Tossups read: {tossups}\nCategories: {categories}\nDifficulties: {difficulties}",
+        "scores_page": "Page {page} of {pages}. Use `!getscores <page>` for other pages.",
+        "your_rank": "You are ranked {rank} of {players}.",
+        "game_info": "Number of Tossups read: {tossups}\nCategories: {categories}\nDifficulties: {difficulties}\nReading Speed: {speed}x",
         "connected": "Connected? {status}",
-        "shutdown": "Bot is shutting down..."
+        "shutdown": "Bot is shutting down...",
+        "no_stats": "No scores have been recorded in this server yet.",
+        "no_metrics": "Nothing has been recorded yet.",
+        "no_stalls": "No event loop stalls have been detected.",
+        "profiling": "Profiling every thread for {seconds:g} seconds...",
+        "memory": "Accounted: {total:.1f} MiB of {budget:.0f} MiB budget\nProcess RSS: {rss}\n\n{components}"
     },
     "cats": {
         "Literature": "lit",
@@ -114,6 +208,19 @@ TEXT = {
         "Religion": "rel",
         "Social Science": "ss"
     },
+    "speeds": [
+        "0.75",
+        "0.9",
+        "1.0",
+        "1.1",
+        "1.25",
+        "1.5"
+    ],
+    "gaps": [
+        "2",
+        "5",
+        "10"
+    ],
     "diff": [
         "1",
         "2",
@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+import subprocess
+from typing import Optional, Tuple
+
+def speedSuffix(speed: float) -> str:
+    '''
+    Returns the file name suffix used for the variant of a file at the given reading speed.
+
+    Args:
+        speed (float): The reading speed, where 1.0 is the synthesized speed.
+
+    Returns:
+        str: An empty string for 1.0, otherwise a suffix such as '-1.25'.
+    '''
+
+    return '' if speed == 1.0 else f'-{speed:g}'
+
+def variantPath(path: str, speed: float) -> str:
+    '''
+    Returns the path of the variant of a file at the given reading speed, e.g. temp/tossup.mp3 -> temp/tossup-1.25.mp3.
+    '''
+
+    root, ext = os.path.splitext(path)
+    return f'{root}{speedSuffix(speed)}{ext}'
+
+def atempoFilter(speed: float) -> str:
+    '''
+    Builds an FFmpeg atempo filter chain for the given speed. Each atempo stage only accepts factors
+    between 0.5 and 2.0, so larger changes are split into several stages.
+    '''
+
+    stages = []
+    while speed > 2.0:
+        stages.append(2.0)
+        speed /= 2.0
+    while speed < 0.5:
+        stages.append(0.5)
+        speed /= 0.5
+    stages.append(speed)
+    return ','.join(f'atempo={stage:.6f}' for stage in stages)
+
+def isFresh(variant: str, source: str) -> bool:
+    return os.path.exists(variant) and os.path.getmtime(variant) >= os.path.getmtime(source)
+
+def stretchAudio(audioPath: str, speed: float) -> str:
+    '''
+    Creates a pitch-preserving time-stretched copy of an audio file. The stretched copy is kept next to
+    the original, so later requests for the same speed are served from disk.
+
+    Args:
+        audioPath (str): The path of the audio synthesized at 1.0.
+        speed (float): The reading speed of the copy.
+
+    Returns:
+        str: The path of the audio file to play at the given speed.
+    '''
+
+    if speed == 1.0:
+        return audioPath
+
+    outputPath = variantPath(audioPath, speed)
+    if isFresh(outputPath, audioPath):
+        return outputPath
+
+    subprocess.run(
+        ['ffmpeg', '-y', '-loglevel', 'error', '-i', audioPath, '-filter:a', atempoFilter(speed), outputPath],
+        check=True
+    )
+    return outputPath
+
+def scaleSyncMap(syncMapPath: str, speed: float) -> str:
+    '''
+    Writes a copy of an aeneas JSON sync map with every timestamp divided by the reading speed, so the
+    fragments line up with audio stretched by stretchAudio.
+
+    Args:
+        syncMapPath (str): The path of the sync map aligned against the 1.0 audio.
+        speed (float): The reading speed of the copy.
+
+    Returns:
+        str: The path of the sync map to use at the given speed.
+    '''
+
+    if speed == 1.0:
+        return syncMapPath
+
+    outputPath = variantPath(syncMapPath, speed)
+    if isFresh(outputPath, syncMapPath):
+        return outputPath
+
+    with open(syncMapPath, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    for fragment in data['fragments']:
+        fragment['begin'] = f"{float(fragment['begin']) / speed:.3f}"
+        fragment['end'] = f"{float(fragment['end']) / speed:.3f}"
+    with open(outputPath, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    return outputPath
+
+def stretchBundle(audioPath: str, syncMapPath: Optional[str], speed: float) -> Tuple[str, Optional[str]]:
+    '''
+    Produces the playback audio and sync map for a reading speed from a question synthesized and aligned once at 1.0.
+
+    Args:
+        audioPath (str): The path of the audio synthesized at 1.0.
+        syncMapPath (Optional[str]): The path of the sync map aligned against that audio, if there is one.
+        speed (float): The reading speed.
+
+    Returns:
+        tuple: The paths of the audio and sync map to use for playback.
+    '''
+
+    try:
+        audio = stretchAudio(audioPath, speed)
+        syncMap = scaleSyncMap(syncMapPath, speed) if syncMapPath else None
+        return audio, syncMap
+    except (OSError, subprocess.CalledProcessError) as e:
+        logging.error(f'Failed to stretch {audioPath} to speed {speed}, reading at 1.0 instead: {e}')
+        return audioPath, syncMapPath
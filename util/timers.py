@@ -60,7 +60,8 @@ class AudioTracker:
 
     Methods:
         playAudio(): Start tracking audio playback.
-        pauseAudio(): Pause the audio playback.
+        pauseAudio(at: float): Pause the audio playback, now or at an earlier wall clock time.
+        clampOnset(at: float) -> float: Clamp a wall clock time to the part of the reading playing since it last started or resumed.
         resumeAudio(): Resume the paused audio playback.
         getPlaybackPosition() -> float: Get the current playback position in seconds.
         reset(): Reset the audio tracker to its initial state.
@@ -70,20 +71,28 @@ class AudioTracker:
         self.orginal_start_time = None
         self.paused_time = 0  # To accumulate paused time
         self.is_paused = False
+        self.reading_start = None  # When playback last started or resumed
 
     def playAudio(self):
         self.start_time = time.time()
         self.orginal_start_time = time.time()
+        self.reading_start = self.start_time
 
-    def pauseAudio(self):
+    def clampOnset(self, at):
+        now = time.time()
+        return min(max(at, self.reading_start or at), now)
+
+    def pauseAudio(self, at=None):
+        # The pause can be placed in the past, e.g. when a player started speaking, but only while the reading was playing
         if not self.is_paused:
-            self.start_time = time.time()
+            self.start_time = time.time() if at is None else self.clampOnset(at)
             self.is_paused = True
 
     def resumeAudio(self):
         if self.is_paused:
             self.paused_time += time.time() - self.start_time
             self.is_paused = False
+            self.reading_start = time.time()
 
     def getPlaybackPosition(self):
         if self.orginal_start_time is None:
@@ -96,4 +105,5 @@ class AudioTracker:
     def reset(self):
         self.start_time = None
         self.paused_time = 0  # To accumulate paused time
-        self.is_paused = False
\ No newline at end of file
+        self.is_paused = False
+        self.reading_start = None
\ No newline at end of file
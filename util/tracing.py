@@ -0,0 +1,165 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from typing import Callable, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRACE_PATH = os.getenv('TRACE_PATH', 'traces.jsonl')
+# Fraction of traces written; slow and failed traces are always written
+SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.1'))
+SLOW_TRACE_SECONDS = float(os.getenv('TRACE_SLOW_SECONDS', '10'))
+MAX_SPANS = 256
+
+currentSpan: contextvars.ContextVar = contextvars.ContextVar('currentSpan', default=None)
+
+traceLogger = logging.getLogger('trace')
+traceLogger.propagate = False
+writerLock = threading.Lock()
+
+class Trace:
+    '''
+    Class representing the spans of one trace, kept in memory until its root span finishes and the trace is
+    either written or dropped.
+    '''
+
+    def __init__(self):
+        self.traceId = secrets.token_hex(16)
+        self.sampled = random.random() < SAMPLE_RATE
+        self.failed = False
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, span: 'Span') -> None:
+        with self.lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(span)
+
+class Span:
+    '''
+    Class representing a timed operation in a trace. Spans are written as JSON lines using the field names of
+    the OpenTelemetry span data model, so standard tooling can load them.
+
+        Attributes:
+            name (str): The name of the operation.
+            trace (Trace): The trace the span belongs to.
+            parent (Span): The parent span, or None for the root of the trace.
+
+        Methods:
+            setAttribute (key: str, value): Attach a value to the span.
+            addEvent (name: str): Record a point in time inside the span.
+            finish (error: Exception): End the span, writing the trace if it is the root.
+    '''
+
+    def __init__(self, name: str, parent: Optional['Span']=None, attributes: Optional[dict]=None):
+        self.name = name
+        self.parent = parent
+        self.trace = parent.trace if parent is not None else Trace()
+        self.spanId = secrets.token_hex(8)
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.start = time.time_ns()
+        self.end = None
+        self.error = None
+
+    def setAttribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def addEvent(self, name: str, **attributes) -> None:
+        # Safe to call from the voice player thread
+        self.events.append({'name': name, 'timeUnixNano': time.time_ns(), 'attributes': attributes})
+
+    def finish(self, error: Optional[BaseException]=None) -> None:
+        if self.end is not None:
+            return
+        self.end = time.time_ns()
+        if error is not None:
+            self.error = repr(error)[:200]
+            self.trace.failed = True
+        self.trace.add(self)
+        if self.parent is None:
+            export(self)
+
+    def toDict(self) -> dict:
+        return {
+            'traceId': self.trace.traceId,
+            'spanId': self.spanId,
+            'parentSpanId': self.parent.spanId if self.parent is not None else '',
+            'name': self.name,
+            'startTimeUnixNano': self.start,
+            'endTimeUnixNano': self.end,
+            'attributes': self.attributes,
+            'events': self.events,
+            'status': {'code': 'ERROR', 'message': self.error} if self.error else {'code': 'OK'},
+        }
+
+def writer() -> logging.Logger:
+    with writerLock:
+        if not traceLogger.handlers:
+            handler = RotatingFileHandler(TRACE_PATH, maxBytes=10 * 1024 * 1024, backupCount=5, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            traceLogger.addHandler(handler)
+            traceLogger.setLevel(logging.INFO)
+    return traceLogger
+
+def export(root: Span) -> None:
+    trace = root.trace
+    seconds = (root.end - root.start) / 1e9
+    slow = seconds >= SLOW_TRACE_SECONDS
+    if not (trace.sampled or trace.failed or slow):
+        return
+    if slow:
+        logging.warning(f'Slow trace {trace.traceId}: {root.name} took {seconds:.1f}s')
+    with trace.lock:
+        lines = [json.dumps(span.toDict()) for span in trace.spans]
+    log = writer()
+    for line in lines:
+        log.info(line)
+
+def startTrace(name: str, **attributes) -> Span:
+    '''
+    Start the root span of a new trace. The caller keeps the span and finishes it when the traced work is over,
+    which may be in a different task.
+    '''
+
+    return Span(name, None, attributes)
+
+@contextmanager
+def span(name: str, parent: Optional[Span]=None, **attributes):
+    '''
+    Time a block as a span, a child of parent or of the current span, and make it the current span inside the block.
+    Outside any trace a block starts its own trace.
+    '''
+
+    current = Span(name, parent if parent is not None else currentSpan.get(), attributes)
+    token = currentSpan.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.finish(e)
+        raise
+    else:
+        current.finish()
+    finally:
+        currentSpan.reset(token)
+
+def bind(fn: Callable) -> Callable:
+    '''
+    Bind a function to the current trace context, so spans it opens on an executor thread or in the `after`
+    callback of the voice player are children of the current span.
+    '''
+
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so every call runs in its own copy
+        return context.copy().run(fn, *args, **kwargs)
+    return run
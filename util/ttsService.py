@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+import grpc
+from dotenv import load_dotenv
+from google.cloud import texttospeech
+from google.cloud.texttospeech_v1.services.text_to_speech.transports import TextToSpeechGrpcAsyncIOTransport
+import util.metrics as metrics
+
+load_dotenv()
+
+# host:port of a TTS server reached without TLS or credentials, such as the fake one in tests/fakeTts.py, empty for Google
+TTS_ENDPOINT = os.getenv('TTS_ENDPOINT', '')
+# gRPC channels requests are spread over
+TTS_CHANNELS = int(os.getenv('TTS_CHANNELS', '4'))
+# Requests sent at once over all channels, the rest wait their turn
+TTS_MAX_IN_FLIGHT = int(os.getenv('TTS_MAX_IN_FLIGHT', '16'))
+# Google TTS calls that take longer than this fall back to the offline engine
+TTS_DEADLINE = float(os.getenv('TTS_DEADLINE', '8'))
+
+VOICE = texttospeech.VoiceSelectionParams(language_code='en-US', ssml_gender=texttospeech.SsmlVoiceGender.MALE)
+
+class TtsService:
+    '''
+    Class representing a pool of asynchronous Google TTS clients shared by every game.
+
+    The clients live on an event loop of their own in a background thread, so synchronous callers on executor
+    threads and coroutines alike can use them. Each client has its own channel and subchannel pool, so requests
+    really spread over several connections, and every request goes to the channel with the fewest in flight.
+    At most maxInFlight requests are sent at once. Requests for the same text at the same speed share one RPC.
+
+        Attributes:
+            endpoint (str): The host:port of a local TTS server, or empty for Google.
+            channels (int): Number of channels in the pool.
+            maxInFlight (int): Requests sent at once.
+            deadline (float): Seconds a request, including its wait for a free slot, may take.
+
+        Methods:
+            synthesize (text: str, speed: float) -> bytes: Synthesize MP3 audio, from the service loop.
+            synthesizeBlocking (text: str, speed: float) -> bytes: Synthesize MP3 audio from any other thread.
+            close (): Close the channels and stop the loop, blocking until it has stopped. The next request starts a new one.
+    '''
+
+    def __init__(self, endpoint: str=TTS_ENDPOINT, channels: int=TTS_CHANNELS, maxInFlight: int=TTS_MAX_IN_FLIGHT, deadline: float=TTS_DEADLINE):
+        self.endpoint = endpoint
+        self.channels = channels
+        self.maxInFlight = maxInFlight
+        self.deadline = deadline
+        self.clients: List[texttospeech.TextToSpeechAsyncClient] = []
+        self.inFlight: List[int] = []
+        self.pending: Dict[tuple, asyncio.Task] = {}
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self.loop.run_forever, name='tts', daemon=True)
+                self.thread.start()
+        return self.loop
+
+    def connect(self) -> None:
+        # gRPC channels belong to the loop they were made on, so they are made on the service loop
+        options = [('grpc.use_local_subchannel_pool', 1)]
+        for _ in range(self.channels):
+            if self.endpoint:
+                channel = grpc.aio.insecure_channel(self.endpoint, options=options)
+            else:
+                channel = TextToSpeechGrpcAsyncIOTransport.create_channel(options=options)
+            self.clients.append(texttospeech.TextToSpeechAsyncClient(transport=TextToSpeechGrpcAsyncIOTransport(channel=channel)))
+            self.inFlight.append(0)
+        self.slots = asyncio.Semaphore(self.maxInFlight)
+
+    def synthesizeBlocking(self, text: str, speed: float=1.0) -> bytes:
+        return asyncio.run_coroutine_threadsafe(self.synthesize(text, speed), self.start()).result()
+
+    async def synthesize(self, text: str, speed: float=1.0) -> bytes:
+        '''
+        Synthesize MP3 audio, sharing the RPC of an identical request already in flight.
+
+        Parameters:
+            text (str): The text to read.
+            speed (float): The speaking rate.
+
+        Returns:
+            bytes: The MP3 audio content.
+
+        Raises:
+            asyncio.TimeoutError: If the audio did not arrive within the deadline.
+        '''
+
+        if not self.clients:
+            self.connect()
+        key = (text, speed)
+        task = self.pending.get(key)
+        if task is None:
+            task = self.pending[key] = asyncio.ensure_future(self.request(text, speed))
+            task.add_done_callback(lambda done: self.finish(key, done))
+        else:
+            metrics.increment('tts.coalesced')
+        # Giving up on the request must not cancel it for the other callers sharing it
+        return await asyncio.wait_for(asyncio.shield(task), self.deadline)
+
+    def finish(self, key: tuple, task: asyncio.Task) -> None:
+        self.pending.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logging.warning(f'TTS request for {len(key[0])} characters failed: {task.exception()}')
+
+    async def request(self, text: str, speed: float) -> bytes:
+        queued = time.monotonic()
+        async with self.slots:
+            metrics.observe('tts.queueWait', time.monotonic() - queued)
+            index = min(range(len(self.clients)), key=self.inFlight.__getitem__)
+            self.inFlight[index] += 1
+            start = time.monotonic()
+            try:
+                response = await self.clients[index].synthesize_speech(
+                    input=texttospeech.SynthesisInput(text=text), voice=VOICE,
+                    audio_config=texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3, speaking_rate=speed),
+                    timeout=self.deadline)
+            except Exception:
+                metrics.increment('tts.errors')
+                raise
+            finally:
+                self.inFlight[index] -= 1
+            metrics.observe('tts.request', time.monotonic() - start)
+            return response.audio_content
+
+    def close(self) -> None:
+        with self.lock:
+            loop, thread = self.loop, self.thread
+            if loop is None:
+                return
+
+            async def closeClients():
+                for client in self.clients:
+                    await client.transport.close()
+
+            try:
+                asyncio.run_coroutine_threadsafe(closeClients(), loop).result(self.deadline)
+            except Exception as e:
+                logging.warning(f'Failed to close the TTS channels: {e}')
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+            # Everything below belonged to the stopped loop, a later request connects again on a new one
+            self.clients.clear()
+            self.inFlight.clear()
+            self.pending.clear()
+            self.slots = None
+            self.loop = None
+            self.thread = None
+
+ttsService = TtsService()
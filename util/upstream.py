@@ -0,0 +1,162 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict
+import util.metrics as metrics
+import util.tracing as tracing
+
+class UpstreamError(Exception):
+    '''Raised when an upstream call failed after every retry.'''
+
+class CircuitOpenError(UpstreamError):
+    '''Raised without calling upstream while the circuit breaker of an endpoint is open.'''
+
+class UpstreamRejectedError(UpstreamError):
+    '''Raised when upstream rejected the request itself, e.g. a 4xx for an unknown packet, which a retry would not fix.'''
+
+def isPermanent(error: Exception) -> bool:
+    '''
+    Whether an error comes from the request rather than the endpoint: a 4xx response other than a timeout or rate
+    limit, or a response that could not be decoded.
+    '''
+
+    if isinstance(error, ValueError):
+        return True
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+class CircuitBreaker:
+    '''
+    Class representing the circuit breaker of an endpoint.
+
+    After failureThreshold consecutive failed calls the circuit opens and calls fail fast. After resetTimeout
+    seconds one trial call is let through (half-open); it closes the circuit if it succeeds and reopens it if not.
+    '''
+
+    def __init__(self, failureThreshold: int=5, resetTimeout: float=30.0):
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self.failures = 0
+        self.openedAt = None
+        self.trialRunning = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.openedAt is None:
+                return True
+            if time.monotonic() - self.openedAt >= self.resetTimeout and not self.trialRunning:
+                self.trialRunning = True
+                return True
+            return False
+
+    def recordSuccess(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.openedAt = None
+            self.trialRunning = False
+
+    def recordFailure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            self.trialRunning = False
+            if self.failures >= self.failureThreshold:
+                self.openedAt = time.monotonic()
+
+class UpstreamPolicy:
+    '''
+    Class representing the call policy of one upstream endpoint.
+
+    A call is hedged: if it has not finished once the observed p95 latency of the endpoint has passed, a duplicate
+    is sent and whichever finishes first wins. Failed calls are retried with jittered exponential backoff, and
+    repeated failures open the circuit breaker so callers fail fast and use their fallback. Errors caused by the
+    request itself are raised at once, without a retry and without counting against the breaker.
+
+        Attributes:
+            name (str): The name of the endpoint, also used for its latency metrics.
+            attempts (int): Calls made before giving up.
+            baseDelay (float): Backoff before the first retry in seconds.
+            minHedgeDelay (float): Hedges are never sent earlier than this, even if the p95 is lower.
+
+        Methods:
+            call (fn: Callable) -> Any: Call fn under the policy. Only use it for idempotent requests.
+    '''
+
+    hedgePool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='upstream')
+
+    def __init__(self, name: str, attempts: int=3, baseDelay: float=0.2, maxDelay: float=2.0, minHedgeDelay: float=0.25):
+        self.name = name
+        self.attempts = attempts
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.minHedgeDelay = minHedgeDelay
+        self.breaker = CircuitBreaker()
+
+    def hedged(self, fn: Callable):
+        p95 = metrics.latency(f'upstream.{self.name}').percentile(0.95)
+        started = {self.hedgePool.submit(tracing.bind(fn)): time.monotonic()}
+        if p95 is not None:
+            done, _ = wait(started, timeout=max(p95, self.minHedgeDelay))
+            if not done:
+                metrics.increment(f'upstream.{self.name}.hedged')
+                tracing.currentSpan.get().addEvent('hedge', afterSeconds=round(max(p95, self.minHedgeDelay), 3))
+                started[self.hedgePool.submit(tracing.bind(fn))] = time.monotonic()
+
+        error = None
+        pending = set(started)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # Only the winner is recorded, the loser would skew the p95 the hedge delay comes from
+                    metrics.observe(f'upstream.{self.name}', time.monotonic() - started[future])
+                    return future.result()
+                error = future.exception()
+                if isPermanent(error):
+                    raise error
+        raise error
+
+    def call(self, fn: Callable):
+        with tracing.span(f'upstream.{self.name}') as span:
+            if not self.breaker.allow():
+                metrics.increment(f'upstream.{self.name}.rejected')
+                raise CircuitOpenError(f'{self.name} circuit is open')
+
+            error = None
+            for attempt in range(self.attempts):
+                try:
+                    result = self.hedged(fn)
+                    self.breaker.recordSuccess()
+                    return result
+                except Exception as e:
+                    if isPermanent(e):
+                        # The endpoint answered, so it counts as healthy, and a retry would be rejected the same way
+                        self.breaker.recordSuccess()
+                        metrics.increment(f'upstream.{self.name}.badRequests')
+                        span.addEvent('rejected', error=repr(e)[:200])
+                        raise UpstreamRejectedError(f'{self.name} rejected the request: {e}') from e
+                    error = e
+                    metrics.increment(f'upstream.{self.name}.errors')
+                    span.addEvent('attemptFailed', attempt=attempt, error=repr(e)[:200])
+                    if attempt < self.attempts - 1:
+                        delay = min(self.maxDelay, self.baseDelay * 2 ** attempt)
+                        time.sleep(random.uniform(0, delay))
+
+            self.breaker.recordFailure()
+            logging.error(f'{self.name} failed after {self.attempts} attempts: {error}')
+            raise UpstreamError(f'{self.name} failed: {error}') from error
+
+policies: Dict[str, UpstreamPolicy] = {}
+policiesLock = threading.Lock()
+
+def policy(name: str) -> UpstreamPolicy:
+    '''
+    Get the call policy of an endpoint, creating it on first use.
+    '''
+
+    with policiesLock:
+        if name not in policies:
+            policies[name] = UpstreamPolicy(name)
+        return policies[name]
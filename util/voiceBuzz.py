@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+import discord
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    from discord.ext import voice_recv
+except ImportError:
+    voice_recv = None
+
+load_dotenv()
+
+# Whether players can buzz by speaking in the voice channel, which needs the discord-ext-voice-recv extension
+VOICE_BUZZ = os.getenv('VOICE_BUZZ', '0') == '1'
+# RMS a frame needs to count as speech however quiet the speaker's background is, out of 32768
+VOICE_BUZZ_MIN_RMS = float(os.getenv('VOICE_BUZZ_MIN_RMS', '600'))
+# How far above the speaker's background a frame has to be to count as speech
+VOICE_BUZZ_RATIO = float(os.getenv('VOICE_BUZZ_RATIO', '3'))
+
+if VOICE_BUZZ and voice_recv is None:
+    logging.warning('VOICE_BUZZ is set but discord-ext-voice-recv is not installed, players will buzz by typing')
+enabled = VOICE_BUZZ and voice_recv is not None
+
+# Voice connections are made with the receiving client when voice buzzing is on
+VOICE_CLIENT = voice_recv.VoiceRecvClient if enabled else discord.VoiceClient
+
+# Decoded voice is 48kHz stereo 16-bit PCM in 20ms frames
+FRAME_SECONDS = 0.02
+FRAME_BYTES = 3840
+# Every 8th sample is plenty to measure the energy of speech and keeps the cost per frame small
+DECIMATION = 8
+
+class SpeakerState:
+    __slots__ = ('floor', 'run', 'runStart', 'quiet', 'speaking', 'last')
+
+    def __init__(self):
+        self.floor = None
+        self.run = 0
+        self.runStart = 0.0
+        self.quiet = 0
+        self.speaking = False
+        self.last = 0.0
+
+class VoiceActivityDetector:
+    '''
+    Class representing an energy based voice activity detector, keeping the state of each speaker separately.
+
+    Each frame is reduced to the RMS of a decimated slice of its samples. A speaker starts an utterance after
+    onsetFrames frames in a row above both minRms and ratio times their background level, which follows the
+    frames outside utterances, and the utterance ends after releaseFrames quiet frames or a gap in their packets.
+    The onset reported is the timestamp of the first loud frame, so the buzz is placed where the speaker started
+    talking rather than where the detector became sure. Detection only needs frames and timestamps, so recorded
+    PCM files give the same results as live voice.
+
+        Attributes:
+            minRms (float): RMS a frame needs to count as speech.
+            ratio (float): How far above the background a frame needs to be.
+            onsetFrames (int): Loud frames in a row that start an utterance.
+            releaseFrames (int): Quiet frames in a row that end an utterance.
+
+        Methods:
+            feed (speakerId: int, pcm: bytes, timestamp: float) -> float: Process a frame, returning the onset of an utterance that just started.
+            forget (speakerId: int): Drop the state of a speaker.
+    '''
+
+    def __init__(self, minRms: float=VOICE_BUZZ_MIN_RMS, ratio: float=VOICE_BUZZ_RATIO, onsetFrames: int=3, releaseFrames: int=15,
+                 gap: float=0.2):
+        self.minRms = minRms
+        self.ratio = ratio
+        self.onsetFrames = onsetFrames
+        self.releaseFrames = releaseFrames
+        self.gap = gap
+        self.speakers: Dict[int, SpeakerState] = {}
+
+    def feed(self, speakerId: int, pcm: bytes, timestamp: float) -> Optional[float]:
+        state = self.speakers.get(speakerId)
+        if state is None:
+            state = self.speakers[speakerId] = SpeakerState()
+        elif timestamp - state.last > self.gap:
+            # Discord stops sending packets when someone stops transmitting
+            state.run = 0
+            state.speaking = False
+        state.last = timestamp
+
+        samples = np.frombuffer(pcm, dtype='<i2', count=len(pcm) // 2)[::DECIMATION].astype(np.float32)
+        if not len(samples):
+            return None
+        rms = float(np.sqrt(np.dot(samples, samples) / len(samples)))
+        if state.floor is None:
+            state.floor = min(rms, self.minRms)
+
+        if rms < max(self.minRms, state.floor * self.ratio):
+            state.run = 0
+            state.quiet += 1
+            if state.quiet >= self.releaseFrames:
+                state.speaking = False
+            # The background falls quickly and rises slowly, so speech never becomes the background
+            state.floor += (rms - state.floor) * (0.5 if rms < state.floor else 0.02)
+            return None
+
+        state.quiet = 0
+        if state.run == 0:
+            state.runStart = timestamp
+        state.run += 1
+        if state.speaking or state.run < self.onsetFrames:
+            return None
+        state.speaking = True
+        return state.runStart
+
+    def forget(self, speakerId: int) -> None:
+        self.speakers.pop(speakerId, None)
+
+class BuzzSink(voice_recv.AudioSink if voice_recv is not None else object):
+    '''
+    Sink receiving the decoded voice of a channel and reporting the utterances of players while a tossup is read.
+
+    write is called from the receiving thread, so utterances are handed to the event loop with
+    call_soon_threadsafe. Frames are only analyzed while armed() is true, which costs nothing between tossups.
+    '''
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, armed: Callable[[], bool], onUtterance: Callable[[discord.Member, float], None]):
+        super().__init__()
+        self.loop = loop
+        self.armed = armed
+        self.onUtterance = onUtterance
+        self.detector = VoiceActivityDetector()
+
+    def wants_opus(self) -> bool:
+        return False
+
+    def write(self, user, data) -> None:
+        if user is None or not data.pcm or not self.armed():
+            return
+        # AudioTracker positions are wall clock times
+        onset = self.detector.feed(user.id, data.pcm, time.time())
+        if onset is not None:
+            self.loop.call_soon_threadsafe(self.onUtterance, user, onset)
+
+    def cleanup(self) -> None:
+        self.detector.speakers.clear()
+
+def listen(voiceClient: discord.VoiceClient, armed: Callable[[], bool], onUtterance: Callable[[discord.Member, float], None]) -> bool:
+    '''
+    Start receiving the voice of a channel for a game, replacing the sink of the game that used the connection before.
+
+    Parameters:
+        voiceClient (VoiceClient): The voice connection of the game.
+        armed (Callable): Whether buzzes are being taken, checked from the receiving thread.
+        onUtterance (Callable): Called on the event loop with the speaker and the wall clock time they started speaking.
+
+    Returns:
+        bool: Whether voice buzzing is on for the connection.
+    '''
+
+    if not enabled or not isinstance(voiceClient, VOICE_CLIENT):
+        return False
+    sink = voiceClient.sink if voiceClient.is_listening() else None
+    if sink is not None and sink.onUtterance == onUtterance:
+        return True
+    if sink is not None:
+        voiceClient.stop_listening()
+    voiceClient.listen(BuzzSink(asyncio.get_running_loop(), armed, onUtterance))
+    return True
+
+def stopListening(voiceClient: Optional[discord.VoiceClient]) -> None:
+    if enabled and isinstance(voiceClient, VOICE_CLIENT) and voiceClient.is_listening():
+        voiceClient.stop_listening()
+
+def detectFile(path: str, detector: Optional[VoiceActivityDetector]=None) -> List[float]:
+    '''
+    Run the detector over a recorded 48kHz stereo 16-bit PCM file, as made by `ffmpeg -i in.wav -f s16le -ar 48000 -ac 2 out.pcm`.
+
+    Parameters:
+        path (str): The path of the recording.
+        detector (VoiceActivityDetector): The detector to use, a default one if None.
+
+    Returns:
+        List[float]: The seconds into the recording at which each utterance started.
+    '''
+
+    detector = detector or VoiceActivityDetector()
+    onsets = []
+    with open(path, 'rb') as f:
+        frame = 0
+        while pcm := f.read(FRAME_BYTES):
+            onset = detector.feed(0, pcm, frame * FRAME_SECONDS)
+            if onset is not None:
+                onsets.append(round(onset, 2))
+            frame += 1
+    return onsets
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        print(path, detectFile(path))
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Dict, Optional, Set
+import discord
+import util.metrics as metrics
+import util.voiceBuzz as voiceBuzz
+
+class VoiceConnectionError(Exception):
+    '''Raised when a voice channel could not be joined after every attempt.'''
+    textKey = 'voice_failed'
+
+class VoiceChannelBusyError(VoiceConnectionError):
+    '''Raised when the connection of a guild is used by a game in another voice channel.'''
+    textKey = 'voice_busy'
+
+class VoiceManager:
+    '''
+    Class representing the voice connections of every guild, kept across games.
+
+    A game acquires the connection of its guild instead of connecting itself: an existing connection is reused,
+    or moved if the game is in another voice channel of the guild and no other game is using it, and a new one is
+    made with retries and backoff.
+    Ending a game only releases the connection, which is closed once it has been idle for idleTtl seconds.
+    A background loop also checks the connections in use and reconnects the ones that dropped.
+
+        Attributes:
+            idleTtl (float): Seconds an unused connection is kept before disconnecting.
+            attempts (int): Connection attempts before giving up.
+            checkInterval (float): Seconds between health checks.
+
+        Methods:
+            acquire (channel: VoiceChannel, gameKey: tuple) -> VoiceClient: Get a healthy connection to a voice channel for a game.
+            release (guild: Guild, gameKey: tuple): Mark the connection of a guild as no longer used by a game.
+    '''
+
+    def __init__(self, idleTtl: float=300.0, attempts: int=3, baseDelay: float=1.0, checkInterval: float=15.0):
+        self.idleTtl = idleTtl
+        self.attempts = attempts
+        self.baseDelay = baseDelay
+        self.checkInterval = checkInterval
+        self.channels: Dict[int, discord.VoiceChannel] = {}
+        self.users: Dict[int, Set[tuple]] = {}
+        self.idleSince: Dict[int, float] = {}
+        self.locks: Dict[int, asyncio.Lock] = {}
+        self.monitorTask: Optional[asyncio.Task] = None
+
+    async def acquire(self, channel: discord.VoiceChannel, gameKey: tuple) -> discord.VoiceClient:
+        '''
+        Get a healthy connection to a voice channel, reusing or moving the connection of its guild when there is one.
+
+        Parameters:
+            channel (VoiceChannel): The voice channel of the game.
+            gameKey (tuple): The (guild id, text channel id) of the game.
+
+        Returns:
+            VoiceClient: The connection.
+
+        Raises:
+            VoiceChannelBusyError: If another game of the guild is using the connection in another voice channel.
+            VoiceConnectionError: If the channel could not be joined.
+        '''
+
+        guildId = channel.guild.id
+        voiceClient = await self.connect(channel, gameKey)
+        self.channels[guildId] = channel
+        self.users.setdefault(guildId, set()).add(gameKey)
+        self.idleSince.pop(guildId, None)
+        if self.monitorTask is None or self.monitorTask.done():
+            self.monitorTask = asyncio.create_task(self.monitor())
+        return voiceClient
+
+    def release(self, guild: discord.Guild, gameKey: tuple) -> None:
+        '''
+        Mark the connection of a guild as no longer used by a game. Once no game uses it, the connection stays open
+        for the next game until it has been idle for idleTtl seconds.
+
+        Parameters:
+            guild (Guild): The guild of the game that ended.
+            gameKey (tuple): The (guild id, text channel id) of the game.
+        '''
+
+        users = self.users.get(guild.id, set())
+        users.discard(gameKey)
+        if users:
+            return
+        self.users.pop(guild.id, None)
+        self.idleSince[guild.id] = time.monotonic()
+        if guild.voice_client:
+            voiceBuzz.stopListening(guild.voice_client)
+            guild.voice_client.stop()
+
+    async def connect(self, channel: discord.VoiceChannel, gameKey: Optional[tuple]=None) -> discord.VoiceClient:
+        guildId = channel.guild.id
+        lock = self.locks.setdefault(guildId, asyncio.Lock())
+        async with lock:
+            voiceClient = channel.guild.voice_client
+            if voiceClient is not None and voiceClient.is_connected():
+                if voiceClient.channel != channel:
+                    # Moving would cut off the reading of the games using the connection
+                    if self.users.get(guildId, set()) - {gameKey}:
+                        raise VoiceChannelBusyError(f'The connection in {channel.guild.name} is used in {voiceClient.channel.name}')
+                    await voiceClient.move_to(channel)
+                    metrics.increment('voice.moved')
+                else:
+                    metrics.increment('voice.reused')
+                return voiceClient
+
+            error = None
+            for attempt in range(self.attempts):
+                if channel.guild.voice_client is not None:
+                    # A half-open connection blocks new ones, so drop it first
+                    await channel.guild.voice_client.disconnect(force=True)
+                start = time.monotonic()
+                try:
+                    voiceClient = await channel.connect(timeout=10, cls=voiceBuzz.VOICE_CLIENT)
+                    metrics.observe('voice.connect', time.monotonic() - start)
+                    logging.info(f'Connected to {channel.name} in {channel.guild.name}')
+                    return voiceClient
+                except (asyncio.TimeoutError, discord.ClientException, OSError) as e:
+                    error = e
+                    metrics.increment('voice.connectErrors')
+                    logging.warning(f'Attempt {attempt + 1} to connect to {channel.name} in {channel.guild.name} failed: {e}')
+                    if attempt < self.attempts - 1:
+                        await asyncio.sleep(random.uniform(0, self.baseDelay * 2 ** attempt))
+            raise VoiceConnectionError(f'Could not connect to {channel.name}: {error}')
+
+    async def monitor(self) -> None:
+        while self.users or self.idleSince:
+            await asyncio.sleep(self.checkInterval)
+            now = time.monotonic()
+            for guildId, since in list(self.idleSince.items()):
+                if now - since < self.idleTtl:
+                    continue
+                self.idleSince.pop(guildId)
+                channel = self.channels.pop(guildId, None)
+                if channel is not None and channel.guild.voice_client is not None:
+                    await channel.guild.voice_client.disconnect()
+                    logging.info(f'Disconnected idle voice connection in {channel.guild.name}')
+
+            for guildId in list(self.users):
+                channel = self.channels.get(guildId)
+                if channel is None:
+                    continue
+                voiceClient = channel.guild.voice_client
+                if voiceClient is None or not voiceClient.is_connected():
+                    logging.warning(f'Voice connection in {channel.guild.name} dropped, reconnecting')
+                    metrics.increment('voice.reconnects')
+                    try:
+                        await self.connect(channel)
+                    except VoiceConnectionError as e:
+                        logging.error(e)
+
+voiceManager = VoiceManager(float(os.getenv('VOICE_IDLE_TTL', '300')))
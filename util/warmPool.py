@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import math
+import os
+import shutil
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Dict, Optional
+import util.audioProcessing as ap
+import util.forcedAlignment as fa
+from util.questionBuffer import BloomFilter, nextTossup
+from util.memoryBudget import memoryAccountant, sizeOf, PRIORITY_PREFETCH
+
+POOL_PATH = 'temp/pool'
+BUNDLE_FILES = {
+    'text': '/tossup.txt',
+    'audio': '/tossup.mp3',
+    'syncMap': '/tossupSyncmap.json',
+    'answer': '/tossupAnswer.txt',
+    'meta': '/tossupMeta.json',
+}
+# Files a bundle can be without, the metadata is skipped when the audio could not be probed
+OPTIONAL_BUNDLE_FILES = {'meta'}
+
+def bundlePaths(directory: str):
+    '''
+    Yields the name and path of every file of a bundle directory, leaving out optional files it does not have.
+    '''
+
+    for name, file in BUNDLE_FILES.items():
+        path = f'{directory}{file}'
+        if name not in OPTIONAL_BUNDLE_FILES or os.path.exists(path):
+            yield name, path
+
+class WarmPool:
+    '''
+    Class representing a process-wide pool of fully prepared tossup bundles for the most requested filters.
+
+    Every prepared bundle is a directory with the same files a TossupGame reads, so taking one is a rename
+    into the game directory instead of a fetch, synthesis and alignment.
+
+        Attributes:
+            maxFilters (int): Number of most requested filters kept warm.
+            maxPerFilter (int): Most bundles kept for a single filter.
+            maxBundles (int): Most bundles kept in total, bounding pool memory.
+            maxDiskBytes (int): Most bytes of bundle files kept on disk.
+            demandWindow (float): Seconds of requests used to rank the filters.
+
+        Methods:
+            recordDemand (key: tuple): Count a request for a filter.
+            take (key: tuple, heard: BloomFilter) -> dict: Take a prepared bundle for a filter.
+            moveBundle (bundle: dict, directory: str): Move the files of a bundle into a game directory.
+            toSnapshot () -> list: The ready bundles, to keep them across a restart.
+            restore (entries: list): Track the bundles of a snapshot again.
+    '''
+
+    def __init__(self, maxFilters: int=5, maxPerFilter: int=3, maxBundles: int=12, maxDiskBytes: int=50 * 1024 * 1024,
+                 demandWindow: float=3600.0, requestsPerBundle: int=4, refillInterval: float=30.0):
+        self.maxFilters = maxFilters
+        self.maxPerFilter = maxPerFilter
+        self.maxBundles = maxBundles
+        self.maxDiskBytes = maxDiskBytes
+        self.demandWindow = demandWindow
+        self.requestsPerBundle = requestsPerBundle
+        self.refillInterval = refillInterval
+
+        self.bundles: Dict[tuple, deque] = {}
+        self.demand = deque()
+        self.diskBytes = 0
+        self.prepared = 0
+        self.cleaned = False
+        self.wakeup: Optional[asyncio.Event] = None
+        self.refillTask: Optional[asyncio.Task] = None
+
+    def memoryFootprint(self) -> int:
+        return sum(sizeOf(bundles) + sum(sizeOf(bundle) for bundle in bundles) for bundles in self.bundles.values())
+
+    def evictMemory(self) -> None:
+        self.evictUnpopular({})
+
+    def bundleCount(self) -> int:
+        return sum(len(bundles) for bundles in self.bundles.values())
+
+    def targets(self) -> Dict[tuple, int]:
+        '''
+        Size the pool from recent demand: the most requested filters get one bundle per few recent requests.
+
+        Returns:
+            Dict[tuple, int]: The number of bundles to keep ready for each popular filter.
+        '''
+
+        cutoff = time.monotonic() - self.demandWindow
+        while self.demand and self.demand[0][0] < cutoff:
+            self.demand.popleft()
+        counts = Counter(key for _, key in self.demand)
+        return {key: min(self.maxPerFilter, math.ceil(count / self.requestsPerBundle)) for key, count in counts.most_common(self.maxFilters)}
+
+    def recordDemand(self, key: tuple) -> None:
+        '''
+        Count a request for a filter and wake the refill task.
+
+        Parameters:
+            key (tuple): The (difficulties, categories) filter of the request.
+        '''
+
+        self.demand.append((time.monotonic(), key))
+        if self.refillTask is None or self.refillTask.done():
+            self.wakeup = asyncio.Event()
+            self.refillTask = asyncio.create_task(self.refillLoop())
+        self.wakeup.set()
+
+    async def take(self, key: tuple, heard: Optional[BloomFilter]=None) -> Optional[dict]:
+        '''
+        Take a prepared bundle for a filter, skipping tossups already read in the channel.
+
+        Parameters:
+            key (tuple): The (difficulties, categories) filter of the game.
+            heard (BloomFilter): The IDs of the tossups already read in the channel.
+
+        Returns:
+            dict: The bundle, or None if no matching bundle is ready.
+        '''
+
+        self.recordDemand(key)
+        bundles = self.bundles.get(key)
+        while bundles:
+            bundle = bundles.popleft()
+            self.diskBytes -= bundle['size']
+            if heard is None or bundle['id'] not in heard:
+                if heard is not None:
+                    heard.add(bundle['id'])
+                return bundle
+            self.discard(bundle)
+        return None
+
+    def moveBundle(self, bundle: dict, directory: str) -> None:
+        '''
+        Move the files of a bundle into a game directory, replacing the files of the previous question.
+
+        Parameters:
+            bundle (dict): A bundle returned by take.
+            directory (str): The directory of the game.
+        '''
+
+        for name, file in BUNDLE_FILES.items():
+            source = f"{bundle['directory']}{file}"
+            if name in OPTIONAL_BUNDLE_FILES and not os.path.exists(source):
+                # The file of the previous question would describe the wrong audio
+                if os.path.exists(f'{directory}{file}'):
+                    os.remove(f'{directory}{file}')
+                continue
+            os.replace(source, f'{directory}{file}')
+            # A rename keeps the old modification time, which would make speed variants of the previous question look fresh
+            os.utime(f'{directory}{file}')
+        shutil.rmtree(bundle['directory'], ignore_errors=True)
+
+    def toSnapshot(self) -> list:
+        return [[list(key), bundle] for key, bundles in self.bundles.items() for bundle in bundles]
+
+    def restore(self, entries: list) -> None:
+        for key, bundle in entries:
+            if not all(os.path.exists(f"{bundle['directory']}{file}") for name, file in BUNDLE_FILES.items() if name not in OPTIONAL_BUNDLE_FILES):
+                continue
+            self.bundles.setdefault(tuple(key), deque()).append(bundle)
+            self.diskBytes += bundle['size']
+            self.prepared = max(self.prepared, int(os.path.basename(bundle['directory'])))
+
+    def removeUntracked(self) -> None:
+        # Bundles left behind by a previous process that were not restored are not tracked
+        tracked = {bundle['directory'] for bundles in self.bundles.values() for bundle in bundles}
+        if not os.path.isdir(POOL_PATH):
+            return
+        for name in os.listdir(POOL_PATH):
+            if f'{POOL_PATH}/{name}' not in tracked:
+                shutil.rmtree(f'{POOL_PATH}/{name}', ignore_errors=True)
+
+    def discard(self, bundle: dict) -> None:
+        shutil.rmtree(bundle['directory'], ignore_errors=True)
+
+    async def prepare(self, key: tuple) -> Optional[dict]:
+        difficulties, categories = key
+        tossup = await nextTossup(difficulties, categories)
+        if tossup is None:
+            return None
+
+        self.prepared += 1
+        directory = f'{POOL_PATH}/{self.prepared}'
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        try:
+            completed = await fa.generateSyncMap(directory_path=directory, audio_file_path=BUNDLE_FILES['audio'],
+                                                 text_file_path=BUNDLE_FILES['text'],
+                                                 sync_map_file_path=BUNDLE_FILES['syncMap'],
+                                                 answer_file_path=BUNDLE_FILES['answer'], reading_speed=1.0,
+                                                 subjects=categories, question_numbers=difficulties, tossup=tossup)
+            size = sum(os.path.getsize(path) for _, path in bundlePaths(directory)) if completed else 0
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        if not completed:
+            shutil.rmtree(directory, ignore_errors=True)
+            return None
+
+        return {'id': tossup['id'], 'category': tossup['category'], 'difficulty': tossup['difficulty'], 'directory': directory, 'size': size,
+                'duration': ap.readDuration(f"{directory}{BUNDLE_FILES['audio']}")}
+
+    def evictUnpopular(self, targets: Dict[tuple, int]) -> None:
+        for key in list(self.bundles):
+            while len(self.bundles[key]) > targets.get(key, 0):
+                bundle = self.bundles[key].pop()
+                self.diskBytes -= bundle['size']
+                self.discard(bundle)
+            if not self.bundles[key]:
+                del self.bundles[key]
+
+    def nextFilter(self, targets: Dict[tuple, int]) -> Optional[tuple]:
+        # Fill the filter that is furthest below its target first
+        missing = [(len(self.bundles.get(key, ())) - target, key) for key, target in targets.items()]
+        missing = [item for item in missing if item[0] < 0]
+        return min(missing)[1] if missing else None
+
+    async def refillLoop(self) -> None:
+        if not self.cleaned:
+            self.removeUntracked()
+            self.cleaned = True
+
+        while True:
+            targets = self.targets()
+            self.evictUnpopular(targets)
+            if not targets:
+                return
+
+            key = self.nextFilter(targets)
+            if key is None or self.bundleCount() >= self.maxBundles or self.diskBytes >= self.maxDiskBytes:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.refillInterval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                bundle = await self.prepare(key)
+            except Exception as e:
+                logging.error(f'Error while preparing pool bundle for {key}: {e}')
+                bundle = None
+            if bundle is None:
+                await asyncio.sleep(self.refillInterval)
+                continue
+            self.bundles.setdefault(key, deque()).append(bundle)
+            self.diskBytes += bundle['size']
+            logging.info(f'Warm pool prepared bundle {bundle["id"]} for {key}, {self.bundleCount()} ready')
+
+warmPool = WarmPool()
+memoryAccountant.register(warmPool, 'warmPool', PRIORITY_PREFETCH)